@@ -0,0 +1,345 @@
+import asyncio
+import math
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    FrozenSet,
+    Iterable,
+    Iterator,
+    Optional,
+)
+
+from langchain_core.runnables import Runnable, RunnableConfig
+
+from adviser.config import (
+    LLM_MAX_CONCURRENCY,
+    MAX_CONCURRENT_REQUESTS,
+    MAX_QUEUE_WAIT,
+    MAX_QUEUED_REQUESTS,
+    RATE_LIMIT_API_KEYS,
+    RATE_LIMIT_BURST,
+    RATE_LIMIT_BY_ADDRESS,
+    RATE_LIMIT_PER_MINUTE,
+)
+
+# weight of the latest request in the moving average of the time requests hold a slot
+_SERVICE_TIME_WEIGHT = 0.2
+
+
+class Overloaded(Exception):
+    """
+    Raised when a request is turned away, with the status code it is served with and
+    the seconds after which the client should retry.
+    """
+
+    def __init__(self, detail: str, status_code: int, retry_after: float):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+def retry_after_header(seconds: float) -> Dict[str, str]:
+    """Returns the `Retry-After` header for a delay, in whole seconds of at least 1."""
+    return {"Retry-After": str(max(math.ceil(seconds), 1))}
+
+
+def is_provider_timeout(error: Exception) -> bool:
+    """
+    Whether the error is a chat model call running out of its stage timeout, e.g.
+    `openai.APITimeoutError`, matched by name so the provider client stays optional.
+    """
+    return isinstance(error, TimeoutError) or type(error).__name__ == "APITimeoutError"
+
+
+def provider_retry_after(error: Exception) -> Optional[float]:
+    """
+    Returns the seconds to wait before retrying when the error is a rate limit (429)
+    response of the chat model provider, e.g. `openai.RateLimitError`, or None.
+    """
+    if getattr(error, "status_code", None) != 429:
+        return None
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after", 1))
+    except ValueError:
+        return 1.0
+
+
+class TokenBucket:
+    """Token bucket holding up to `burst` tokens, refilled with `rate` tokens per second."""
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = now
+
+    def take(self, cost: float, now: float) -> float:
+        """
+        Takes `cost` tokens, returning 0, or the seconds until they are available
+        without taking any.
+        """
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """
+    Per client token bucket rate limits: every client, e.g. an API key, may send
+    `per_minute` requests a minute on average and bursts of up to `burst` requests.
+
+    Clients are the `api_keys`, keys sent by anyone are not trusted as a client could
+    send a new one with every request. Requests without a known key are limited per
+    address with `by_address`, and not limited otherwise (see `client`).
+
+    The buckets of the `max_clients` most recently seen clients are kept, a client
+    seen again after its bucket was dropped starts with a full bucket. `limited`
+    counts the requests turned away.
+    """
+
+    def __init__(
+        self,
+        per_minute: float = RATE_LIMIT_PER_MINUTE,
+        burst: int = RATE_LIMIT_BURST,
+        api_keys: Iterable[str] = RATE_LIMIT_API_KEYS,
+        by_address: bool = RATE_LIMIT_BY_ADDRESS,
+        max_clients: int = 10000,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.rate = per_minute / 60
+        self.burst = burst
+        self.api_keys: FrozenSet[str] = frozenset(api_keys)
+        self.by_address = by_address
+        self.max_clients = max_clients
+        self._clock = clock
+        self._buckets: OrderedDict[str, TokenBucket] = OrderedDict()
+        self._lock = threading.Lock()
+        self.limited = 0
+
+    def client(self, api_key: Optional[str], address: str) -> Optional[str]:
+        """Returns the client a request is limited as, or None if it is not limited."""
+        if api_key in self.api_keys:
+            return f"key:{api_key}"
+        if self.by_address:
+            return f"address:{address}"
+        return None
+
+    def acquire(self, client: str, cost: int = 1) -> float:
+        """
+        Takes `cost` requests from the client bucket, returning 0, or the seconds to wait
+        before retrying when the client is over its limit. A cost above the burst, e.g. a
+        large batch, takes the whole burst.
+        """
+        now = self._clock()
+        with self._lock:
+            bucket = self._buckets.get(client)
+            if bucket is None:
+                bucket = self._buckets[client] = TokenBucket(self.rate, self.burst, now)
+                while len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+            self._buckets.move_to_end(client)
+            wait = bucket.take(min(cost, self.burst), now)
+            self.limited += wait > 0
+        return wait
+
+
+class AdmissionQueue:
+    """
+    Bounds the number of requests running at once to `max_concurrency`, the other
+    requests waiting for a slot in a queue of at most `max_queue` requests.
+
+    Requests are shed early, raising `Overloaded` (503), when the queue is full or the
+    wait expected from the queue length and the recent time requests hold a slot goes
+    past `max_wait` seconds. A request that waited `max_wait` seconds is shed too.
+    `shed` counts the shed requests.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = MAX_CONCURRENT_REQUESTS,
+        max_queue: int = MAX_QUEUED_REQUESTS,
+        max_wait: float = MAX_QUEUE_WAIT,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._clock = clock
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self.waiting = 0
+        # moving average of the seconds a request holds its slot, once one finished
+        self.service_time: Optional[float] = None
+        self.shed = 0
+
+    def expected_wait(self) -> float:
+        """Returns the seconds a request arriving now is expected to wait for a slot."""
+        if not self._slots.locked() or self.service_time is None:
+            return 0.0
+        return (self.waiting + 1) / self.max_concurrency * self.service_time
+
+    def _overloaded(self, detail: str, retry_after: float) -> Overloaded:
+        self.shed += 1
+        return Overloaded(
+            f"The service is overloaded: {detail}, please retry later.",
+            status_code=503,
+            retry_after=retry_after,
+        )
+
+    def check(self):
+        """Raises `Overloaded` if a request arriving now would be shed."""
+        if self._slots.locked() and self.waiting >= self.max_queue:
+            raise self._overloaded(
+                f"{self.waiting} requests are waiting",
+                self.expected_wait() or self.max_wait,
+            )
+        if (expected_wait := self.expected_wait()) > self.max_wait:
+            raise self._overloaded(
+                f"requests wait about {expected_wait:.0f} seconds", expected_wait
+            )
+
+    @asynccontextmanager
+    async def slot(self):
+        """Holds a slot while the context is entered, waiting for one if needed."""
+        self.check()
+        if not self._slots.locked():
+            # a free slot is taken at once
+            await self._slots.acquire()
+        else:
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.max_wait)
+            except asyncio.TimeoutError:
+                raise self._overloaded(
+                    f"no slot within {self.max_wait:g} seconds", self.max_wait
+                ) from None
+            finally:
+                self.waiting -= 1
+        start = self._clock()
+        try:
+            yield
+        finally:
+            self._slots.release()
+            elapsed = self._clock() - start
+            self.service_time = (
+                elapsed
+                if self.service_time is None
+                else self.service_time
+                + _SERVICE_TIME_WEIGHT * (elapsed - self.service_time)
+            )
+
+
+class LLMBudget:
+    """
+    Bounds the chat model calls in flight to `max_in_flight`, across the chain stages
+    sharing the budget (see `bind`), so a burst of requests does not send more calls
+    than the provider rate limits allow. Calls over the budget wait for a slot.
+
+    Synchronous calls, e.g. from `invoke` in a script, are bounded separately from the
+    asynchronous calls of the app. `waited` counts the calls that had to wait.
+    """
+
+    def __init__(self, max_in_flight: int = LLM_MAX_CONCURRENCY):
+        self.max_in_flight = max_in_flight
+        self._async_slots = asyncio.Semaphore(max_in_flight)
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self.in_flight = 0
+        self.waited = 0
+
+    @contextmanager
+    def slot(self):
+        if not self._slots.acquire(blocking=False):
+            self.waited += 1
+            self._slots.acquire()
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+
+    @asynccontextmanager
+    async def aslot(self):
+        if self._async_slots.locked():
+            self.waited += 1
+        async with self._async_slots:
+            self.in_flight += 1
+            try:
+                yield
+            finally:
+                self.in_flight -= 1
+
+    def bind(self, runnable: Runnable) -> Runnable:
+        """Returns the runnable, e.g. a chat model, with its calls held to the budget."""
+        return BudgetedRunnable(runnable, self)
+
+
+class BudgetedRunnable(Runnable):
+    """
+    Runs the bound runnable within a slot of the budget, streaming included. No run is
+    traced for the wrapper itself, the bound runnable is traced as if called directly,
+    once it got its slot.
+    """
+
+    def __init__(self, bound: Runnable, budget: LLMBudget):
+        self.bound = bound
+        self.budget = budget
+        self.name = bound.get_name()
+
+    @property
+    def InputType(self) -> Any:
+        return self.bound.InputType
+
+    @property
+    def OutputType(self) -> Any:
+        return self.bound.OutputType
+
+    def with_structured_output(self, schema: Any, **kwargs) -> Runnable:
+        """Returns the structured output of the bound chat model, held to the budget."""
+        return self.budget.bind(self.bound.with_structured_output(schema, **kwargs))
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs):
+        with self.budget.slot():
+            return self.bound.invoke(input, config, **kwargs)
+
+    async def ainvoke(
+        self, input: Any, config: Optional[RunnableConfig] = None, **kwargs
+    ):
+        async with self.budget.aslot():
+            return await self.bound.ainvoke(input, config, **kwargs)
+
+    def stream(
+        self, input: Any, config: Optional[RunnableConfig] = None, **kwargs
+    ) -> Iterator:
+        with self.budget.slot():
+            yield from self.bound.stream(input, config, **kwargs)
+
+    async def astream(
+        self, input: Any, config: Optional[RunnableConfig] = None, **kwargs
+    ) -> AsyncIterator:
+        async with self.budget.aslot():
+            async for chunk in self.bound.astream(input, config, **kwargs):
+                yield chunk
+
+    def transform(
+        self, input: Iterator, config: Optional[RunnableConfig] = None, **kwargs
+    ) -> Iterator:
+        with self.budget.slot():
+            yield from self.bound.transform(input, config, **kwargs)
+
+    async def atransform(
+        self, input: AsyncIterator, config: Optional[RunnableConfig] = None, **kwargs
+    ) -> AsyncIterator:
+        async with self.budget.aslot():
+            async for chunk in self.bound.atransform(input, config, **kwargs):
+                yield chunk
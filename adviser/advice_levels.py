@@ -0,0 +1,239 @@
+import re
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Iterable, List, Optional, Union
+
+from langchain_core.documents.base import Document
+
+from adviser.advise_model import destination_name, get_required_prompt_fields
+from adviser.gazetteer import GAZETTEER
+from adviser.request_log import record_cache_outcome
+from adviser.utils import normalize_text
+
+# the Smartraveller advice levels, from the lowest to the highest
+ADVICE_LEVELS = (
+    "Exercise normal safety precautions",
+    "Exercise a high degree of caution",
+    "Reconsider your need to travel",
+    "Do not travel",
+)
+# key of the document metadata caching the advice level table of the page
+ADVICE_LEVEL_TABLE_KEY = "advice_level_table"
+
+# a level, optionally quoted, and the rest of its sentence, e.g. "Do not travel to Gaza."
+_LEVEL_SENTENCE = re.compile(
+    '["“]?(?P<level>{})["”]?(?P<clause>[^.\n]*)'.format(
+        "|".join(re.escape(level) for level in ADVICE_LEVELS)
+    ),
+    re.IGNORECASE,
+)
+_OVERALL_CLAUSE = re.compile(r"\s*(?:in|to|for) (?P<place>.+?) overall\s*$")
+_REGIONS_CLAUSE = re.compile(
+    r"\s*(?:in|to) (?:the )?(?:(?:provinces?|regions?|states?|areas?|districts?"
+    r"|islands?|cities|city|territory|territories) of (?:the )?)?(?P<places>.+?)\s*$"
+)
+_PLACES_SEPARATOR = re.compile(r",\s*(?:and\s+)?|\s+and\s+")
+_DATE = re.compile(
+    r"\b(?:\d{1,2} (?:January|February|March|April|May|June|July|August|September"
+    r"|October|November|December) \d{4}|\d{4}-\d{2}-\d{2})\b"
+)
+
+# a place named in a level query, a few words without a qualifier of the question
+_PLACE = r"(?P<place>(?:(?!{qualifiers})\w+ ){{0,5}}?(?!{qualifiers})\w+)".format(
+    qualifiers=r"(?:for|with|during|after|before|if|when|while|because|without|"
+    r"but|since|what|how|why|which|who)\b"
+)
+_NOW = r"(?: right now| now| at the moment| currently| at present)?"
+_TRAVELLERS = r"(?: for (?:tourists|travellers|travelers|visitors|australians))?"
+_GO = r"(?:travel|go|visit|holiday)"
+# normalized queries asking nothing but the safety of a destination
+_LEVEL_QUERIES = [
+    re.compile(pattern)
+    for pattern in (
+        rf"is (?:it|that) safe(?: to {_GO}(?: to| in)? {_PLACE}| there)?{_TRAVELLERS}{_NOW}",
+        rf"(?:i (?:would like|want|am planning|plan|am going|m going|am)|we "
+        rf"(?:would like|want|are planning|plan|are going|re going|are)) to "
+        rf"(?:travel|go|holiday) to {_PLACE} is (?:it|that) safe{_NOW}",
+        rf"(?:going|travelling|traveling|heading) to {_PLACE} is (?:it|that) safe{_NOW}",
+        rf"(?:is|are) {_PLACE} safe(?: to {_GO}(?: to| in)?)?{_TRAVELLERS}{_NOW}",
+        rf"how safe is (?:it to {_GO}(?: to| in)? )?{_PLACE}{_NOW}",
+        rf"(?:can|should) (?:i|we) (?:safely )?(?:travel|go)(?: to)? {_PLACE}{_NOW}",
+        rf"(?:what is )?(?:the )?(?:travel )?(?:advice|advisory|safety) level "
+        rf"(?:for|in|of) {_PLACE}",
+        rf"(?:safety|travel safety) (?:in|of) {_PLACE}",
+        rf"{_PLACE} safety",
+    )
+]
+# the names of every destination, e.g. "bali" or "papua new guinea", as word tuples
+_GAZETTEER_PLACES = frozenset(
+    tuple(normalize_text(phrase))
+    for destinations in GAZETTEER.values()
+    for slug, aliases in destinations.items()
+    for phrase in [slug.replace("-", " "), *aliases]
+)
+_LONGEST_PLACE = max(map(len, _GAZETTEER_PLACES))
+# words joining the places named in a level query, e.g. "papua in indonesia"
+_PLACE_CONNECTIVES = {"in", "the", "and", "of"}
+
+
+@dataclass
+class AdviceLevelTable:
+    """
+    The advice levels of an advice page.
+
+    Args:
+        overall (Optional[str]): The advice level of the whole destination, one of `ADVICE_LEVELS`.
+        regions (Dict[str, str]): The advice level of every sub-region given one, by sub-region name.
+        last_updated (Optional[str]): The date of the latest update of the advice, as written on the page.
+    """
+
+    overall: Optional[str] = None
+    regions: Dict[str, str] = field(default_factory=dict)
+    last_updated: Optional[str] = None
+
+
+def _canonical_level(level: str) -> str:
+    return next(known for known in ADVICE_LEVELS if known.lower() == level.lower())
+
+
+def _split_places(places: str) -> List[str]:
+    # sub-regions are proper names, e.g. "to areas near the border" names none
+    return [
+        place
+        for place in (place.strip() for place in _PLACES_SEPARATOR.split(places))
+        if place and place[0].isupper() and len(place) <= 60
+    ]
+
+
+def parse_advice_levels(
+    advice_levels: str, description: str = "", latest_update: str = ""
+) -> AdviceLevelTable:
+    """
+    Parses the "Advice levels" section of an advice page into an advice level table.
+
+    Sentences such as "Exercise a high degree of caution in Indonesia overall." give
+    the overall level and "Reconsider your need to travel to the provinces of Papua and
+    West Papua." the level of every sub-region listed, the highest level winning for a
+    sub-region listed twice. When the section gives no overall level, the level in
+    the page description is used. The last updated date is the first date of the
+    latest update section, if any.
+    """
+    table = AdviceLevelTable()
+    for match in _LEVEL_SENTENCE.finditer(advice_levels):
+        level, clause = _canonical_level(match["level"]), match["clause"]
+        if _OVERALL_CLAUSE.match(clause):
+            table.overall = table.overall or level
+        elif regions := _REGIONS_CLAUSE.match(clause):
+            for region in _split_places(regions["places"]):
+                table.regions[region] = max(
+                    level, table.regions.get(region, level), key=ADVICE_LEVELS.index
+                )
+    if table.overall is None and (match := _LEVEL_SENTENCE.search(description)):
+        table.overall = _canonical_level(match["level"])
+    if date := _DATE.search(latest_update):
+        table.last_updated = date.group()
+    return table
+
+
+def _names_only_places(words: List[str], regions: Iterable[str]) -> bool:
+    """Whether the words are destination or sub-region names and the words joining them."""
+    region_places = {tuple(normalize_text(region)) for region in regions}
+    longest = max(map(len, region_places), default=_LONGEST_PLACE)
+    longest = max(longest, _LONGEST_PLACE)
+    position = 0
+    while position < len(words):
+        # the longest name starting at the position, e.g. "west papua" over "west"
+        end = next(
+            (
+                end
+                for end in range(min(len(words), position + longest), position, -1)
+                if tuple(words[position:end]) in _GAZETTEER_PLACES
+                or tuple(words[position:end]) in region_places
+            ),
+            None,
+        )
+        if end is None and words[position] not in _PLACE_CONNECTIVES:
+            return False
+        position = end or position + 1
+    return True
+
+
+def level_query_place(query: str, regions: Iterable[str] = ()) -> Optional[str]:
+    """
+    Returns the place a query only asks the safety of, e.g. "papua in indonesia" for
+    "Is Papua in Indonesia safe?", "" when it names none ("Is it safe?"), or None for
+    any other query, e.g. "Is Bali safe for families?". The place must be made of
+    gazetteer names and the given sub-regions, so "Is Bali safe alone?" is None.
+    """
+    text = " ".join(normalize_text(query))
+    for pattern in _LEVEL_QUERIES:
+        if match := pattern.fullmatch(text):
+            place = match["place"] or ""
+            return place if _names_only_places(place.split(), regions) else None
+    return None
+
+
+def advice_level_table(doc: Document) -> AdviceLevelTable:
+    """
+    Returns the advice level table of the advice page, parsed once per document and
+    cached in its metadata like the section spans.
+    """
+    if (cached := doc.metadata.get(ADVICE_LEVEL_TABLE_KEY)) is None:
+        fields = get_required_prompt_fields(doc, "")
+        table = parse_advice_levels(
+            fields["advice_levels"], fields["description"], fields["latest_update"]
+        )
+        # kept as a dict so the metadata round trips through the advisory store json
+        cached = doc.metadata[ADVICE_LEVEL_TABLE_KEY] = asdict(table)
+    return AdviceLevelTable(**cached)
+
+
+def format_level_answer(doc: Document, table: AdviceLevelTable, place: str) -> str:
+    """Formats the levels of the destination and of the sub-regions named in the place."""
+    lines = [
+        "Travel Safety Level:",
+        f'    "{table.overall}" in {destination_name(doc)} overall.',
+    ]
+    place_words = f" {place} "
+    named = [
+        region
+        for region in table.regions
+        if f" {' '.join(normalize_text(region))} " in place_words
+    ]
+    for region in named:
+        # "Papua" is named by "west papua" only as part of "West Papua"
+        if not any(region != other and region in other for other in named):
+            lines.append(f'    "{table.regions[region]}" in {region}.')
+    if table.last_updated:
+        lines.append(f"Last updated: {table.last_updated}.")
+    return "\n".join(lines)
+
+
+class AdviceLevelAnswerer:
+    """
+    Answers the queries asking nothing but the safety of a destination, e.g. "Is Bali
+    safe?", from the advice levels of its page, without the chat model. The answer
+    gives the overall level and the level of every sub-region named in the query, in
+    the format of the chat model advice.
+
+    Other queries, and pages without an overall level, e.g. "page not found", are left
+    to the chat model.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def answer(self, doc: Document, query: Union[str, Dict[str, str]]) -> Optional[str]:
+        """Returns the answer to the query from the page levels, or None."""
+        if isinstance(query, dict):
+            query = query["query"]
+        # the table is parsed once per page, its sub-regions are places of the query
+        table = advice_level_table(doc)
+        place = level_query_place(query, table.regions)
+        if place is None or table.overall is None:
+            self.misses += 1
+            record_cache_outcome("levels", "miss")
+            return None
+        self.hits += 1
+        record_cache_outcome("levels", "hit")
+        return format_level_answer(doc, table, place)
@@ -1,4 +1,14 @@
-from typing import Dict, Optional, Union
+from functools import lru_cache, partial
+from typing import (
+    TYPE_CHECKING,
+    AsyncIterator,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
 
 from pydantic import BaseModel
 from langchain_core.output_parsers import StrOutputParser
@@ -6,7 +16,9 @@ from langchain_core.language_models import BaseChatModel
 from langchain_core.prompts import PromptTemplate
 from langchain_core.documents.base import Document
 from langchain_core.runnables import (
-    RunnableSequence,
+    Runnable,
+    RunnableConfig,
+    RunnableGenerator,
     RunnableLambda,
     RunnableParallel,
     RunnablePassthrough,
@@ -16,7 +28,22 @@ from adviser.adviser_support_info_retriver import (
     construct_query2url_chain,
     construct_url2doc_chain,
 )
-from adviser.utils import extract_content_from_text
+from adviser.config import PROMPT_ADVICE_LEVELS_TOKENS, PROMPT_LATEST_UPDATE_TOKENS
+from adviser.destination_resolver import DestinationResolver
+from adviser.page_cache import PageCache
+from adviser.prompt_budget import (
+    TOKEN_COUNTER,
+    compact_whitespace,
+    trim_to_token_budget,
+)
+from adviser.request_log import record_prompt_tokens, recording_prompt_tokens
+from adviser.response_cache import ResponseCache
+from adviser.utils import find_section_span
+
+if TYPE_CHECKING:
+    from adviser.admission import LLMBudget
+    from adviser.advice_levels import AdviceLevelAnswerer
+    from adviser.advisory_store import AdvisoryStore
 
 
 class TravelAdviceInput(BaseModel):
@@ -29,6 +56,7 @@ class TravelAdviceInput(BaseModel):
         html_section_start (Optional[str], optional): The start of the HTML section. Defaults to None.
         html_section_end (Optional[str], optional): The end of the HTML section. Defaults to None.
         html_section_length (Optional[int], optional): The length of the HTML section. Defaults to None.
+        max_tokens (Optional[int], optional): The token budget of the field in the advice prompt, trimmed to whole sentences. Defaults to None.
     """
 
     name: str
@@ -36,10 +64,22 @@ class TravelAdviceInput(BaseModel):
     html_section_start: Optional[str] = None
     html_section_end: Optional[str] = None
     html_section_length: Optional[int] = None
+    max_tokens: Optional[int] = None
+
 
+# key of the document metadata caching the page sections found in the page content
+SECTION_SPANS_KEY = "section_spans"
+# key of the document metadata caching the page fields as written in the advice prompt
+PROMPT_FIELDS_KEY = "prompt_fields"
 
+
+@lru_cache(maxsize=None)
 def define_information_input_variables() -> Dict[str, TravelAdviceInput]:
-    """Defines the input to prompt and how they should be extracted from the text document."""
+    """
+    Defines the input to prompt and how they should be extracted from the text document.
+
+    The definitions are built once and shared, callers must not modify them.
+    """
     input_variables = {
         "title": TravelAdviceInput(name="title", html_section="metadata"),
         "description": TravelAdviceInput(name="description", html_section="metadata"),
@@ -49,6 +89,7 @@ def define_information_input_variables() -> Dict[str, TravelAdviceInput]:
             html_section_start="Latest update",
             html_section_end="Download",
             html_section_length=800,
+            max_tokens=PROMPT_LATEST_UPDATE_TOKENS,
         ),
         "advice_levels": TravelAdviceInput(
             name="advice_levels",
@@ -56,6 +97,7 @@ def define_information_input_variables() -> Dict[str, TravelAdviceInput]:
             html_section_start="Advice levels",
             html_section_end="Overview",
             html_section_length=500,
+            max_tokens=PROMPT_ADVICE_LEVELS_TOKENS,
         ),
         "query": TravelAdviceInput(name="query", html_section="query"),
     }
@@ -63,6 +105,40 @@ def define_information_input_variables() -> Dict[str, TravelAdviceInput]:
     return input_variables
 
 
+def _section_key(input_variable: TravelAdviceInput) -> str:
+    return "|".join(
+        str(marker)
+        for marker in (
+            input_variable.html_section_start,
+            input_variable.html_section_end,
+            input_variable.html_section_length,
+        )
+    )
+
+
+def get_section_span(
+    input_variable: TravelAdviceInput, doc: Document
+) -> Optional[List[int]]:
+    """
+    Returns the span of the page content section of the input variable.
+
+    The span is searched once per document and cached in its metadata, so the page
+    content of a cached or stored document is not scanned again on every request.
+    """
+    spans = doc.metadata.setdefault(SECTION_SPANS_KEY, {})
+    key = _section_key(input_variable)
+    if key not in spans:
+        span = find_section_span(
+            text=doc.page_content,
+            start_word=input_variable.html_section_start,
+            end_word=input_variable.html_section_end,
+            extraction_length=input_variable.html_section_length,
+        )
+        # kept as a list so the metadata round trips through the advisory store json
+        spans[key] = list(span) if span is not None else None
+    return spans[key]
+
+
 def get_required_prompt_field(
     input_variable: TravelAdviceInput, doc: Document, query: str
 ) -> str:
@@ -73,12 +149,10 @@ def get_required_prompt_field(
         case "metadata":
             return doc.metadata.get(input_variable.name, "")
         case "page_content":
-            return extract_content_from_text(
-                text=doc.page_content,
-                start_word=input_variable.html_section_start,
-                end_word=input_variable.html_section_end,
-                extraction_length=input_variable.html_section_length,
-            )
+            span = get_section_span(input_variable, doc)
+            if span is None:
+                return ""
+            return doc.page_content[span[0] : span[1]]
         case _:
             raise ValueError("The input variable retrieval is not supported")
 
@@ -92,122 +166,398 @@ def get_required_prompt_fields(doc: Document, query: str) -> Dict[str, str]:
     }
 
 
+def compact_prompt_field(input_variable: TravelAdviceInput, text: str) -> str:
+    """
+    Compacts the whitespace of a prompt field, drops the heading of a page section and
+    trims the field to whole sentences within its token budget.
+    """
+    text = compact_whitespace(text)
+    if input_variable.html_section_start:
+        text = text.removeprefix(input_variable.html_section_start).lstrip(" :\n")
+    if input_variable.max_tokens is not None:
+        text = trim_to_token_budget(text, input_variable.max_tokens)
+    return text
+
+
+def get_prompt_fields(
+    doc: Document, query: Union[str, Dict[str, str]]
+) -> Dict[str, str]:
+    """
+    Returns the fields of the advice prompt, compacted (see `compact_prompt_field`).
+
+    The page fields are compacted once per document and cached in its metadata, keyed
+    by their token budget, so only the query is compacted on every request.
+    """
+    if isinstance(query, dict):
+        query = query["query"]
+    cached = doc.metadata.setdefault(PROMPT_FIELDS_KEY, {})
+    fields = {}
+    for key, input_variable in define_information_input_variables().items():
+        if input_variable.html_section == "query":
+            fields[key] = compact_whitespace(query)
+            continue
+        cache_key = f"{key}|{input_variable.max_tokens}"
+        if (field := cached.get(cache_key)) is None:
+            field = cached[cache_key] = compact_prompt_field(
+                input_variable, get_required_prompt_field(input_variable, doc, query)
+            )
+        fields[key] = field
+    return fields
+
+
+# static instructions and example of the advice prompt, kept first and identical on
+# every request so provider side prompt caching applies to them. Lines are not
+# indented, the whitespace is sent to the chat model as tokens
+ADVICE_PROMPT_PREFIX = """Given the following inputs:
+
+`title`: The title of the webpage.
+`description`: A brief description of the webpage content.
+`latest_update`: The latest update of the travel advisory for the country.
+`advice_levels`: The score level of the country and its sub-regions.
+`query`: The question that the traveller asked about the country he is going to travel to.
+
+---
+
+Your task is to assess whether it is safe to travel to the specified country and provide reasons for your assessment that is related to the `latest_update`.
+If a sub-region is specified, also provide the advice level for that sub-region.
+Do not list advice levels for sub-regions that are not specified or the information is not provided.
+
+Your responsed advice should be one of following:
+['Do Not Travel', 'Reconsider Your Need to Travel', 'Exercise a High Degree of Caution', 'Exercise Normal Safety Precautions']
+If the `title` returns "page not found", respond with: "There is no trip advisory based on the current information."
+
+---
+
+Example:
+
+Give following inputs:
+
+`title`: "Indonesia Travel Advice & Safety | Smartraveller"
+`description`: "Australian Government travel advice for Indonesia. Exercise a high degree of caution. Travel advice level YELLOW. Understand the risks, safety, laws and contacts."
+`latest_update`: "The Bali Provincial Government has introduced a new tourist levy of IDR 150,000 per person to foreign tourists entering Bali. The tourist levy is separate from the e-Visa on Arrival or the Visa on Arrival. Cashless payments can be made online prior to travel or on arrival at designated payment counters at Bali's airport and seaport. See the Bali Provincial Government's official website for further information (see link in 'Travel' section below)."
+`advice_levels`: "Exercise a high degree of caution" in Indonesia overall.\n"Reconsider Your Need to Travel" in Papua.
+
+with different queries, you should give different responses:
+Case 1:
+`query`: "I would like to travel to Indonesia. Is it safe?"
+`response`:
+Travel Safety Level:
+    "Exercise a high degree of caution" in Indonesia overall.
+Reasons:
+    ongoing risk of terrorist attack.
+    the risk of serious security incidents or demonstrations that may turn violent.
+Case 2:
+`query`: "I would like to travel to Papua in Indonesia. Is it safe?"
+`response`:
+Travel Safety Level:
+    "Exercise a high degree of caution" in Indonesia overall.
+    "Reconsider Your Need to Travel" in Papua.
+Reasons:
+    ongoing risk of terrorist attack.
+Case 3:
+`query`: "I would like to travel to Jakarta in Indonesia. Is it safe?"
+`response`:
+Travel Safety Level:
+    "Exercise a high degree of caution" in Indonesia overall.
+Reasons:
+    ongoing risk of terrorist attack.
+Since no specific advice level for Jakarta is provided, the overall advice for Indonesia applies.
+
+---
+
+Please complete the task using following information:
+"""
+
+# per request part of the advice prompt holding the fields of the advice page and query
+ADVICE_PROMPT_SUFFIX = """`title`: {title}
+`description`: {description}
+`latest_update`: {latest_update}
+`advice_levels`: {advice_levels}
+`query`: {query}
+
+Please generate the response, if information is not sufficient to complete the task do not make up the answer, and response with "I do not have sufficient information to provide you with the advice."
+If {query} is not related to travel or travel advice, respones with "Please only ask travel advice related questions."
+"""
+
+
 def create_prompt_template_for_travel_advice() -> PromptTemplate:
     """Creates a prompt template for generating travel advice."""
-    template = """ 
-        Given the following inputs:
-        
-        `title`: The title of the webpage.
-        `description`: A brief description of the webpage content.
-        `latest_update`: The latest update of the travel advisory for the country.
-        `advice_levels`: The score level of the country and its sub-regions.
-        `query`: The question that the traveller asked about the country he is going to travel to.
-        
-        ===================================================================================================
-        
-        Your task is to assess whether it is safe to travel to the specified country and provide reasons for your assessment
-        that is related to the `latest_update`.
-        If a sub-region is specified, also provide the advice level for that sub-region. 
-        Do not list advice levels for sub-regions that are not specified or the information is not provided.
-        
-        Your responsed advice should be one of following:
-        ['Do Not Travel', 'Reconsider Your Need to Travel', 'Exercise a High Degree of Caution', 'Exercise Normal Safety Precautions']
-        If the `title` returns "page not found", respond with: "There is no trip advisory based on the current information."
-        
-        ===================================================================================================
-
-        Example:
-        
-        Give following inputs:
-
-        `title`: "Indonesia Travel Advice & Safety | Smartraveller"
-        `description`: "Australian Government travel advice for Indonesia. Exercise a high degree of caution. Travel advice level YELLOW. 
-        Understand the risks, safety, laws and contacts."
-        `latest_update`: "The Bali Provincial Government has introduced a new tourist levy of IDR 150,000 per person to foreign tourists entering Bali. 
-        The tourist levy is separate from the e-Visa on Arrival or the Visa on Arrival. Cashless payments can be made online prior to travel or on arrival 
-        at designated payment counters at Bali's airport and seaport. See the Bali Provincial Government's official website for further information (see 
-        link in 'Travel' section below)."
-        `advice_levels`: "Exercise a high degree of caution" in Indonesia overall.\n"Reconsider Your Need to Travel" in Papua.
-        
-        with different queries, you should give different responses:
-        Case 1:
-        `query`: "I would like to travel to Indonesia. Is it safe?"
-        `response`:
-        Travel Safety Level: 
-            "Exercise a high degree of caution" in Indonesia overall.
-        Reasons:
-            ongoing risk of terrorist attack.
-            the risk of serious security incidents or demonstrations that may turn violent.
-        Case 2:
-        `query`: "I would like to travel to Papua in Indonesia. Is it safe?"
-        `response`:
-        Travel Safety Level: 
-            "Exercise a high degree of caution" in Indonesia overall.
-            "Reconsider Your Need to Travel" in Papua.
-        Reasons:
-            ongoing risk of terrorist attack.
-        Case 3:
-        `query`: "I would like to travel to Jakarta in Indonesia. Is it safe?"
-        `response`:
-       Travel Safety Level: 
-            "Exercise a high degree of caution" in Indonesia overall.
-        Reasons:
-            ongoing risk of terrorist attack.
-        Since no specific advice level for Jakarta is provided, the overall advice for Indonesia applies.
-
-        ===================================================================================================
-        
-        Please complete the task using following information:
-        `title`: {title}
-        `description`:{description}
-        `latest_update`: {latest_update}
-        `advice_levels`: {advice_levels}
-        `query`: {query}
-        
-        Please generate the response, if information is not sufficient to complete the task do not make up 
-        the answer, and response with "I do not have sufficient information to provide you with the advice."
-        If {query} is not related to travel or travel advice, respones with "Please only ask travel advice related questions."
-        """
-
     prompt_template = PromptTemplate(
-        input_variables=define_information_input_variables().keys,
-        template=template,
+        input_variables=list(define_information_input_variables()),
+        template=ADVICE_PROMPT_PREFIX + ADVICE_PROMPT_SUFFIX,
     )
 
     return prompt_template
 
 
+@lru_cache(maxsize=None)
+def _prefix_tokens() -> int:
+    """Returns the tokens of the static prompt prefix, counted once per process."""
+    return TOKEN_COUNTER(ADVICE_PROMPT_PREFIX)
+
+
 def create_prompt_for_travel_advice_response(
     fields_dict: Dict[str, Union[Document, Dict[str, str]]]
-) -> RunnableSequence:
-    """Creates a prompt for generating a travel advice response."""
-    required_fields = get_required_prompt_fields(**fields_dict)
+) -> str:
+    """
+    Creates a prompt for generating a travel advice response, with the compacted
+    fields of `get_prompt_fields`. Its tokens are recorded in the request log.
+
+    Only the short suffix is formatted per request, the static prefix is prepended as is.
+    """
+    prompt_fields = get_prompt_fields(**fields_dict)
+    suffix = ADVICE_PROMPT_SUFFIX.format(**prompt_fields)
+    # counting takes longer than building the prompt, only count for the request log
+    if recording_prompt_tokens():
+        record_prompt_tokens(_prefix_tokens() + TOKEN_COUNTER(suffix))
+    return ADVICE_PROMPT_PREFIX + suffix
+
+
+def _store_response(
+    chunks: Iterator[str], doc: Document, query: str, response_cache: ResponseCache
+) -> Iterator[str]:
+    response = ""
+    for chunk in chunks:
+        response += chunk
+        yield chunk
+    response_cache.store(doc, query, response)
+
+
+async def _astore_response(
+    chunks: AsyncIterator[str], doc: Document, query: str, response_cache: ResponseCache
+) -> AsyncIterator[str]:
+    response = ""
+    async for chunk in chunks:
+        response += chunk
+        yield chunk
+    await response_cache.astore(doc, query, response)
+
+
+def _advice_chain(
+    doc: Document,
+    query: str,
+    doc2advice_chain: Runnable,
+    response_cache: Optional[ResponseCache],
+) -> Runnable:
+    """Returns the chat model chain answering the query, caching its response."""
+    if response_cache is None:
+        return doc2advice_chain
+    # pass the chunks through so the advice can still be streamed, and cache
+    # the full response once the chat model finished
+    store_response = RunnableGenerator(
+        partial(_store_response, doc=doc, query=query, response_cache=response_cache),
+        partial(_astore_response, doc=doc, query=query, response_cache=response_cache),
+    )
+    return doc2advice_chain | store_response
+
+
+def _answer_without_llm(
+    fields_dict: Dict[str, Union[Document, Dict[str, str]]],
+    doc2advice_chain: Runnable,
+    response_cache: Optional[ResponseCache],
+    level_answerer: Optional["AdviceLevelAnswerer"],
+):
+    doc, query = fields_dict["doc"], fields_dict["query"]
+    if isinstance(query, dict):
+        query = query["query"]
+    if level_answerer is not None:
+        if (response := level_answerer.answer(doc, query)) is not None:
+            return response
+    if response_cache is not None:
+        if (response := response_cache.lookup(doc, query)) is not None:
+            return response
+    return _advice_chain(doc, query, doc2advice_chain, response_cache)
 
-    prompt_template = create_prompt_template_for_travel_advice()
-    prompt = prompt_template.format(**required_fields)
-    return prompt
 
+async def _aanswer_without_llm(
+    fields_dict: Dict[str, Union[Document, Dict[str, str]]],
+    doc2advice_chain: Runnable,
+    response_cache: Optional[ResponseCache],
+    level_answerer: Optional["AdviceLevelAnswerer"],
+):
+    doc, query = fields_dict["doc"], fields_dict["query"]
+    if isinstance(query, dict):
+        query = query["query"]
+    if level_answerer is not None:
+        if (response := level_answerer.answer(doc, query)) is not None:
+            return response
+    if response_cache is not None:
+        # the shared store is read in a thread, off the event loop
+        if (response := await response_cache.alookup(doc, query)) is not None:
+            return response
+    return _advice_chain(doc, query, doc2advice_chain, response_cache)
 
-def construct_doc2advice_chain(chat_model: BaseChatModel):
+
+def construct_doc2advice_chain(
+    chat_model: BaseChatModel,
+    response_cache: Optional[ResponseCache] = None,
+    level_answerer: Optional["AdviceLevelAnswerer"] = None,
+):
     """
     Construct the chain that takes in a dictionary of doc (support information)
     and the original query provided by the user. The chain will output the final advice.
+    When a response cache is given, advice for similar queries about the same version
+    of the page is served from the cache instead of the chat model. When a level
+    answerer is given, queries only asking how safe the destination is are answered
+    from the advice levels of the page.
     """
     doc2advice_chain = (
         RunnableLambda(create_prompt_for_travel_advice_response)
         | chat_model
         | StrOutputParser()
     )
+    if response_cache is None and level_answerer is None:
+        return doc2advice_chain
+
+    components = dict(
+        doc2advice_chain=doc2advice_chain,
+        response_cache=response_cache,
+        level_answerer=level_answerer,
+    )
+    return RunnableLambda(
+        partial(_answer_without_llm, **components),
+        afunc=partial(_aanswer_without_llm, **components),
+    )
+
+
+def destination_name(doc: Document) -> str:
+    """Returns the destination of an advice page, e.g. "Indonesia"."""
+    title = doc.metadata.get("title") or ""
+    if name := title.split(" Travel Advice")[0].strip():
+        return name
+    return doc.metadata.get("source", "").rstrip("/").rsplit("/", 1)[-1]
+
+
+def format_trip_advice(docs: List[Document], answers: List[str]) -> str:
+    """Joins the advice for every destination of a trip, each under its destination."""
+    return "\n\n".join(
+        f"{destination_name(doc)}:\n{answer}" for doc, answer in zip(docs, answers)
+    )
+
+
+def _url2docs(urls: Union[str, List[str]], config: RunnableConfig, url2doc_chain):
+    if isinstance(urls, str):
+        return url2doc_chain
+    return url2doc_chain.batch(urls, config)
+
+
+async def _aurl2docs(
+    urls: Union[str, List[str]], config: RunnableConfig, url2doc_chain
+):
+    if isinstance(urls, str):
+        return url2doc_chain
+    return await url2doc_chain.abatch(urls, config)
+
+
+def construct_trip_url2doc_chain(url2doc_chain: Runnable) -> Runnable:
+    """
+    Wraps the url to doc chain so the advice pages of every destination of a trip, a
+    list of urls, are retrieved concurrently. A single url is passed to the chain.
+    """
+    return RunnableLambda(
+        partial(_url2docs, url2doc_chain=url2doc_chain),
+        afunc=partial(_aurl2docs, url2doc_chain=url2doc_chain),
+        name="trip_url2doc",
+    )
+
+
+def _trip_legs(fields_dict: Dict[str, Union[Document, List[Document]]]):
+    return [{"doc": doc, "query": fields_dict["query"]} for doc in fields_dict["doc"]]
+
+
+def _doc2trip_advice(fields_dict, config: RunnableConfig, doc2advice_chain):
+    if isinstance(fields_dict["doc"], Document):
+        return doc2advice_chain
+    answers = doc2advice_chain.batch(_trip_legs(fields_dict), config)
+    return format_trip_advice(fields_dict["doc"], answers)
+
+
+async def _adoc2trip_advice(fields_dict, config: RunnableConfig, doc2advice_chain):
+    if isinstance(fields_dict["doc"], Document):
+        return doc2advice_chain
+    answers = await doc2advice_chain.abatch(_trip_legs(fields_dict), config)
+    return format_trip_advice(fields_dict["doc"], answers)
+
+
+def construct_trip_doc2advice_chain(doc2advice_chain: Runnable) -> Runnable:
+    """
+    Wraps the doc to advice chain so the advice for every destination of a trip, a
+    list of docs, is generated concurrently and joined into one answer. The advice
+    for a single doc is generated, and streamed, by the chain.
+    """
+    return RunnableLambda(
+        partial(_doc2trip_advice, doc2advice_chain=doc2advice_chain),
+        afunc=partial(_adoc2trip_advice, doc2advice_chain=doc2advice_chain),
+        name="trip_doc2advice",
+    )
+
 
-    return doc2advice_chain
+def construct_named_stages(
+    chat_model: BaseChatModel,
+    page_cache: Optional[PageCache] = None,
+    resolver: Optional[DestinationResolver] = None,
+    store: Optional["AdvisoryStore"] = None,
+    response_cache: Optional[ResponseCache] = None,
+    level_answerer: Optional["AdviceLevelAnswerer"] = None,
+    llm_budget: Optional["LLMBudget"] = None,
+    extraction_model: Optional[BaseChatModel] = None,
+) -> Tuple[Runnable, Runnable, Runnable]:
+    """
+    Constructs the query2url, url2doc and doc2advice stages, named after the stage
+    so their runs can be told apart in streamed events and callbacks. The url2doc
+    and doc2advice stages handle the several destinations of a trip concurrently.
+    The destinations are extracted with the optional extraction model, e.g. a smaller
+    and faster model, or the chat model. The chat model calls of both stages are held
+    to the optional LLM budget.
+    """
+    extraction_model = extraction_model or chat_model
+    if llm_budget is not None:
+        chat_model = llm_budget.bind(chat_model)
+        extraction_model = llm_budget.bind(extraction_model)
+    return (
+        construct_query2url_chain(extraction_model, resolver).with_config(
+            run_name="query2url"
+        ),
+        construct_trip_url2doc_chain(
+            construct_url2doc_chain(page_cache, store)
+        ).with_config(run_name="url2doc"),
+        construct_trip_doc2advice_chain(
+            construct_doc2advice_chain(chat_model, response_cache, level_answerer)
+        ).with_config(run_name="doc2advice"),
+    )
 
 
-def construct_query2advice_chain(chat_model: BaseChatModel):
-    """Constructs a end to end query to advice chain for the given chat model."""
+def construct_query2advice_chain(
+    chat_model: BaseChatModel,
+    page_cache: Optional[PageCache] = None,
+    resolver: Optional[DestinationResolver] = None,
+    store: Optional["AdvisoryStore"] = None,
+    response_cache: Optional[ResponseCache] = None,
+    level_answerer: Optional["AdviceLevelAnswerer"] = None,
+    llm_budget: Optional["LLMBudget"] = None,
+    extraction_model: Optional[BaseChatModel] = None,
+):
+    """
+    Constructs a end to end query to advice chain for the given chat model.
+    The optional page cache is shared by every run of the chain, the optional
+    destination resolver saves the chat model call for queries it can resolve,
+    the optional advisory store serves pages crawled in the background and the
+    optional response cache serves advice for repeated questions and the
+    optional level answerer answers "is it safe" questions without the chat model.
+    The optional LLM budget bounds the chat model calls in flight and the optional
+    extraction model extracts the destinations in place of the chat model.
+    """
 
-    query2url_chain = construct_query2url_chain(chat_model)
-    url2doc_chain = construct_url2doc_chain()
-    doc2advice_chain = construct_doc2advice_chain(chat_model)
+    query2url_chain, url2doc_chain, doc2advice_chain = construct_named_stages(
+        chat_model,
+        page_cache,
+        resolver,
+        store,
+        response_cache,
+        level_answerer,
+        llm_budget,
+        extraction_model,
+    )
     query2advice_chain = (
         RunnableParallel(
             {
@@ -218,3 +568,84 @@ def construct_query2advice_chain(chat_model: BaseChatModel):
         | doc2advice_chain
     )
     return query2advice_chain
+
+
+def construct_batch_query2advice_chain(
+    chat_model: BaseChatModel,
+    page_cache: Optional[PageCache] = None,
+    resolver: Optional[DestinationResolver] = None,
+    store: Optional["AdvisoryStore"] = None,
+    response_cache: Optional[ResponseCache] = None,
+    level_answerer: Optional["AdviceLevelAnswerer"] = None,
+    llm_budget: Optional["LLMBudget"] = None,
+    extraction_model: Optional[BaseChatModel] = None,
+):
+    """
+    Constructs a chain answering a list of queries stage by stage: all destinations are
+    resolved together, every distinct advice page is retrieved once, and the advice is
+    generated with batched chat model calls. The output holds the advice or the
+    exception of every query, in input order. Set `max_concurrency` in the run config
+    to bound the concurrent calls of each stage.
+    """
+    query2url_chain, url2doc_chain, doc2advice_chain = construct_named_stages(
+        chat_model,
+        page_cache,
+        resolver,
+        store,
+        response_cache,
+        level_answerer,
+        llm_budget,
+        extraction_model,
+    )
+
+    async def abatch_query2advice(
+        inputs: List[Dict[str, str]], config: RunnableConfig
+    ) -> List[Union[str, Exception]]:
+        results = await query2url_chain.abatch(inputs, config, return_exceptions=True)
+
+        # the urls of a trip are retrieved with the urls of the other queries
+        urls = list(
+            dict.fromkeys(
+                url
+                for result in results
+                if not isinstance(result, Exception)
+                for url in ([result] if isinstance(result, str) else result)
+            )
+        )
+        docs = await url2doc_chain.abatch(urls, config, return_exceptions=True)
+        doc_by_url = dict(zip(urls, docs))
+        results = [
+            (
+                _docs_for_urls(result, doc_by_url)
+                if not isinstance(result, Exception)
+                else result
+            )
+            for result in results
+        ]
+
+        pending = [
+            index
+            for index, result in enumerate(results)
+            if not isinstance(result, Exception)
+        ]
+        answers = await doc2advice_chain.abatch(
+            [{"doc": results[index], "query": inputs[index]} for index in pending],
+            config,
+            return_exceptions=True,
+        )
+        for index, answer in zip(pending, answers):
+            results[index] = answer
+        return results
+
+    return RunnableLambda(abatch_query2advice, name="batch_query2advice")
+
+
+def _docs_for_urls(
+    urls: Union[str, List[str]], doc_by_url: Dict[str, Union[Document, Exception]]
+) -> Union[Document, List[Document], Exception]:
+    """Returns the doc, or the docs of a trip, of the urls or the first retrieval error."""
+    if isinstance(urls, str):
+        return doc_by_url[urls]
+    docs = [doc_by_url[url] for url in urls]
+    errors = [doc for doc in docs if isinstance(doc, Exception)]
+    return errors[0] if errors else docs
@@ -1,14 +1,25 @@
-from typing import List, Dict
+import asyncio
+from functools import partial
+from typing import TYPE_CHECKING, Dict, List, Optional, Union
 
-from langchain_community.document_loaders import WebBaseLoader
-from langchain_community.document_transformers import Html2TextTransformer
+import httpx
 from langchain_core.documents.base import Document
 from langchain_core.language_models import BaseChatModel
 from langchain_core.prompts import PromptTemplate
-from langchain_core.runnables import RunnableSequence, RunnableLambda
-from langchain_core.output_parsers import PydanticOutputParser
+from langchain_core.runnables import Runnable, RunnableSequence, RunnableLambda
+from langchain_core.exceptions import OutputParserException
+from langchain_core.output_parsers import PydanticOutputParser, StrOutputParser
 from pydantic import BaseModel, Field
 
+from adviser.advisory_extractor import extract_advisory_document
+from adviser.config import SMARTRAVELLER_BASE_URL
+from adviser.page_cache import CachedPage, PageCache
+from adviser.page_fetcher import PAGE_FETCHER
+
+if TYPE_CHECKING:
+    from adviser.advisory_store import AdvisoryStore
+    from adviser.destination_resolver import DestinationResolver
+
 
 class Country(BaseModel):
     name: str = Field(
@@ -30,49 +41,257 @@ class Country(BaseModel):
     )
 
 
+class Trip(BaseModel):
+    destinations: List[Country] = Field(
+        description="""
+    Every country the user is asking travel advice for, in the order of the trip.
+    A question about a single country has a single destination.
+    """
+    )
+
+
 def get_url_for_travel_advice(country: Country) -> str:
     """Get the url for the travel advice, receives the location dictionary and returns the url"""
     region = country.region
     country = country.name
     if (not region) | (not country):
         raise ValueError("Please provide the region and country for travel advice")
-    return f"https://www.smartraveller.gov.au/destinations/{region}/{country}"
+    return f"{SMARTRAVELLER_BASE_URL}/{region}/{country}"
 
 
-def construct_query2url_chain(chat_model: BaseChatModel) -> RunnableSequence:
-    """Construct the chain for retrieving the URL for travel advice from a query."""
-    parser = PydanticOutputParser(pydantic_object=Country)
-    prompt = PromptTemplate(
-        template="""Find the country and its region that the user is asking for travel advice.
+def get_urls_for_travel_advice(countries: List[Country]) -> Union[str, List[str]]:
+    """
+    Get the url for the travel advice of a single destination, or the list of urls of
+    every destination of a trip.
+    """
+    urls = list(dict.fromkeys(map(get_url_for_travel_advice, countries)))
+    if not urls:
+        raise ValueError("Please provide the region and country for travel advice")
+    return urls[0] if len(urls) == 1 else urls
+
+
+TRIP_PARSER = PydanticOutputParser(pydantic_object=Trip)
+COUNTRY_PARSER = PydanticOutputParser(pydantic_object=Country)
+
+
+def parse_destinations(text: str) -> List[Country]:
+    """Parses the destinations answered by the chat model, a trip or a single country."""
+    try:
+        return TRIP_PARSER.parse(text).destinations
+    except OutputParserException:
+        return [COUNTRY_PARSER.parse(text)]
+
+
+def trip_destinations(trip: Optional[Trip]) -> List[Country]:
+    """Returns the destinations of the trip called by the chat model, if it called one."""
+    return trip.destinations if trip is not None else []
+
+
+def supports_structured_output(chat_model: Runnable) -> bool:
+    """
+    Whether the chat model implements tool calling, which structured output is built
+    on. A model bound to a budget or to call options is checked through its binding.
+    """
+    chat_model = getattr(chat_model, "bound", chat_model)
+    return (
+        isinstance(chat_model, BaseChatModel)
+        and type(chat_model).bind_tools is not BaseChatModel.bind_tools
+    )
+
+
+_QUERY2URL_TEMPLATE = """Find the country and its region that the user is asking for travel advice.
+        When the user travels to several countries, list every one of them in the order of the trip.
         Be careful, Indonesia belongs to the asia region, not pacific.
-        {format_instructions}\n{query}""",
+        """
+
+
+def construct_destination_extractor(chat_model: BaseChatModel) -> Runnable:
+    """
+    Construct the chain extracting the destinations of a query. Chat models with tool
+    calling return the trip as a function call (structured output), others answer
+    the format instructions of the trip in free text, which is parsed.
+    """
+    if supports_structured_output(chat_model):
+        prompt = PromptTemplate.from_template(_QUERY2URL_TEMPLATE + "{query}")
+        return (
+            prompt
+            | chat_model.with_structured_output(Trip)
+            | RunnableLambda(trip_destinations)
+        )
+    prompt = PromptTemplate(
+        template=_QUERY2URL_TEMPLATE + "{format_instructions}\n{query}",
         input_variables=["query"],
-        partial_variables={"format_instructions": parser.get_format_instructions()},
+        partial_variables={
+            "format_instructions": TRIP_PARSER.get_format_instructions()
+        },
+    )
+    return prompt | chat_model | StrOutputParser() | RunnableLambda(parse_destinations)
+
+
+def _resolve_url(inputs: Dict[str, str], resolver, query2url):
+    countries = resolver.resolve_trip(inputs["query"])
+    if countries is None:
+        # returning the runnable makes langchain invoke it with the same inputs
+        return query2url
+    return get_urls_for_travel_advice(countries)
+
+
+async def _aresolve_url(inputs: Dict[str, str], resolver, query2url):
+    # resolving takes microseconds, no need to hand it to a thread
+    return _resolve_url(inputs, resolver, query2url)
+
+
+def construct_query2url_chain(
+    chat_model: BaseChatModel, resolver: Optional["DestinationResolver"] = None
+) -> RunnableSequence:
+    """
+    Construct the chain for retrieving the URL for travel advice from a query, or
+    the list of URLs when the query is about a trip to several destinations.
+    When a destination resolver is given the chat model is only asked for the
+    queries the resolver cannot resolve on its own.
+    """
+    query2url = construct_destination_extractor(chat_model) | RunnableLambda(
+        get_urls_for_travel_advice
     )
+    if resolver is None:
+        return query2url
 
-    query2url = prompt | chat_model | parser | RunnableLambda(get_url_for_travel_advice)
-    return query2url
+    # partials rather than closures, langchain inspects the source of closures on
+    # every run to trace them
+    return RunnableLambda(
+        partial(_resolve_url, resolver=resolver, query2url=query2url),
+        afunc=partial(_aresolve_url, resolver=resolver, query2url=query2url),
+        name="query2url",
+    )
 
 
-def load_from_url(url: str) -> Document:
+def load_from_url(url: str) -> List[Document]:
     """Retrieve the advice HTML content for travel from the given URL."""
-    try:
-        html_content = WebBaseLoader(url).load()
-    except Exception as e:
-        raise Exception(f"Error retrieving web content: {str(e)}")
-    return html_content
+    response = PAGE_FETCHER.get(url)
+    return [parse_html_document(response.text, url)]
+
+
+def parse_html_document(html: str, url: str) -> Document:
+    """Parse the raw HTML into a document the same way `WebBaseLoader` does."""
+    # only the uncached chain parses whole pages, keep bs4 out of the app startup
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    metadata = {"source": url}
+    if title := soup.find("title"):
+        metadata["title"] = title.get_text()
+    if description := soup.find("meta", attrs={"name": "description"}):
+        metadata["description"] = description.get("content", "No description found.")
+    if html_tag := soup.find("html"):
+        metadata["language"] = html_tag.get("lang", "No language found.")
+    return Document(page_content=soup.get_text(), metadata=metadata)
+
+
+async def afetch_url(
+    url: str, headers: Optional[Dict[str, str]] = None
+) -> httpx.Response:
+    """
+    Asynchronously send a GET request for the url with the shared pooled client.
+
+    Raises `PageFetchError` (or `PageFetchTimeout`) when Smartraveller can not be
+    reached or keeps failing with a server error after the retries.
+    """
+    return await PAGE_FETCHER.aget(url, headers=headers)
+
+
+async def aload_from_url(url: str) -> List[Document]:
+    """Asynchronously retrieve the advice HTML content for travel from the given URL."""
+    response = await afetch_url(url)
+    # parsing is CPU bound, keep it off the event loop
+    document = await asyncio.to_thread(parse_html_document, response.text, url)
+    return [document]
 
 
 def transform_html_content(html_content: Document) -> Document:
     """Transform the HTML content to text content."""
+    from langchain_community.document_transformers import Html2TextTransformer
+
     html2text = Html2TextTransformer()
     docs_transformed = html2text.transform_documents(html_content)
     return docs_transformed[0]
 
 
-def construct_url2doc_chain() -> Document:
-    """Construct the chain for retrieving the advice text document from a URL."""
-    url2doc_chain = RunnableLambda(load_from_url) | RunnableLambda(
-        transform_html_content
+def _revalidation_headers(stale: Optional[CachedPage]) -> Dict[str, str]:
+    headers = {}
+    if stale is not None and stale.etag:
+        headers["If-None-Match"] = stale.etag
+    if stale is not None and stale.last_modified:
+        headers["If-Modified-Since"] = stale.last_modified
+    return headers
+
+
+def _page_from_response(url: str, response: httpx.Response) -> CachedPage:
+    return CachedPage(
+        document=extract_advisory_document(response.text, url),
+        etag=response.headers.get("ETag"),
+        last_modified=response.headers.get("Last-Modified"),
+        status_code=response.status_code,
     )
+
+
+def load_page(url: str, stale: Optional[CachedPage] = None) -> CachedPage:
+    """
+    Load the advice page for the page cache, keeping only its advisory sections
+    (see `extract_advisory_document`).
+
+    When a stale page is given it is revalidated with `If-None-Match`/`If-Modified-Since`
+    and returned as is if the server responds with 304 Not Modified.
+    """
+    response = PAGE_FETCHER.get(url, headers=_revalidation_headers(stale))
+    if stale is not None and response.status_code == 304:
+        return stale
+    return _page_from_response(url, response)
+
+
+async def aload_page(url: str, stale: Optional[CachedPage] = None) -> CachedPage:
+    """Asynchronous version of `load_page`."""
+    response = await afetch_url(url, headers=_revalidation_headers(stale))
+    if stale is not None and response.status_code == 304:
+        return stale
+    # parsing is CPU bound, keep it off the event loop
+    return await asyncio.to_thread(_page_from_response, url, response)
+
+
+def construct_url2doc_chain(
+    page_cache: Optional[PageCache] = None, store: Optional["AdvisoryStore"] = None
+) -> Document:
+    """
+    Construct the chain for retrieving the advice text document from a URL.
+    When a page cache is given the transformed documents are served from it, and
+    when an advisory store is given pages are read from the store instead of
+    being fetched from Smartraveller.
+    """
+    load, aload = load_page, aload_page
+    if store is not None:
+        load, aload = store.load_page, store.aload_page
+
+    if page_cache is not None:
+        return RunnableLambda(
+            partial(page_cache.get, load=load),
+            afunc=partial(page_cache.aget, load=aload),
+            name="cached_url2doc",
+        )
+    if store is not None:
+        return RunnableLambda(
+            partial(_load_document, load=load),
+            afunc=partial(_aload_document, load=aload),
+            name="stored_url2doc",
+        )
+    url2doc_chain = RunnableLambda(
+        load_from_url, afunc=aload_from_url
+    ) | RunnableLambda(transform_html_content)
     return url2doc_chain
+
+
+def _load_document(url: str, load) -> Document:
+    return load(url).document
+
+
+async def _aload_document(url: str, load) -> Document:
+    page = await load(url)
+    return page.document
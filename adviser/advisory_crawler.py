@@ -0,0 +1,164 @@
+"""
+Background job keeping the advisory store up to date with every Smartraveller destination.
+
+Run a single refresh from the command line with:
+
+    python -m adviser.advisory_crawler
+"""
+
+import argparse
+import asyncio
+import logging
+import math
+import os
+import random
+from typing import IO, TYPE_CHECKING, Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # not on Windows, every worker refreshes there
+    fcntl = None
+
+from adviser.adviser_support_info_retriver import (
+    Country,
+    aload_page,
+    get_url_for_travel_advice,
+)
+from adviser.advisory_store import AdvisoryStore
+from adviser.config import (
+    ADVISORY_REFRESH_INTERVAL,
+    ADVISORY_STORE_PATH,
+    CRAWLER_CONCURRENCY,
+)
+from adviser.gazetteer import GAZETTEER
+
+if TYPE_CHECKING:
+    from adviser.shared_store import SharedStore
+
+logger = logging.getLogger(__name__)
+
+
+def destination_urls() -> List[str]:
+    """Returns the advice page urls of every destination in the gazetteer."""
+    return [
+        get_url_for_travel_advice(Country(name=slug, region=region))
+        for region, destinations in GAZETTEER.items()
+        for slug in destinations
+    ]
+
+
+async def refresh_store(
+    store: AdvisoryStore,
+    urls: Optional[List[str]] = None,
+    max_age: float = ADVISORY_REFRESH_INTERVAL,
+    concurrency: int = CRAWLER_CONCURRENCY,
+) -> Dict[str, int]:
+    """
+    Fetches the pages that are missing from the store or older than `max_age` seconds
+    and stores them with their extracted advisory fields.
+
+    Pages that are still fresh, e.g. after a restart, are not fetched again, and stored
+    pages are revalidated with their `ETag`/`Last-Modified` validators. Every stored
+    page is refreshed, not only the given urls, and pages Smartraveller no longer has
+    (e.g. 404) are removed from the store.
+    """
+    stale_urls = store.stale_urls(urls or destination_urls(), max_age)
+    # spread the refresh over the destinations instead of always starting with africa
+    random.shuffle(stale_urls)
+    slots = asyncio.Semaphore(concurrency)
+    counts = {"refreshed": 0, "missing": 0, "failed": 0}
+
+    async def refresh(url: str):
+        async with slots:
+            try:
+                stored = await asyncio.to_thread(store.get, url)
+                page = await aload_page(url, stored)
+                if page.status_code != 200:
+                    logger.warning("No advisory page at %s (%s)", url, page.status_code)
+                    await asyncio.to_thread(store.delete, url)
+                    counts["missing"] += 1
+                    return
+                await asyncio.to_thread(store.put, url, page)
+                counts["refreshed"] += 1
+            except Exception:
+                logger.exception("Failed to refresh the advisory page %s", url)
+                counts["failed"] += 1
+
+    await asyncio.gather(*[refresh(url) for url in stale_urls])
+    logger.info("Advisory store refresh finished: %s", counts)
+    return counts
+
+
+def _lock_file(store: AdvisoryStore) -> Optional[IO]:
+    """
+    Returns the lock file next to the store once this process holds it, or None while
+    another process does. The lock is released when the file is closed or the process
+    exits, so another worker takes over the refresh.
+    """
+    lock_file = open(f"{store.path}.refresh-lock", "a")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        return None
+    return lock_file
+
+
+async def run_periodic_refresh(
+    store: AdvisoryStore,
+    interval: float = ADVISORY_REFRESH_INTERVAL,
+    lock: Optional["SharedStore"] = None,
+):
+    """
+    Refreshes the advisory store every `interval` seconds until cancelled.
+
+    When the worker processes of a host share the store, the shared `lock` store lets a
+    single one of them refresh it every interval. Without one, the worker holding a
+    file lock next to the store refreshes it.
+    """
+    lock_file = None
+    try:
+        while True:
+            if lock is not None:
+                # the shared store takes whole seconds of expiry
+                refresh = await asyncio.to_thread(
+                    lock.set,
+                    "lock:advisory-refresh",
+                    str(os.getpid()),
+                    ex=math.ceil(interval),
+                    nx=True,
+                )
+            elif fcntl is not None:
+                lock_file = lock_file or _lock_file(store)
+                refresh = lock_file is not None
+            else:
+                refresh = True
+            if refresh:
+                await refresh_store(store, max_age=interval)
+            await asyncio.sleep(interval)
+    finally:
+        if lock_file is not None:
+            lock_file.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--store", default=ADVISORY_STORE_PATH)
+    parser.add_argument(
+        "--max-age",
+        type=float,
+        default=ADVISORY_REFRESH_INTERVAL,
+        help="Refresh pages older than this many seconds, 0 refreshes every page.",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    store = AdvisoryStore(args.store)
+    try:
+        asyncio.run(refresh_store(store, max_age=args.max_age))
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+from functools import lru_cache
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.documents.base import Document
+
+# elements whose text is never used in the prompt
+SKIPPED_TAGS = frozenset(
+    {"script", "style", "noscript", "template", "svg", "iframe", "nav", "footer"}
+)
+# elements separating words, e.g. "<h2>Latest update</h2><p>The..." reads "Latest update The..."
+BLOCK_TAGS = frozenset(
+    """
+    address article aside blockquote br dd details div dl dt figcaption figure form
+    h1 h2 h3 h4 h5 h6 header hr li main ol p pre section summary table td th tr ul
+    """.split()
+)
+# size of the html chunks fed to the parser between two checks of the sections
+CHUNK_SIZE = 8192
+
+# start marker, end marker and length of a page content section
+SectionMarkers = Tuple[str, Optional[str], Optional[int]]
+
+
+@lru_cache(maxsize=None)
+def advisory_section_markers() -> Tuple[SectionMarkers, ...]:
+    """Returns the markers of the page content sections used in the advice prompt."""
+    # imported here as the advice model imports the retriever which uses this module
+    from adviser.advise_model import define_information_input_variables
+
+    return tuple(
+        (field.html_section_start, field.html_section_end, field.html_section_length)
+        for field in define_information_input_variables().values()
+        if field.html_section == "page_content"
+    )
+
+
+class _AdvisoryContentParser(HTMLParser):
+    """Collects the page metadata and the visible text with its whitespace collapsed."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.metadata: Dict[str, str] = {}
+        self.pieces: List[str] = []
+        self._title: Optional[List[str]] = None
+        self._skipped_depth = 0
+        self._has_text = False
+        self._pending_space = False
+
+    def handle_starttag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]):
+        if tag in SKIPPED_TAGS:
+            self._skipped_depth += 1
+        elif tag == "title":
+            self._title = []
+        elif tag == "html" and "language" not in self.metadata:
+            self.metadata["language"] = dict(attrs).get("lang") or "No language found."
+        elif tag == "meta" and "description" not in self.metadata:
+            attributes = dict(attrs)
+            if attributes.get("name") == "description":
+                self.metadata["description"] = (
+                    attributes.get("content") or "No description found."
+                )
+        if tag in BLOCK_TAGS:
+            self._pending_space = True
+
+    def handle_endtag(self, tag: str):
+        if tag in SKIPPED_TAGS:
+            self._skipped_depth = max(self._skipped_depth - 1, 0)
+        elif tag == "title" and self._title is not None:
+            self.metadata.setdefault("title", "".join(self._title))
+            self._title = None
+        if tag in BLOCK_TAGS:
+            self._pending_space = True
+
+    def handle_data(self, data: str):
+        if self._title is not None:
+            self._title.append(data)
+            return
+        if self._skipped_depth:
+            return
+        words = data.split()
+        if not words:
+            self._pending_space = self._pending_space or bool(data)
+            return
+        piece = " ".join(words)
+        if self._has_text and (self._pending_space or data[0].isspace()):
+            piece = " " + piece
+        self.pieces.append(piece)
+        self._has_text = True
+        self._pending_space = data[-1].isspace()
+
+
+def _sections_start(text: str, sections: Sequence[SectionMarkers]) -> Optional[int]:
+    """
+    Returns where the first section starts once every section is complete in the text,
+    meaning that a longer text would not change any of the sections, otherwise None.
+    """
+    first_start = len(text)
+    for start_word, end_word, length in sections:
+        start = text.find(start_word)
+        if start == -1:
+            return None
+        if end_word:
+            if text.find(end_word, start) == -1:
+                return None
+        elif len(text) < start + (length or 0):
+            return None
+        first_start = min(first_start, start)
+    return first_start
+
+
+def extract_advisory_document(
+    html: str, url: str, sections: Optional[Sequence[SectionMarkers]] = None
+) -> Document:
+    """
+    Extracts the advice page metadata and the text of its advisory sections.
+
+    The HTML is parsed incrementally and parsing stops as soon as every section (see
+    `advisory_section_markers`) is complete, so the rest of the page is never read.
+    The page content holds the visible text from the first section on, without the
+    scripts, styles, navigation and footers. Pages without the sections, e.g. "page
+    not found", keep all their visible text.
+    """
+    if sections is None:
+        sections = advisory_section_markers()
+    parser = _AdvisoryContentParser()
+    text = ""
+    first_start = None
+    for position in range(0, len(html), CHUNK_SIZE):
+        parser.feed(html[position : position + CHUNK_SIZE])
+        text += "".join(parser.pieces)
+        parser.pieces.clear()
+        if (first_start := _sections_start(text, sections)) is not None:
+            break
+    else:
+        parser.close()
+        text += "".join(parser.pieces)
+        first_start = _sections_start(text, sections)
+
+    metadata = {"source": url, **parser.metadata}
+    return Document(page_content=text[first_start or 0 :], metadata=metadata)
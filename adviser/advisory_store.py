@@ -0,0 +1,154 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, Iterable, List, Optional
+
+from langchain_core.documents.base import Document
+
+from adviser.advise_model import get_required_prompt_fields
+from adviser.adviser_support_info_retriver import aload_page, load_page
+from adviser.config import ADVISORY_STORE_PATH
+from adviser.page_cache import CachedPage
+
+ADVISORY_FIELDS = ("title", "description", "latest_update", "advice_levels")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS advisories (
+    url TEXT PRIMARY KEY,
+    title TEXT,
+    description TEXT,
+    latest_update TEXT,
+    advice_levels TEXT,
+    document BLOB NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    fetched_at REAL NOT NULL
+)
+"""
+
+
+def _compress_document(document: Document) -> bytes:
+    payload = {"page_content": document.page_content, "metadata": document.metadata}
+    return zlib.compress(json.dumps(payload).encode())
+
+
+def _decompress_document(blob: bytes) -> Document:
+    return Document(**json.loads(zlib.decompress(blob)))
+
+
+class AdvisoryStore:
+    """
+    On-disk SQLite store of transformed advice pages and their extracted advisory fields.
+
+    The store is filled by the background crawler (see `adviser.advisory_crawler`)
+    and read on the request path, so pages survive process restarts and requests
+    do not wait on Smartraveller. Pages missing from the store are fetched once
+    on demand and stored, unless Smartraveller has no such page (e.g. 404), so only
+    existing destinations are kept and refreshed.
+    """
+
+    def __init__(self, path: str = ADVISORY_STORE_PATH):
+        self.path = path
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            # WAL lets request handlers read while the crawler writes
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(_SCHEMA)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute(
+                "SELECT COUNT(*) FROM advisories"
+            ).fetchone()[0]
+
+    def close(self):
+        self._connection.close()
+
+    def get(self, url: str) -> Optional[CachedPage]:
+        """Returns the stored page for the url, if any."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT document, etag, last_modified FROM advisories WHERE url = ?",
+                (url,),
+            ).fetchone()
+        if row is None:
+            return None
+        document, etag, last_modified = row
+        return CachedPage(
+            document=_decompress_document(document),
+            etag=etag,
+            last_modified=last_modified,
+        )
+
+    def get_fields(self, url: str) -> Optional[Dict[str, str]]:
+        """Returns the advisory fields extracted from the stored page, if any."""
+        with self._lock:
+            row = self._connection.execute(
+                f"SELECT {', '.join(ADVISORY_FIELDS)}, fetched_at FROM advisories WHERE url = ?",
+                (url,),
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip((*ADVISORY_FIELDS, "fetched_at"), row))
+
+    def put(self, url: str, page: CachedPage, fetched_at: Optional[float] = None):
+        """Stores the page with its advisory fields, replacing any previous version."""
+        fields = get_required_prompt_fields(page.document, query="")
+        row = (
+            url,
+            *(fields[name] for name in ADVISORY_FIELDS),
+            _compress_document(page.document),
+            page.etag,
+            page.last_modified,
+            fetched_at if fetched_at is not None else time.time(),
+        )
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO advisories VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                row,
+            )
+
+    def delete(self, url: str):
+        """Removes the page of the url, e.g. a destination Smartraveller no longer has."""
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM advisories WHERE url = ?", (url,))
+
+    def stale_urls(self, urls: Iterable[str], max_age: float) -> List[str]:
+        """
+        Returns the urls that are missing from the store and the stored urls, given or
+        not (e.g. resolved on demand), that are older than `max_age` seconds.
+        """
+        with self._lock:
+            fetched_at = dict(
+                self._connection.execute("SELECT url, fetched_at FROM advisories")
+            )
+        oldest = time.time() - max_age
+        return [
+            url
+            for url in dict.fromkeys([*urls, *fetched_at])
+            if fetched_at.get(url, 0.0) < oldest
+        ]
+
+    def load_page(self, url: str, stale: Optional[CachedPage] = None) -> CachedPage:
+        """Page loader serving from the store, the page is fetched only if it was never stored."""
+        if (page := self.get(url)) is not None:
+            return page
+        page = load_page(url)
+        if page.status_code == 200:
+            self.put(url, page)
+        return page
+
+    async def aload_page(
+        self, url: str, stale: Optional[CachedPage] = None
+    ) -> CachedPage:
+        """Asynchronous version of `load_page`."""
+        if (page := await asyncio.to_thread(self.get, url)) is not None:
+            return page
+        page = await aload_page(url)
+        if page.status_code == 200:
+            await asyncio.to_thread(self.put, url, page)
+        return page
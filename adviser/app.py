@@ -1,7 +1,136 @@
+import asyncio
+from functools import partial
+
 from adviser.make_app import make_app
-from langchain_openai import ChatOpenAI
-from adviser.advise_model import construct_query2advice_chain
+from adviser.admission import LLMBudget, RateLimiter
+from adviser.advice_levels import AdviceLevelAnswerer
+from adviser.advisory_crawler import destination_urls, run_periodic_refresh
+from adviser.advisory_store import AdvisoryStore
+from adviser.config import (
+    ADVICE_MAX_TOKENS,
+    ADVICE_MODEL,
+    ADVICE_TIMEOUT,
+    LLM_MAX_RETRIES,
+    OFFLINE_MODE,
+    QUERY2URL_MAX_TOKENS,
+    QUERY2URL_MODEL,
+    QUERY2URL_TIMEOUT,
+    RATE_LIMIT_API_KEYS,
+    RATE_LIMIT_BY_ADDRESS,
+    RATE_LIMIT_PER_MINUTE,
+    REQUEST_LOG_PATH,
+    SMARTRAVELLER_BASE_URL,
+)
+from adviser.destination_resolver import DestinationResolver
+from adviser.metrics import ChainMetrics
+from adviser.page_cache import PageCache
+from adviser.page_fetcher import PAGE_FETCHER
+from adviser.prompt_budget import TOKEN_COUNTER
+from adviser.request_log import RequestLog
+from adviser.response_cache import ResponseCache
+from adviser.shared_store import open_shared_store
+from adviser.single_flight import SingleFlight
+
+# shares the caches between the worker processes, see `adviser.serve`
+shared_store = open_shared_store()
+page_cache = PageCache(shared=shared_store)
+# offline the recorded pages are served as they are, the store of the live pages is
+# neither read nor filled with them, e.g. with the 404 pages of unrecorded destinations
+advisory_store = None if OFFLINE_MODE else AdvisoryStore()
+resolver = DestinationResolver()
+response_cache = ResponseCache(shared=shared_store)
+single_flight = SingleFlight()
+level_answerer = AdviceLevelAnswerer()
+chain_components = dict(
+    page_cache=page_cache,
+    resolver=resolver,
+    store=advisory_store,
+    response_cache=response_cache,
+    level_answerer=level_answerer,
+    # shared by the chains, so the single and batch requests share one budget
+    llm_budget=LLMBudget(),
+)
+
+
+def build_chat_models():
+    """Returns the advice and extraction chat models, fake ones in offline mode."""
+    if OFFLINE_MODE:
+        from adviser.fake_chat_model import FakeChatModel
+
+        return FakeChatModel(), FakeChatModel()
+
+    from langchain_openai import ChatOpenAI
+
+    # few retries, as retrying rate limited calls adds to the load of the provider
+    chat_model = ChatOpenAI(
+        temperature=0,
+        model=ADVICE_MODEL,
+        max_tokens=ADVICE_MAX_TOKENS,
+        timeout=ADVICE_TIMEOUT,
+        max_retries=LLM_MAX_RETRIES,
+    )
+    # the destinations are extracted with structured output, a short answer
+    extraction_model = ChatOpenAI(
+        temperature=0,
+        model=QUERY2URL_MODEL,
+        max_tokens=QUERY2URL_MAX_TOKENS,
+        timeout=QUERY2URL_TIMEOUT,
+        max_retries=LLM_MAX_RETRIES,
+    )
+    return chat_model, extraction_model
+
+
+def build_chains():
+    """Builds the query to advice chains, importing the chat model libraries."""
+    from adviser.advise_model import (
+        construct_batch_query2advice_chain,
+        construct_query2advice_chain,
+    )
+
+    chat_model, extraction_model = build_chat_models()
+    return (
+        construct_query2advice_chain(
+            chat_model, extraction_model=extraction_model, **chain_components
+        ),
+        construct_batch_query2advice_chain(
+            chat_model, extraction_model=extraction_model, **chain_components
+        ),
+    )
+
+
+async def warm_page_cache():
+    """Fills the page cache with the pages of the advisory store."""
+    await asyncio.to_thread(page_cache.warm, destination_urls(), advisory_store.get)
+
 
-chat_model = ChatOpenAI(temperature=0, model="gpt-4o-mini-2024-07-18")
-query2advice_chain = construct_query2advice_chain(chat_model)
-app = make_app(chain=query2advice_chain)
+app = make_app(
+    chain_factory=build_chains,
+    warmup_hooks=[
+        partial(PAGE_FETCHER.awarm, SMARTRAVELLER_BASE_URL),
+        *([warm_page_cache] if advisory_store is not None else []),
+        # tiktoken may download the encoding, keep it off the event loop
+        partial(asyncio.to_thread, TOKEN_COUNTER.load),
+    ],
+    background_jobs=(
+        [partial(run_periodic_refresh, advisory_store, lock=shared_store)]
+        if advisory_store is not None
+        else []
+    ),
+    shutdown_hooks=[PAGE_FETCHER.aclose],
+    metrics=ChainMetrics(
+        caches={
+            "page": page_cache,
+            "response": response_cache,
+            "resolver": resolver,
+            "request": single_flight,
+            "levels": level_answerer,
+        }
+    ),
+    request_log=RequestLog() if REQUEST_LOG_PATH else None,
+    single_flight=single_flight,
+    rate_limiter=(
+        RateLimiter()
+        if RATE_LIMIT_PER_MINUTE and (RATE_LIMIT_API_KEYS or RATE_LIMIT_BY_ADDRESS)
+        else None
+    ),
+)
@@ -4,6 +4,126 @@ from dotenv import load_dotenv
 load_dotenv()
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+SMARTRAVELLER_BASE_URL = os.getenv(
+    "SMARTRAVELLER_BASE_URL", "https://www.smartraveller.gov.au/destinations"
+)
+# Maximum number of advice requests a single worker processes at the same time.
+MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS", "16"))
+# Maximum number of advice requests waiting for a slot, extra requests are answered 503 at once.
+MAX_QUEUED_REQUESTS = int(os.getenv("MAX_QUEUED_REQUESTS", "64"))
+# Seconds an advice request may wait for a slot before it is answered 503.
+MAX_QUEUE_WAIT = float(os.getenv("MAX_QUEUE_WAIT", "10"))
+# Advice requests a client (API key, or address) may send per minute, 0 for no limit.
+RATE_LIMIT_PER_MINUTE = float(os.getenv("RATE_LIMIT_PER_MINUTE", "60"))
+# Advice requests a client may send in a burst above its per minute rate.
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "20"))
+# Comma separated API keys (`X-API-Key` header) rate limited per key, other keys are ignored.
+RATE_LIMIT_API_KEYS = frozenset(
+    key.strip()
+    for key in os.getenv("RATE_LIMIT_API_KEYS", "").split(",")
+    if key.strip()
+)
+# Rate limit the clients without a known API key per address, off as behind a proxy
+# every client shares the address of the proxy.
+RATE_LIMIT_BY_ADDRESS = os.getenv("RATE_LIMIT_BY_ADDRESS", "false").lower() == "true"
+# Maximum number of chat model calls in flight per worker, across the chain stages.
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+# Number of times the chat model client retries a failed call, e.g. on a provider 429.
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "1"))
+# Chat model extracting the destinations of a query, a small fast model is enough.
+QUERY2URL_MODEL = os.getenv("QUERY2URL_MODEL", "gpt-4o-mini-2024-07-18")
+# Maximum number of tokens of the destinations extracted from a query.
+QUERY2URL_MAX_TOKENS = int(os.getenv("QUERY2URL_MAX_TOKENS", "256"))
+# Timeout in seconds of a destination extraction call.
+QUERY2URL_TIMEOUT = float(os.getenv("QUERY2URL_TIMEOUT", "10"))
+# Chat model writing the advice from the advice page.
+ADVICE_MODEL = os.getenv("ADVICE_MODEL", "gpt-4o-mini-2024-07-18")
+# Maximum number of tokens of the advice for a destination.
+ADVICE_MAX_TOKENS = int(os.getenv("ADVICE_MAX_TOKENS", "1024"))
+# Timeout in seconds of an advice call.
+ADVICE_TIMEOUT = float(os.getenv("ADVICE_TIMEOUT", "30"))
+# tiktoken encoding counting the advice prompt tokens, estimated when it can not be loaded.
+PROMPT_TOKEN_ENCODING = os.getenv("PROMPT_TOKEN_ENCODING", "o200k_base")
+# Maximum number of tokens of the latest update of the advice page in the advice prompt.
+PROMPT_LATEST_UPDATE_TOKENS = int(os.getenv("PROMPT_LATEST_UPDATE_TOKENS", "200"))
+# Maximum number of tokens of the advice levels of the advice page in the advice prompt.
+PROMPT_ADVICE_LEVELS_TOKENS = int(os.getenv("PROMPT_ADVICE_LEVELS_TOKENS", "250"))
+# Serve the recorded pages and answer with a fake chat model, without network or API key.
+OFFLINE_MODE = os.getenv("OFFLINE_MODE", "false").lower() == "true"
+# Directory of the recorded Smartraveller pages, `{region}/{country}.html` files.
+RECORDED_PAGES_DIR = os.getenv("RECORDED_PAGES_DIR", "benchmarks/data/pages")
+# Seconds the fake chat model of the offline mode takes to its first token.
+FAKE_LLM_LATENCY = float(os.getenv("FAKE_LLM_LATENCY", "0.5"))
+# Tokens per second the fake chat model of the offline mode generates, 0 for no delay.
+FAKE_LLM_TOKENS_PER_SECOND = float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", "80"))
+# Maximum number of queries accepted by the batch advice endpoint.
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "50"))
+# Maximum number of concurrent calls per stage when answering a batch of queries.
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))
+# Timeout in seconds for retrieving a travel advice page.
+PAGE_FETCH_TIMEOUT = float(os.getenv("PAGE_FETCH_TIMEOUT", "10"))
+# Timeout in seconds for opening a connection to Smartraveller.
+PAGE_CONNECT_TIMEOUT = float(os.getenv("PAGE_CONNECT_TIMEOUT", "3"))
+# Number of times a failed advice page fetch is retried.
+PAGE_FETCH_RETRIES = int(os.getenv("PAGE_FETCH_RETRIES", "2"))
+# Base delay in seconds of the jittered exponential backoff between fetch retries.
+PAGE_FETCH_BACKOFF = float(os.getenv("PAGE_FETCH_BACKOFF", "0.2"))
+# Maximum number of pooled connections to Smartraveller.
+PAGE_FETCH_MAX_CONNECTIONS = int(os.getenv("PAGE_FETCH_MAX_CONNECTIONS", "32"))
+# Maximum number of concurrent fetches to the same host.
+PAGE_FETCH_PER_HOST = int(os.getenv("PAGE_FETCH_PER_HOST", "8"))
+# Negotiate HTTP/2 with Smartraveller, with the `h2` package of the requirements.
+PAGE_FETCH_HTTP2 = os.getenv("PAGE_FETCH_HTTP2", "true").lower() == "true"
+# Seconds a request waits for an advice page before the last cached copy is served, 0 for no deadline.
+PAGE_FETCH_DEADLINE = float(os.getenv("PAGE_FETCH_DEADLINE", "5"))
+# Consecutive failed fetches after which a host is no longer contacted for a while, 0 to disable.
+PAGE_BREAKER_THRESHOLD = int(os.getenv("PAGE_BREAKER_THRESHOLD", "5"))
+# Seconds a failing host is not contacted for before a single trial fetch is let through.
+PAGE_BREAKER_RESET = float(os.getenv("PAGE_BREAKER_RESET", "30"))
+# Seconds a cached advice page is served before it is revalidated with Smartraveller.
+PAGE_CACHE_TTL = float(os.getenv("PAGE_CACHE_TTL", "3600"))
+# Maximum number of advice pages kept in the page cache.
+PAGE_CACHE_MAX_SIZE = int(os.getenv("PAGE_CACHE_MAX_SIZE", "256"))
+# Seconds a cached advice response is served for.
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+# Maximum number of advice responses kept in the response cache.
+RESPONSE_CACHE_MAX_SIZE = int(os.getenv("RESPONSE_CACHE_MAX_SIZE", "1024"))
+# Minimum cosine similarity between two queries about the same page to share a response.
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.9"))
+# Upper bounds in seconds of the latency histogram buckets served by `/metrics`.
+METRICS_LATENCY_BUCKETS = [
+    float(bound)
+    for bound in os.getenv(
+        "METRICS_LATENCY_BUCKETS", "0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10,30"
+    ).split(",")
+]
+# Store sharing the page and response caches between the worker processes, e.g.
+# "sqlite:////tmp/adviser-cache.sqlite3" or "redis://localhost:6379/0", empty to not share them.
+SHARED_CACHE_URL = os.getenv("SHARED_CACHE_URL", "")
+# Number of worker processes serving the API, sized to the CPU cores by default.
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+# SQLite file holding the advice pages crawled in the background.
+ADVISORY_STORE_PATH = os.getenv("ADVISORY_STORE_PATH", "advisories.sqlite3")
+# Seconds between background refreshes of the advisory store.
+ADVISORY_REFRESH_INTERVAL = float(os.getenv("ADVISORY_REFRESH_INTERVAL", "21600"))
+# Maximum number of pages the background crawler fetches at the same time.
+CRAWLER_CONCURRENCY = int(os.getenv("CRAWLER_CONCURRENCY", "4"))
+# JSONL file the API requests are logged to, e.g. "logs/requests.jsonl", empty to disable.
+REQUEST_LOG_PATH = os.getenv("REQUEST_LOG_PATH", "")
+# Share of the API requests written to the request log, between 0 and 1.
+REQUEST_LOG_SAMPLE_RATE = float(os.getenv("REQUEST_LOG_SAMPLE_RATE", "1"))
+# Maximum number of requests logged per second, 0 for no limit.
+REQUEST_LOG_MAX_RATE = int(os.getenv("REQUEST_LOG_MAX_RATE", "0"))
+# Size in bytes at which the request log is rotated, 0 to never rotate on size.
+REQUEST_LOG_MAX_BYTES = int(os.getenv("REQUEST_LOG_MAX_BYTES", str(100 * 1024 * 1024)))
+# Seconds after which the request log is rotated, 0 to never rotate on age.
+REQUEST_LOG_ROTATE_INTERVAL = float(os.getenv("REQUEST_LOG_ROTATE_INTERVAL", "86400"))
+# Number of rotated request log files kept.
+REQUEST_LOG_BACKUP_COUNT = int(os.getenv("REQUEST_LOG_BACKUP_COUNT", "7"))
+# Maximum seconds logged requests wait in memory before being written to the file.
+REQUEST_LOG_FLUSH_INTERVAL = float(os.getenv("REQUEST_LOG_FLUSH_INTERVAL", "1"))
+# Maximum number of logged requests waiting to be written, extra requests are dropped.
+REQUEST_LOG_QUEUE_SIZE = int(os.getenv("REQUEST_LOG_QUEUE_SIZE", "10000"))
 INJECTION_PATTERNS = [
     # Command Overrides
     "ignore the previous",
@@ -93,3 +213,7 @@ INJECTION_PATTERNS = [
     "concatenate with",
     "combine this with",
 ]
+# Regular expressions matched against the normalized (case folded, single spaced) query
+# in addition to the literal INJECTION_PATTERNS, so they should be written in lower case.
+# None are shipped, the blocked queries are the ones of INJECTION_PATTERNS.
+INJECTION_REGEX_PATTERNS = []
@@ -0,0 +1,80 @@
+from typing import Dict, List, Optional, Set, Tuple
+
+from adviser.adviser_support_info_retriver import Country
+from adviser.gazetteer import GAZETTEER
+from adviser.request_log import record_cache_outcome
+from adviser.utils import normalize_text
+
+# key of the trie node holding the destinations a phrase ending at the node refers to
+_DESTINATIONS = ""
+
+
+class DestinationResolver:
+    """
+    Resolves the Smartraveller destination of a query from a local gazetteer.
+
+    The names and aliases of every destination are indexed in a token trie and the
+    query is scanned once, taking the longest phrase matching at each token, so
+    "papua new guinea" is not read as "papua" (Indonesia).
+    """
+
+    def __init__(self, gazetteer: Dict[str, Dict[str, List[str]]] = GAZETTEER):
+        self._trie: Dict = {}
+        for region, destinations in gazetteer.items():
+            for slug, aliases in destinations.items():
+                for phrase in [slug.replace("-", " "), *aliases]:
+                    self._add(normalize_text(phrase), (region, slug))
+        self.hits = 0
+        self.misses = 0
+
+    def _add(self, tokens: List[str], destination: Tuple[str, str]):
+        node = self._trie
+        for token in tokens:
+            node = node.setdefault(token, {})
+        node.setdefault(_DESTINATIONS, set()).add(destination)
+
+    def match(self, query: str) -> List[Set[Tuple[str, str]]]:
+        """Returns the candidate (region, slug) destinations of every phrase found in the query."""
+        tokens = normalize_text(query)
+        matches = []
+        position = 0
+        while position < len(tokens):
+            node, longest, end = self._trie, None, position
+            for index in range(position, len(tokens)):
+                node = node.get(tokens[index])
+                if node is None:
+                    break
+                if _DESTINATIONS in node:
+                    longest, end = node[_DESTINATIONS], index + 1
+            if longest is None:
+                position += 1
+            else:
+                matches.append(longest)
+                position = end
+        return matches
+
+    def resolve_trip(self, query: str) -> Optional[List[Country]]:
+        """
+        Returns the destination of the query as a trip of one destination, or None if
+        the query mentions no known destination, an ambiguous name, or several
+        destinations. Names of several destinations are not necessarily legs of a trip,
+        e.g. "I am French, can I travel to Egypt?", the chat model tells them apart.
+        """
+        candidates = self.match(query)
+        destinations = set().union(*candidates)
+        if len(destinations) != 1:
+            self.misses += 1
+            record_cache_outcome("resolver", "miss")
+            return None
+        self.hits += 1
+        record_cache_outcome("resolver", "hit")
+        ((region, slug),) = destinations
+        return [Country(name=slug, region=region)]
+
+    def resolve(self, query: str) -> Optional[Country]:
+        """
+        Returns the destination of the query, or None if the query mentions no known
+        destination, several destinations, or an ambiguous name.
+        """
+        destinations = self.resolve_trip(query)
+        return destinations[0] if destinations is not None else None
@@ -0,0 +1,253 @@
+import asyncio
+import hashlib
+import json
+import re
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import Runnable
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from adviser.advice_levels import parse_advice_levels
+from adviser.config import FAKE_LLM_LATENCY, FAKE_LLM_TOKENS_PER_SECOND
+from adviser.destination_resolver import DestinationResolver
+from adviser.prompt_budget import estimate_tokens
+
+NOT_FOUND_ADVICE = "There is no trip advisory based on the current information."
+INSUFFICIENT_ADVICE = (
+    "I do not have sufficient information to provide you with the advice."
+)
+# the fields of the advice page in the advice prompt, e.g. "`title`: ..."
+_PROMPT_FIELD = re.compile(
+    r"^`(?P<name>\w+)`: (?P<value>.*?)(?=\n`\w+`: |\n\n|\Z)", re.MULTILINE | re.DOTALL
+)
+# the pieces the answer is streamed in, a word and the whitespace after it
+_STREAM_PIECE = re.compile(r"\s*\S+\s*")
+_FIRST_SENTENCE = re.compile(r"[^.!?\n]*[.!?]?")
+# matches the destinations of the extraction prompts, shared by the fake models
+_RESOLVER = DestinationResolver()
+
+
+def _prompt_fields(prompt: str) -> Dict[str, str]:
+    # the fields follow the last separator, the prompt example has the same fields
+    fields = prompt.rpartition("\n---\n")[2]
+    return {
+        match["name"]: match["value"].strip()
+        for match in _PROMPT_FIELD.finditer(fields)
+    }
+
+
+def _message_text(message: AIMessage) -> str:
+    return message.content + "".join(
+        json.dumps(call["args"]) for call in message.tool_calls
+    )
+
+
+def _chunk_text(chunk: AIMessageChunk) -> str:
+    return chunk.content + "".join(
+        call["args"] or "" for call in chunk.tool_call_chunks
+    )
+
+
+def _unquote(value: str) -> str:
+    return value[1:-1] if len(value) > 1 and value[0] == value[-1] == '"' else value
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Deterministic chat model answering both chain stages without a provider, for the
+    offline mode, tests and benchmarks.
+
+    The destinations of a query are the gazetteer destinations it mentions, called as
+    a tool when tools are bound (structured output), else answered as the trip JSON.
+    The advice gives the advice levels parsed from the page fields of the prompt and
+    the first sentence of its latest update.
+
+    `canned_destinations` and `canned_advice` are answered instead when given, e.g.
+    for a stub server serving one page at every url.
+
+    Answers start after `latency` seconds and are generated at `tokens_per_second`
+    tokens (estimated), streamed word by word; 0 generates them at once. `calls`
+    counts the prompts answered.
+    """
+
+    latency: float = FAKE_LLM_LATENCY
+    tokens_per_second: float = FAKE_LLM_TOKENS_PER_SECOND
+    calls: int = 0
+    canned_destinations: Optional[List[Dict[str, str]]] = None
+    canned_advice: Optional[str] = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-model"
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any) -> Runnable:
+        return self.bind(
+            tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs
+        )
+
+    def destinations(self, query: str) -> List[Dict[str, str]]:
+        """Returns the destinations of the query, the first one of an ambiguous name."""
+        if self.canned_destinations is not None:
+            return self.canned_destinations
+        destinations = [sorted(candidates)[0] for candidates in _RESOLVER.match(query)]
+        return [
+            {"name": name, "region": region}
+            for region, name in dict.fromkeys(destinations)
+        ]
+
+    def advice(self, prompt: str) -> str:
+        """Returns the advice for the page fields and query of the advice prompt."""
+        if self.canned_advice is not None:
+            return self.canned_advice
+        fields = _prompt_fields(prompt)
+        title = _unquote(fields.get("title", ""))
+        if "page not found" in title.lower():
+            return NOT_FOUND_ADVICE
+        latest_update = _unquote(fields.get("latest_update", ""))
+        table = parse_advice_levels(
+            _unquote(fields.get("advice_levels", "")),
+            _unquote(fields.get("description", "")),
+            latest_update,
+        )
+        if table.overall is None:
+            return INSUFFICIENT_ADVICE
+        country = title.split(" Travel Advice")[0]
+        query = fields.get("query", "").lower()
+        lines = ["Travel Safety Level:", f'    "{table.overall}" in {country} overall.']
+        lines += [
+            f'    "{level}" in {region}.'
+            for region, level in table.regions.items()
+            if region.lower() in query
+        ]
+        if reason := _FIRST_SENTENCE.match(latest_update.strip()).group().strip():
+            lines += ["Reasons:", f"    {reason}"]
+        return "\n".join(lines)
+
+    def _message(self, messages: List[BaseMessage], **kwargs: Any) -> AIMessage:
+        self.calls += 1
+        prompt = messages[-1].content
+        tools: List[Dict[str, Any]] = kwargs.get("tools") or []
+        if "Find the country" not in prompt:
+            content, tool_calls = self.advice(prompt), []
+        else:
+            # the query is the last line of the extraction prompt
+            query = prompt.strip().rsplit("\n", 1)[-1].strip()
+            trip = {"destinations": self.destinations(query)}
+            if tools:
+                call_id = hashlib.sha1(query.encode()).hexdigest()[:12]
+                content = ""
+                tool_calls = [
+                    {
+                        "name": tools[0]["function"]["name"],
+                        "args": trip,
+                        "id": f"call_{call_id}",
+                    }
+                ]
+            else:
+                content, tool_calls = json.dumps(trip), []
+        input_tokens = sum(estimate_tokens(message.content) for message in messages)
+        message = AIMessage(content=content, tool_calls=tool_calls)
+        output_tokens = estimate_tokens(_message_text(message))
+        message.usage_metadata = {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        }
+        return message
+
+    def _generation_time(self, text: str) -> float:
+        if not self.tokens_per_second:
+            return 0.0
+        return estimate_tokens(text) / self.tokens_per_second
+
+    def _chunks(self, message: AIMessage) -> List[AIMessageChunk]:
+        """Splits the message in the chunks it is streamed in, the usage on the last."""
+        chunks = [
+            AIMessageChunk(content=piece)
+            for piece in _STREAM_PIECE.findall(message.content)
+        ]
+        chunks += [
+            AIMessageChunk(
+                content="",
+                tool_call_chunks=[
+                    {
+                        "name": call["name"],
+                        "args": json.dumps(call["args"]),
+                        "id": call["id"],
+                        "index": index,
+                    }
+                ],
+            )
+            for index, call in enumerate(message.tool_calls)
+        ]
+        chunks = chunks or [AIMessageChunk(content="")]
+        chunks[-1].usage_metadata = message.usage_metadata
+        return chunks
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        message = self._message(messages, **kwargs)
+        time.sleep(self.latency + self._generation_time(_message_text(message)))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        message = self._message(messages, **kwargs)
+        await asyncio.sleep(
+            self.latency + self._generation_time(_message_text(message))
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        message = self._message(messages, **kwargs)
+        time.sleep(self.latency)
+        for chunk in self._chunks(message):
+            time.sleep(self._generation_time(_chunk_text(chunk)))
+            if run_manager and chunk.content:
+                run_manager.on_llm_new_token(chunk.content, chunk=chunk)
+            yield ChatGenerationChunk(message=chunk)
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        message = self._message(messages, **kwargs)
+        await asyncio.sleep(self.latency)
+        for chunk in self._chunks(message):
+            await asyncio.sleep(self._generation_time(_chunk_text(chunk)))
+            if run_manager and chunk.content:
+                await run_manager.on_llm_new_token(chunk.content, chunk=chunk)
+            yield ChatGenerationChunk(message=chunk)
+
+
+class TextFakeChatModel(FakeChatModel):
+    """`FakeChatModel` without tool calling, the destinations are answered as JSON."""
+
+    bind_tools = BaseChatModel.bind_tools
@@ -0,0 +1,396 @@
+"""
+Smartraveller destinations keyed by region and url slug, with the names, aliases,
+demonyms and well known sub-regions or cities that refer to each destination.
+The slug itself (with `-` read as a space) is always indexed as a name.
+
+An alias listed under more than one destination is treated as ambiguous,
+e.g. "georgia" or "congo", and left to the LLM to resolve.
+"""
+
+GAZETTEER = {
+    "africa": {
+        "algeria": ["algerian", "algiers"],
+        "angola": ["angolan", "luanda"],
+        "benin": ["beninese", "cotonou"],
+        "botswana": ["okavango delta", "gaborone"],
+        "burkina-faso": ["burkinabe", "ouagadougou"],
+        "burundi": ["burundian", "bujumbura"],
+        "cabo-verde": ["cape verde"],
+        "cameroon": ["cameroonian", "yaounde", "douala"],
+        "central-african-republic": ["bangui"],
+        "chad": ["chadian", "ndjamena"],
+        "comoros": ["comorian"],
+        "cote-divoire": ["cote d ivoire", "ivory coast", "ivorian", "abidjan"],
+        "democratic-republic-congo": [
+            "drc",
+            "dr congo",
+            "democratic republic of the congo",
+            "democratic republic of congo",
+            "kinshasa",
+            "congo",
+        ],
+        "djibouti": [],
+        "egypt": ["egyptian", "cairo", "luxor", "sharm el sheikh", "giza", "hurghada"],
+        "equatorial-guinea": ["malabo"],
+        "eritrea": ["eritrean", "asmara"],
+        "eswatini": ["swaziland"],
+        "ethiopia": ["ethiopian", "addis ababa"],
+        "gabon": ["gabonese", "libreville"],
+        "gambia": ["the gambia", "gambian", "banjul"],
+        "ghana": ["ghanaian", "accra"],
+        "guinea": ["conakry"],
+        "guinea-bissau": ["bissau"],
+        "kenya": ["kenyan", "nairobi", "mombasa", "masai mara"],
+        "lesotho": ["maseru"],
+        "liberia": ["liberian", "monrovia"],
+        "libya": ["libyan", "tripoli", "benghazi"],
+        "madagascar": ["malagasy", "antananarivo"],
+        "malawi": ["malawian", "lilongwe"],
+        "mali": ["malian", "bamako", "timbuktu"],
+        "mauritania": ["mauritanian", "nouakchott"],
+        "mauritius": ["mauritian"],
+        "morocco": ["moroccan", "marrakech", "marrakesh", "casablanca", "fez"],
+        "mozambique": ["mozambican", "maputo"],
+        "namibia": ["namibian", "windhoek"],
+        "niger": ["niamey"],
+        "nigeria": ["nigerian", "lagos", "abuja"],
+        "republic-congo": [
+            "republic of the congo",
+            "congo brazzaville",
+            "brazzaville",
+            "congo",
+        ],
+        "rwanda": ["rwandan", "kigali"],
+        "senegal": ["senegalese", "dakar"],
+        "seychelles": [],
+        "sierra-leone": ["freetown"],
+        "somalia": ["somali", "mogadishu", "somaliland"],
+        "south-africa": [
+            "south african",
+            "cape town",
+            "johannesburg",
+            "durban",
+            "kruger",
+        ],
+        "south-sudan": ["juba"],
+        "sudan": ["sudanese", "khartoum"],
+        "tanzania": [
+            "tanzanian",
+            "zanzibar",
+            "kilimanjaro",
+            "serengeti",
+            "dar es salaam",
+        ],
+        "togo": ["togolese", "lome"],
+        "tunisia": ["tunisian", "tunis"],
+        "uganda": ["ugandan", "kampala"],
+        "zambia": ["zambian", "lusaka", "victoria falls"],
+        "zimbabwe": ["zimbabwean", "harare", "victoria falls"],
+    },
+    "americas": {
+        "argentina": ["argentine", "argentinian", "buenos aires", "patagonia"],
+        "bahamas": ["the bahamas", "bahamian", "nassau"],
+        "barbados": ["barbadian", "bridgetown"],
+        "belize": ["belizean"],
+        "bolivia": ["bolivian", "la paz", "uyuni"],
+        "brazil": ["brazilian", "rio de janeiro", "sao paulo", "rio"],
+        "canada": ["canadian", "toronto", "vancouver", "montreal", "quebec"],
+        "chile": ["chilean", "santiago", "easter island"],
+        "colombia": ["colombian", "bogota", "medellin", "cartagena"],
+        "costa-rica": ["costa rican", "san jose"],
+        "cuba": ["cuban", "havana"],
+        "dominican-republic": ["punta cana", "santo domingo"],
+        "ecuador": ["ecuadorian", "quito", "galapagos", "galapagos islands"],
+        "el-salvador": ["salvadoran", "san salvador"],
+        "guatemala": ["guatemalan", "antigua guatemala"],
+        "guyana": ["guyanese", "georgetown"],
+        "haiti": ["haitian", "port au prince"],
+        "honduras": ["honduran", "tegucigalpa", "roatan"],
+        "jamaica": ["jamaican", "kingston", "montego bay"],
+        "mexico": ["mexican", "cancun", "mexico city", "tulum", "oaxaca"],
+        "nicaragua": ["nicaraguan", "managua"],
+        "panama": ["panamanian", "panama city"],
+        "paraguay": ["paraguayan", "asuncion"],
+        "peru": ["peruvian", "lima", "cusco", "cuzco", "machu picchu"],
+        "suriname": ["paramaribo"],
+        "trinidad-and-tobago": ["trinidad", "tobago"],
+        "united-states-america": [
+            "usa",
+            "u s a",
+            "united states",
+            "united states of america",
+            "the states",
+            "american",
+            "new york",
+            "new york city",
+            "los angeles",
+            "san francisco",
+            "las vegas",
+            "chicago",
+            "hawaii",
+            "california",
+            "florida",
+            "miami",
+            "orlando",
+            "washington dc",
+            "alaska",
+            "georgia",
+        ],
+        "uruguay": ["uruguayan", "montevideo"],
+        "venezuela": ["venezuelan", "caracas"],
+    },
+    "asia": {
+        "afghanistan": ["afghan", "kabul"],
+        "bangladesh": ["bangladeshi", "dhaka"],
+        "bhutan": ["bhutanese", "thimphu"],
+        "brunei": ["brunei darussalam", "bandar seri begawan"],
+        "cambodia": ["cambodian", "khmer", "phnom penh", "siem reap", "angkor wat"],
+        "china": [
+            "chinese",
+            "prc",
+            "people s republic of china",
+            "mainland china",
+            "beijing",
+            "shanghai",
+            "guangzhou",
+            "shenzhen",
+            "tibet",
+            "xinjiang",
+            "chengdu",
+        ],
+        "hong-kong": ["hongkong"],
+        "india": [
+            "indian",
+            "delhi",
+            "new delhi",
+            "mumbai",
+            "goa",
+            "kerala",
+            "jaipur",
+            "kashmir",
+        ],
+        "indonesia": [
+            "indonesian",
+            "bali",
+            "balinese",
+            "lombok",
+            "jakarta",
+            "papua",
+            "west papua",
+            "java",
+            "sumatra",
+            "komodo",
+            "yogyakarta",
+            "gili islands",
+        ],
+        "japan": [
+            "japanese",
+            "tokyo",
+            "kyoto",
+            "osaka",
+            "okinawa",
+            "hokkaido",
+            "hiroshima",
+        ],
+        "kazakhstan": ["kazakh", "almaty", "astana"],
+        "kyrgyzstan": ["kyrgyz", "bishkek"],
+        "laos": ["lao", "laotian", "vientiane", "luang prabang"],
+        "macau": ["macao"],
+        "malaysia": [
+            "malaysian",
+            "kuala lumpur",
+            "penang",
+            "langkawi",
+            "sabah",
+            "sarawak",
+        ],
+        "maldives": ["maldivian"],
+        "mongolia": ["mongolian", "ulaanbaatar"],
+        "myanmar": ["burma", "burmese", "yangon", "rangoon", "mandalay"],
+        "nepal": ["nepali", "nepalese", "kathmandu", "everest", "pokhara"],
+        "north-korea": [
+            "dprk",
+            "democratic people s republic of korea",
+            "pyongyang",
+        ],
+        "pakistan": ["pakistani", "karachi", "lahore", "islamabad"],
+        "philippines": [
+            "philippine",
+            "filipino",
+            "manila",
+            "cebu",
+            "boracay",
+            "palawan",
+            "mindanao",
+        ],
+        "singapore": ["singaporean"],
+        "south-korea": ["republic of korea", "seoul", "busan", "jeju"],
+        "sri-lanka": ["sri lankan", "colombo", "kandy"],
+        "taiwan": ["taiwanese", "taipei"],
+        "tajikistan": ["tajik", "dushanbe"],
+        "thailand": [
+            "thai",
+            "bangkok",
+            "phuket",
+            "chiang mai",
+            "koh samui",
+            "pattaya",
+            "krabi",
+        ],
+        "timor-leste": ["east timor", "timorese", "dili"],
+        "turkmenistan": ["turkmen", "ashgabat"],
+        "uzbekistan": ["uzbek", "tashkent", "samarkand"],
+        "vietnam": [
+            "viet nam",
+            "vietnamese",
+            "hanoi",
+            "ho chi minh city",
+            "saigon",
+            "da nang",
+            "hoi an",
+        ],
+    },
+    "europe": {
+        "albania": ["albanian", "tirana"],
+        "andorra": [],
+        "armenia": ["armenian", "yerevan"],
+        "austria": ["austrian", "vienna", "salzburg"],
+        "azerbaijan": ["azerbaijani", "baku"],
+        "belarus": ["belarusian", "minsk"],
+        "belgium": ["belgian", "brussels", "bruges"],
+        "bosnia-and-herzegovina": ["bosnia", "sarajevo"],
+        "bulgaria": ["bulgarian", "sofia"],
+        "croatia": ["croatian", "zagreb", "dubrovnik"],
+        "cyprus": ["cypriot", "nicosia"],
+        "czechia": ["czech republic", "czech", "prague"],
+        "denmark": ["danish", "copenhagen"],
+        "estonia": ["estonian", "tallinn"],
+        "finland": ["finnish", "helsinki", "lapland"],
+        "france": ["french", "paris", "lyon", "marseille", "provence", "corsica"],
+        "georgia": ["georgian", "tbilisi"],
+        "germany": ["german", "berlin", "munich", "frankfurt", "hamburg"],
+        "greece": ["greek", "athens", "santorini", "mykonos", "crete"],
+        "hungary": ["hungarian", "budapest"],
+        "iceland": ["icelandic", "reykjavik"],
+        "ireland": ["irish", "dublin"],
+        "italy": [
+            "italian",
+            "rome",
+            "venice",
+            "florence",
+            "milan",
+            "naples",
+            "sicily",
+            "sardinia",
+        ],
+        "kosovo": ["pristina"],
+        "latvia": ["latvian", "riga"],
+        "lithuania": ["lithuanian", "vilnius"],
+        "luxembourg": [],
+        "malta": ["maltese", "valletta"],
+        "moldova": ["moldovan", "chisinau"],
+        "monaco": ["monte carlo"],
+        "montenegro": ["kotor", "podgorica"],
+        "netherlands": ["dutch", "holland", "amsterdam", "rotterdam"],
+        "north-macedonia": ["macedonia", "skopje"],
+        "norway": ["norwegian", "oslo", "bergen"],
+        "poland": ["polish", "warsaw", "krakow"],
+        "portugal": ["portuguese", "lisbon", "porto", "madeira", "azores"],
+        "romania": ["romanian", "bucharest", "transylvania"],
+        "russia": [
+            "russian",
+            "russian federation",
+            "moscow",
+            "st petersburg",
+            "saint petersburg",
+        ],
+        "serbia": ["serbian", "belgrade"],
+        "slovakia": ["slovak", "bratislava"],
+        "slovenia": ["slovenian", "ljubljana"],
+        "spain": [
+            "spanish",
+            "madrid",
+            "barcelona",
+            "ibiza",
+            "mallorca",
+            "seville",
+            "canary islands",
+        ],
+        "sweden": ["swedish", "stockholm"],
+        "switzerland": ["swiss", "zurich", "geneva"],
+        "turkey": [
+            "turkiye",
+            "turkish",
+            "istanbul",
+            "ankara",
+            "cappadocia",
+            "antalya",
+            "gallipoli",
+        ],
+        "ukraine": ["ukrainian", "kyiv", "kiev", "odesa", "lviv"],
+        "united-kingdom": [
+            "uk",
+            "britain",
+            "great britain",
+            "british",
+            "england",
+            "scotland",
+            "wales",
+            "northern ireland",
+            "london",
+            "edinburgh",
+            "manchester",
+        ],
+    },
+    "middle-east": {
+        "bahrain": ["bahraini", "manama"],
+        "iran": ["iranian", "persia", "tehran"],
+        "iraq": ["iraqi", "baghdad", "erbil"],
+        "israel-and-palestinian-territories": [
+            "israel",
+            "israeli",
+            "palestine",
+            "palestinian",
+            "palestinian territories",
+            "jerusalem",
+            "tel aviv",
+            "gaza",
+            "west bank",
+        ],
+        "jordan": ["jordanian", "amman", "petra"],
+        "kuwait": ["kuwaiti"],
+        "lebanon": ["lebanese", "beirut"],
+        "oman": ["omani", "muscat"],
+        "qatar": ["qatari", "doha"],
+        "saudi-arabia": ["saudi", "riyadh", "jeddah", "mecca", "medina"],
+        "syria": ["syrian", "damascus", "aleppo"],
+        "united-arab-emirates": ["uae", "emirates", "emirati", "dubai", "abu dhabi"],
+        "yemen": ["yemeni", "sanaa"],
+    },
+    "pacific": {
+        "cook-islands": ["rarotonga"],
+        "fiji": ["fijian", "suva", "nadi"],
+        "french-polynesia": ["tahiti", "bora bora", "papeete"],
+        "kiribati": [],
+        "marshall-islands": ["majuro"],
+        "micronesia": ["federated states of micronesia"],
+        "nauru": [],
+        "new-caledonia": ["noumea"],
+        "new-zealand": [
+            "nz",
+            "aotearoa",
+            "auckland",
+            "wellington",
+            "queenstown",
+            "christchurch",
+        ],
+        "niue": [],
+        "palau": [],
+        "papua-new-guinea": ["png", "port moresby"],
+        "samoa": ["samoan", "apia"],
+        "solomon-islands": ["honiara"],
+        "tonga": ["tongan", "nuku alofa"],
+        "tuvalu": [],
+        "vanuatu": ["port vila"],
+    },
+}
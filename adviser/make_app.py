@@ -1,8 +1,39 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel, ConfigDict
-from langchain_core.runnables import RunnableSequence
+import asyncio
+import json
+import logging
+import time
+from contextlib import asynccontextmanager, contextmanager
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
 
-from adviser.utils import detect_injection
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, ConfigDict, Field
+from langchain_core.runnables import Runnable, RunnableSequence
+
+from adviser.admission import (
+    AdmissionQueue,
+    Overloaded,
+    RateLimiter,
+    is_provider_timeout,
+    provider_retry_after,
+    retry_after_header,
+)
+from adviser.config import (
+    BATCH_MAX_CONCURRENCY,
+    BATCH_MAX_SIZE,
+    MAX_CONCURRENT_REQUESTS,
+    MAX_QUEUE_WAIT,
+    MAX_QUEUED_REQUESTS,
+)
+from adviser.metrics import CONTENT_TYPE, ChainMetrics
+from adviser.page_cache import collect_stale_pages
+from adviser.page_fetcher import PageFetchError
+from adviser.request_log import RequestLog
+from adviser.single_flight import SingleFlight
+from adviser.utils import detect_injection, normalize_text
+
+logger = logging.getLogger(__name__)
 
 
 class AppQuery(BaseModel):
@@ -20,8 +51,227 @@ class AppQuery(BaseModel):
     }
 
 
-def make_app(chain: RunnableSequence):
+class AppBatchQuery(BaseModel):
+    queries: List[str] = Field(min_length=1, max_length=BATCH_MAX_SIZE)
+
+    model_config = {
+        "json_schema_extra": {
+            "examples": [
+                {
+                    "queries": [
+                        "I would like to travel to Indonesia. Is it safe?",
+                        "Is Papua New Guinea safe?",
+                    ],
+                }
+            ]
+        }
+    }
+
+
+def validate_query(user_query: str):
+    """Rejects empty queries and prompt injection attempts with a 400 error."""
+    if not user_query:
+        raise HTTPException(status_code=400, detail="Query is required.")
+    if detect_injection(user_query):
+        raise HTTPException(status_code=400, detail="Injection commands detected.")
+
+
+def error_status_code(error: Exception) -> int:
+    """
+    Returns the status code a failed chain run is served with, 503 when the chat model
+    provider rate limited the calls and 504 when a call ran out of its stage timeout.
+    """
+    if isinstance(error, (PageFetchError, Overloaded)):
+        return error.status_code
+    if provider_retry_after(error) is not None:
+        return 503
+    if is_provider_timeout(error):
+        return 504
+    return 500
+
+
+def error_headers(error: Exception) -> Optional[Dict[str, str]]:
+    """Returns the `Retry-After` header of an overload or a provider rate limit, if any."""
+    if isinstance(error, Overloaded):
+        return retry_after_header(error.retry_after)
+    if (retry_after := provider_retry_after(error)) is not None:
+        return retry_after_header(retry_after)
+    return None
+
+
+def client_key(request: Request, rate_limiter: RateLimiter) -> Optional[str]:
+    """Returns the client a request is rate limited as, or None if it is not limited."""
+    return rate_limiter.client(
+        request.headers.get("x-api-key"), request.client.host if request.client else ""
+    )
+
+
+def format_stale_pages(stale_pages: Dict[str, float]) -> Dict[str, str]:
+    """Returns the time every stale page served was fetched, in the ISO 8601 format."""
+    return {
+        url: datetime.fromtimestamp(fetched_at, timezone.utc).isoformat(
+            timespec="seconds"
+        )
+        for url, fetched_at in stale_pages.items()
+    }
+
+
+def format_sse(event: str, data: dict) -> str:
+    """Formats a server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def make_app(
+    chain: Optional[RunnableSequence] = None,
+    max_concurrency: int = MAX_CONCURRENT_REQUESTS,
+    background_jobs: Sequence[Callable[[], Awaitable]] = (),
+    batch_chain: Optional[Runnable] = None,
+    batch_max_concurrency: int = BATCH_MAX_CONCURRENCY,
+    metrics: Optional[ChainMetrics] = None,
+    shutdown_hooks: Sequence[Callable[[], Awaitable]] = (),
+    request_log: Optional[RequestLog] = None,
+    single_flight: Optional[SingleFlight] = None,
+    chain_factory: Optional[
+        Callable[[], Tuple[RunnableSequence, Optional[Runnable]]]
+    ] = None,
+    warmup_hooks: Sequence[Callable[[], Awaitable]] = (),
+    rate_limiter: Optional[RateLimiter] = None,
+    max_queue: int = MAX_QUEUED_REQUESTS,
+    max_queue_wait: float = MAX_QUEUE_WAIT,
+):
+    """
+    Creates the API serving the query to advice chain: the advice, streaming and batch
+    endpoints behind an admission queue, plus health, readiness and metrics.
+
+    Args:
+        chain (Optional[RunnableSequence]): The query to advice chain, unless a chain factory is given.
+        max_concurrency (int): The advice requests running at once.
+        background_jobs (Sequence): Coroutine functions run while the app is up, e.g. the advisory store refresh.
+        batch_chain (Optional[Runnable]): Answers the batch endpoint, an advice or exception per query. Defaults to `chain.abatch`.
+        batch_max_concurrency (int): The queries of a batch answered at once.
+        metrics (Optional[ChainMetrics]): Times the chain stages and requests, served by `/metrics`.
+        shutdown_hooks (Sequence): Coroutine functions awaited when the app stops.
+        request_log (Optional[RequestLog]): Logs the sampled requests with their stages and cache outcomes.
+        single_flight (Optional[SingleFlight]): Shares one chain run between concurrent identical queries.
+        chain_factory (Optional[Callable]): Returns the chain and the batch chain, built in a thread once the app is up.
+        warmup_hooks (Sequence): Coroutine functions awaited after the chains are built, before `/ready` answers 200.
+        rate_limiter (Optional[RateLimiter]): Answers 429 to the clients above their limit.
+        max_queue (int): The advice requests waiting for a slot, others are answered 503.
+        max_queue_wait (float): The seconds a request may wait for a slot before it is answered 503.
+    """
+    if (chain is None) == (chain_factory is None):
+        raise ValueError("Either a chain or a chain factory is required")
+    # bounds the number of chains running at once, extra requests wait for a slot
+    admission = AdmissionQueue(max_concurrency, max_queue, max_queue_wait)
+    # set once the chains are built, or failed to build
+    chains_built = asyncio.Event()
+    ready = False
+    startup_error: Optional[str] = None
+
+    def instrumented(runnable: Optional[Runnable]) -> Optional[Runnable]:
+        """Times the chain stages in the metrics, if any."""
+        if metrics is None or runnable is None:
+            return runnable
+        return runnable.with_config(callbacks=[metrics])
+
+    chain, batch_chain = instrumented(chain), instrumented(batch_chain)
+    if chain_factory is None:
+        chains_built.set()
+        ready = not warmup_hooks
+
+    async def warm_up():
+        """Builds the chains, if needed, and runs the warm up hooks."""
+        nonlocal chain, batch_chain, ready, startup_error
+        try:
+            if chain_factory is not None:
+                built_chain, built_batch_chain = await asyncio.to_thread(chain_factory)
+                chain = instrumented(built_chain)
+                batch_chain = instrumented(built_batch_chain)
+        except Exception as e:
+            logger.exception("Failed to build the advice chains")
+            startup_error = f"Failed to build the advice chains: {e}"
+            return
+        finally:
+            chains_built.set()
+        for hook in warmup_hooks:
+            try:
+                await hook()
+            except Exception:
+                # warming up is best effort, the requests load what they need
+                logger.exception("Warm up hook %r failed", hook)
+        ready = True
+
+    async def wait_for_chains():
+        """Waits for the chains to be built, failing with a 503 error if they could not be."""
+        await chains_built.wait()
+        if chain is None:
+            raise HTTPException(status_code=503, detail=startup_error)
+
+    def rejected(endpoint: str, error: Overloaded) -> HTTPException:
+        """Records the rejected request in the metrics, if any, and returns its error."""
+        if metrics is not None:
+            metrics.observe_rejection(endpoint, error.status_code)
+        return HTTPException(
+            status_code=error.status_code,
+            detail=str(error),
+            headers=retry_after_header(error.retry_after),
+        )
+
+    def admit(request: Request, endpoint: str, cost: int = 1):
+        """
+        Turns the request away when the client is over its rate limit (429), or when
+        the request would be shed by the admission queue (503).
+        """
+        try:
+            client = None if rate_limiter is None else client_key(request, rate_limiter)
+            if client is not None and (wait := rate_limiter.acquire(client, cost)):
+                raise Overloaded(
+                    "Rate limit exceeded, please retry later.", 429, retry_after=wait
+                )
+            admission.check()
+        except Overloaded as e:
+            raise rejected(endpoint, e)
+
+    @contextmanager
+    def timed(endpoint: str):
+        """Records the duration of the request in the metrics, if any."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if metrics is not None:
+                metrics.observe_request(endpoint, time.perf_counter() - start)
+
+    @contextmanager
+    def logged(endpoint: str, body: dict):
+        """Records the request in the request log, if any and the request is sampled."""
+        record = None if request_log is None else request_log.record(endpoint, body)
+        if record is None:
+            yield None
+            return
+        try:
+            with record:
+                yield record
+        finally:
+            request_log.write(record)
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        """Runs the background jobs, e.g. the advisory store refresh, while the app is up."""
+        tasks = [asyncio.create_task(job()) for job in background_jobs]
+        if not ready:
+            tasks.append(asyncio.create_task(warm_up()))
+        yield
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for hook in shutdown_hooks:
+            await hook()
+        if request_log is not None:
+            await request_log.aclose()
+
     app = FastAPI(
+        lifespan=lifespan,
         title="Travel Advice API",
         description="""
         This API is for retrieving travel advice based on user queries.
@@ -56,10 +306,51 @@ def make_app(chain: RunnableSequence):
         """health check endpoint"""
         return {"status": "ok"}
 
+    @app.get(
+        "/ready",
+        summary="Get the readiness of the API to serve advice",
+        tags=["Health Check Endpoint"],
+        responses={
+            200: {
+                "description": "The advice chains are built and warmed up",
+                "content": {"application/json": {"example": {"status": "ready"}}},
+            },
+            503: {
+                "description": "The app is still starting, or the advice chains failed to build",
+                "content": {"application/json": {"example": {"status": "starting"}}},
+            },
+        },
+    )
+    async def get_ready():
+        """readiness endpoint"""
+        if ready:
+            return {"status": "ready"}
+        if startup_error is not None:
+            return JSONResponse(
+                {"status": "failed", "detail": startup_error}, status_code=503
+            )
+        return JSONResponse({"status": "starting"}, status_code=503)
+
+    if metrics is not None:
+
+        @app.get(
+            "/metrics",
+            summary="Get the metrics of the API in the Prometheus text format",
+            tags=["Health Check Endpoint"],
+            response_class=PlainTextResponse,
+        )
+        async def get_metrics():
+            """Prometheus metrics endpoint"""
+            return PlainTextResponse(metrics.render(), media_type=CONTENT_TYPE)
+
     @app.post(
         "/get_travel_advice",
         summary="Endpiont provides LLM powered travel advice",
-        description="Retrieve travel advice based on the provided user query.",
+        description="""
+        Retrieve travel advice based on the provided user query.
+        When Smartraveller is slow or failing, the advice is based on the last retrieved
+        advice pages, listed in `stale_pages` with the time they were retrieved.
+        """,
         response_description="The travel advice given by LLM.",
         tags=["Get Trip Advice Endpoint"],
         responses={
@@ -84,6 +375,16 @@ def make_app(chain: RunnableSequence):
                     }
                 },
             },
+            429: {
+                "description": "Too Many Requests, retry after the `Retry-After` header seconds",
+                "content": {
+                    "application/json": {
+                        "example": {
+                            "detail": "Rate limit exceeded, please retry later."
+                        }
+                    }
+                },
+            },
             500: {
                 "description": "Internal Server Error",
                 "content": {
@@ -94,19 +395,255 @@ def make_app(chain: RunnableSequence):
                     }
                 },
             },
+            502: {
+                "description": "Bad Gateway",
+                "content": {
+                    "application/json": {
+                        "example": {
+                            "detail": "Error retrieving web content: Smartraveller responded with 503 for https://www.smartraveller.gov.au/destinations/asia/indonesia"
+                        }
+                    }
+                },
+            },
+            503: {
+                "description": "Service Unavailable",
+                "content": {
+                    "application/json": {
+                        "example": {
+                            "detail": "Error retrieving web content: www.smartraveller.gov.au is failing, not contacted for 30 seconds"
+                        }
+                    }
+                },
+            },
+            504: {
+                "description": "Gateway Timeout",
+                "content": {
+                    "application/json": {
+                        "example": {
+                            "detail": "Timed out retrieving web content: ReadTimeout('The read operation timed out')"
+                        }
+                    }
+                },
+            },
         },
     )
-    async def get_travel_advice(query: AppQuery):
+    async def get_travel_advice(query: AppQuery, request: Request):
         """Retrieves travel advice based on the provided query."""
         user_query = query.query
-        if not user_query:
-            raise HTTPException(status_code=400, detail="Query is required.")
-        if detect_injection(user_query):
-            raise HTTPException(status_code=400, detail="Injection commands detected.")
+        validate_query(user_query)
+        admit(request, "get_travel_advice")
+        await wait_for_chains()
         try:
-            response = chain.invoke({"query": user_query})
+            with timed("get_travel_advice"), logged(
+                "/get_travel_advice", {"query": user_query}
+            ) as record:
+
+                async def advise():
+                    with collect_stale_pages() as stale_pages:
+                        async with admission.slot():
+                            response = await (
+                                record.traced(chain) if record else chain
+                            ).ainvoke({"query": user_query})
+                    return response, stale_pages
+
+                if single_flight is None:
+                    response, stale_pages = await advise()
+                else:
+                    response, stale_pages = await single_flight.run(
+                        " ".join(normalize_text(user_query)), advise
+                    )
+                if record:
+                    record.response = response
+            if stale_pages:
+                return {
+                    "response": response,
+                    "stale_pages": format_stale_pages(stale_pages),
+                }
             return {"response": response}
+        except Overloaded as e:
+            raise rejected("get_travel_advice", e)
         except Exception as e:
-            raise HTTPException(status_code=500, detail=str(e))
+            raise HTTPException(
+                status_code=error_status_code(e),
+                detail=str(e),
+                headers=error_headers(e),
+            )
+
+    @app.post(
+        "/get_travel_advice/batch",
+        summary="Endpiont provides LLM powered travel advice for a list of queries",
+        description=f"""
+        Retrieve travel advice for up to {BATCH_MAX_SIZE} queries at once.
+        Advice pages shared by several queries are retrieved once and the advice is
+        generated with batched LLM calls. The responses are returned in query order,
+        a query that failed gets its error `detail` and `status_code` instead.
+        Advice based on stale pages is flagged with `stale_pages` as for a single query.
+        """,
+        response_description="The travel advice given by LLM for every query.",
+        tags=["Get Trip Advice Endpoint"],
+        responses={
+            200: {
+                "description": "Successful Response",
+                "content": {
+                    "application/json": {
+                        "example": {
+                            "responses": [
+                                {
+                                    "response": 'Travel Safety Level:\n"Exercise a high degree of caution" in Indonesia overall.'
+                                },
+                                {
+                                    "detail": "Injection commands detected.",
+                                    "status_code": 400,
+                                },
+                            ]
+                        }
+                    }
+                },
+            },
+        },
+    )
+    async def get_travel_advice_batch(batch: AppBatchQuery, request: Request):
+        """Retrieves travel advice for every query of the batch."""
+        admit(request, "get_travel_advice_batch", cost=len(batch.queries))
+        await wait_for_chains()
+        responses: List[Optional[dict]] = [None] * len(batch.queries)
+        valid = []
+        for index, user_query in enumerate(batch.queries):
+            try:
+                validate_query(user_query)
+                valid.append(index)
+            except HTTPException as e:
+                responses[index] = {"detail": e.detail, "status_code": e.status_code}
+
+        inputs = [{"query": batch.queries[index]} for index in valid]
+        config = {"max_concurrency": batch_max_concurrency}
+        results = []
+        with timed("get_travel_advice_batch"), logged(
+            "/get_travel_advice/batch", {"queries": batch.queries}
+        ) as record, collect_stale_pages() as stale_pages:
+            try:
+                async with admission.slot():
+                    if inputs and batch_chain is not None:
+                        traced_chain = (
+                            record.traced(batch_chain) if record else batch_chain
+                        )
+                        results = await traced_chain.ainvoke(inputs, config=config)
+                    elif inputs:
+                        traced_chain = record.traced(chain) if record else chain
+                        results = await traced_chain.abatch(
+                            inputs, config, return_exceptions=True
+                        )
+            except Overloaded as e:
+                raise rejected("get_travel_advice_batch", e)
+            if record:
+                record.response = [
+                    str(result) if isinstance(result, Exception) else result
+                    for result in results
+                ]
+
+        for index, result in zip(valid, results):
+            if isinstance(result, Exception):
+                responses[index] = {
+                    "detail": str(result),
+                    "status_code": error_status_code(result),
+                }
+            else:
+                responses[index] = {"response": result}
+        if stale_pages:
+            return {
+                "responses": responses,
+                "stale_pages": format_stale_pages(stale_pages),
+            }
+        return {"responses": responses}
+
+    @app.post(
+        "/get_travel_advice/stream",
+        summary="Endpiont streams LLM powered travel advice",
+        description="""
+        Stream travel advice for the provided user query as server-sent events.
+        A `destination` event with the advice page url is sent as soon as the destination
+        is resolved (one per destination for a trip to several countries), followed by
+        `token` events with the advice text as it is generated and a final `end` event. Failures after the stream started are sent as an `error` event.
+        When the advice is based on stale pages, a `stale` event listing them is sent before the `end` event.
+        """,
+        response_description="The travel advice given by LLM as server-sent events.",
+        tags=["Get Trip Advice Endpoint"],
+        responses={
+            200: {
+                "description": "Successful Response",
+                "content": {
+                    "text/event-stream": {
+                        "example": 'event: destination\ndata: {"url": "https://www.smartraveller.gov.au/destinations/asia/indonesia"}\n\n'
+                        'event: token\ndata: {"text": "Travel Safety Level:"}\n\n'
+                        "event: end\ndata: {}\n\n"
+                    }
+                },
+            },
+            400: {
+                "description": "Bad Request",
+                "content": {
+                    "application/json": {
+                        "example": [
+                            {"detail": "Query is required."},
+                            {"detail": "Injection commands detected."},
+                        ]
+                    }
+                },
+            },
+        },
+    )
+    async def stream_travel_advice(query: AppQuery, request: Request):
+        """Streams travel advice based on the provided query."""
+        user_query = query.query
+        validate_query(user_query)
+        admit(request, "stream_travel_advice")
+        await wait_for_chains()
+
+        async def advice_events():
+            with timed("stream_travel_advice"), logged(
+                "/get_travel_advice/stream", {"query": user_query}
+            ) as record, collect_stale_pages() as stale_pages:
+                chunks = []
+                try:
+                    async with admission.slot():
+                        async for event in (
+                            record.traced(chain) if record else chain
+                        ).astream_events({"query": user_query}, version="v2"):
+                            if (
+                                event["name"] == "query2url"
+                                and event["event"] == "on_chain_end"
+                            ):
+                                urls = event["data"]["output"]
+                                # a trip has a destination event per destination
+                                for url in [urls] if isinstance(urls, str) else urls:
+                                    yield format_sse("destination", {"url": url})
+                            elif (
+                                event["name"] == "doc2advice"
+                                and event["event"] == "on_chain_stream"
+                            ):
+                                chunks.append(event["data"]["chunk"])
+                                yield format_sse(
+                                    "token", {"text": event["data"]["chunk"]}
+                                )
+                except Exception as e:
+                    if isinstance(e, Overloaded) and metrics is not None:
+                        metrics.observe_rejection("stream_travel_advice", e.status_code)
+                    if record:
+                        record.status_code = error_status_code(e)
+                    yield format_sse("error", {"detail": str(e)})
+                    return
+                if record:
+                    record.response = "".join(chunks)
+                if stale_pages:
+                    yield format_sse(
+                        "stale", {"pages": format_stale_pages(stale_pages)}
+                    )
+                yield format_sse("end", {})
+
+        return StreamingResponse(
+            advice_events(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
 
     return app
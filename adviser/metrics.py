@@ -0,0 +1,284 @@
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from adviser.config import METRICS_LATENCY_BUCKETS
+
+# runs timed as a stage of the query to advice chain, see `construct_named_stages`
+STAGE_NAMES = (
+    "query2url",
+    "url2doc",
+    "doc2advice",
+    "load_from_url",
+    "transform_html_content",
+)
+# counters read from the caches and the destination resolver at scrape time
+CACHE_COUNTERS = (
+    "hits",
+    "misses",
+    "shared_hits",
+    "revalidated",
+    "coalesced",
+    "stale",
+)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+Labels = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    pairs = ",".join(
+        '{}="{}"'.format(
+            name,
+            value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"),
+        )
+        for name, value in zip(names, values)
+    )
+    return f"{{{pairs}}}" if pairs else ""
+
+
+class Counter:
+    """Prometheus counter with a fixed set of label names."""
+
+    def __init__(self, name: str, documentation: str, label_names: Labels = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.values: Dict[Labels, float] = {}
+
+    def inc(self, labels: Labels = (), amount: float = 1.0):
+        self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def expose(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} counter",
+        ]
+        for labels, value in sorted(self.values.items()):
+            lines.append(
+                f"{self.name}{_format_labels(self.label_names, labels)} {value:g}"
+            )
+        return lines
+
+
+class Histogram:
+    """Prometheus histogram with a fixed set of label names."""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Labels = (),
+        buckets: Sequence[float] = METRICS_LATENCY_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = tuple(sorted(map(float, buckets)))
+        # per labels, the count of every bucket (non cumulative, last one is +Inf) and the sum
+        self.values: Dict[Labels, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, labels: Labels, value: float):
+        if labels not in self.values:
+            self.values[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+        counts, total = self.values[labels]
+        counts[bisect_left(self.buckets, value)] += 1
+        total[0] += value
+
+    def expose(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        for labels, (counts, total) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip([*map(str, self.buckets), "+Inf"], counts):
+                cumulative += count
+                bucket_labels = _format_labels(
+                    (*self.label_names, "le"), (*labels, bound)
+                )
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            series_labels = _format_labels(self.label_names, labels)
+            lines.append(f"{self.name}_sum{series_labels} {total[0]:g}")
+            lines.append(f"{self.name}_count{series_labels} {cumulative}")
+        return lines
+
+
+class ChainMetrics(BaseCallbackHandler):
+    """
+    Callback handler timing the stages of the query to advice chain, and the registry
+    of the metrics served in the Prometheus text format by the `/metrics` endpoint.
+
+    Runs named after a stage (see `STAGE_NAMES`) are timed, chat model calls are timed
+    and their token usage counted under the stage they run in. The hit and miss
+    counters of the given caches are read when the metrics are rendered.
+    """
+
+    # called in the thread of the run instead of an executor, the handler only
+    # updates a few dicts under a lock
+    run_inline = True
+
+    def __init__(
+        self,
+        caches: Optional[Dict[str, Any]] = None,
+        stages: Iterable[str] = STAGE_NAMES,
+        clock=time.perf_counter,
+    ):
+        self.caches = caches or {}
+        self.stages = frozenset(stages)
+        self._clock = clock
+        self._lock = threading.Lock()
+        # stage each run belongs to and start time of the timed runs
+        self._run_stages: Dict[UUID, str] = {}
+        self._started_at: Dict[UUID, float] = {}
+        self.stage_duration = Histogram(
+            "adviser_stage_duration_seconds",
+            "Duration of the query to advice chain stages.",
+            ("stage",),
+        )
+        self.stage_errors = Counter(
+            "adviser_stage_errors_total",
+            "Query to advice chain stages that raised an error.",
+            ("stage",),
+        )
+        self.llm_duration = Histogram(
+            "adviser_llm_duration_seconds",
+            "Duration of the chat model calls per chain stage.",
+            ("stage",),
+        )
+        self.llm_tokens = Counter(
+            "adviser_llm_tokens_total",
+            "Tokens used by the chat model calls per chain stage.",
+            ("stage", "type"),
+        )
+        self.request_duration = Histogram(
+            "adviser_request_duration_seconds",
+            "Duration of the API requests per endpoint.",
+            ("endpoint",),
+        )
+        self.request_rejections = Counter(
+            "adviser_requests_rejected_total",
+            "API requests turned away by the rate limits or the admission queue.",
+            ("endpoint", "status"),
+        )
+
+    def _start(self, run_id: UUID, parent_run_id: Optional[UUID], name: str):
+        with self._lock:
+            if name in self.stages:
+                self._run_stages[run_id] = name
+                self._started_at[run_id] = self._clock()
+            elif (stage := self._run_stages.get(parent_run_id)) is not None:
+                self._run_stages[run_id] = stage
+
+    def _end(
+        self, run_id: UUID, histogram: Histogram, failed: bool = False
+    ) -> Optional[str]:
+        """Records the duration of a timed run and returns the stage of the run."""
+        end = self._clock()
+        with self._lock:
+            stage = self._run_stages.pop(run_id, None)
+            started_at = self._started_at.pop(run_id, None)
+            if started_at is not None:
+                histogram.observe((stage,), end - started_at)
+                if failed:
+                    self.stage_errors.inc((stage,))
+        return stage
+
+    def on_chain_start(
+        self,
+        serialized: Dict[str, Any],
+        inputs: Dict[str, Any],
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        **kwargs: Any,
+    ):
+        self._start(run_id, parent_run_id, kwargs.get("name") or "")
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any):
+        self._end(run_id, self.stage_duration)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self._end(run_id, self.stage_duration, failed=True)
+
+    def on_chat_model_start(
+        self,
+        serialized: Dict[str, Any],
+        messages: List[List[Any]],
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        **kwargs: Any,
+    ):
+        with self._lock:
+            stage = self._run_stages.get(parent_run_id, "")
+            self._run_stages[run_id] = stage
+            self._started_at[run_id] = self._clock()
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any):
+        stage = self._end(run_id, self.llm_duration)
+        input_tokens, output_tokens = _token_usage(response)
+        with self._lock:
+            if input_tokens:
+                self.llm_tokens.inc((stage, "input"), input_tokens)
+            if output_tokens:
+                self.llm_tokens.inc((stage, "output"), output_tokens)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self._end(run_id, self.llm_duration)
+
+    def observe_request(self, endpoint: str, seconds: float):
+        with self._lock:
+            self.request_duration.observe((endpoint,), seconds)
+
+    def observe_rejection(self, endpoint: str, status_code: int):
+        with self._lock:
+            self.request_rejections.inc((endpoint, str(status_code)))
+
+    def render(self) -> str:
+        """Returns the metrics in the Prometheus text exposition format."""
+        cache_requests = Counter(
+            "adviser_cache_requests_total",
+            "Cache and destination resolver lookups by result.",
+            ("cache", "result"),
+        )
+        for name, cache in self.caches.items():
+            for counter in CACHE_COUNTERS:
+                if hasattr(cache, counter):
+                    cache_requests.inc((name, counter), getattr(cache, counter))
+
+        with self._lock:
+            lines = [
+                *self.stage_duration.expose(),
+                *self.stage_errors.expose(),
+                *self.llm_duration.expose(),
+                *self.llm_tokens.expose(),
+                *self.request_duration.expose(),
+                *self.request_rejections.expose(),
+                *cache_requests.expose(),
+            ]
+        return "\n".join(lines) + "\n"
+
+
+def _token_usage(response: LLMResult) -> Tuple[int, int]:
+    """Returns the input and output tokens reported by the chat model, if any."""
+    input_tokens = output_tokens = 0
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(
+                getattr(generation, "message", None), "usage_metadata", None
+            )
+            if usage:
+                input_tokens += usage.get("input_tokens", 0)
+                output_tokens += usage.get("output_tokens", 0)
+    if not (input_tokens or output_tokens):
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        input_tokens = usage.get("prompt_tokens", 0)
+        output_tokens = usage.get("completion_tokens", 0)
+    return input_tokens, output_tokens
@@ -0,0 +1,321 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from functools import partial
+from typing import (
+    TYPE_CHECKING,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    Optional,
+)
+
+from langchain_core.documents.base import Document
+
+from adviser.config import PAGE_CACHE_MAX_SIZE, PAGE_CACHE_TTL, PAGE_FETCH_DEADLINE
+from adviser.page_fetcher import PageFetchError, PageFetchTimeout
+from adviser.request_log import record_cache_outcome
+from adviser.single_flight import SingleFlight
+
+if TYPE_CHECKING:
+    from adviser.shared_store import SharedStore
+
+logger = logging.getLogger(__name__)
+
+# stale pages served for the request being answered, the epoch time they were fetched by url
+STALE_PAGES: ContextVar[Optional[Dict[str, float]]] = ContextVar(
+    "stale_pages", default=None
+)
+
+
+@contextmanager
+def collect_stale_pages() -> Iterator[Dict[str, float]]:
+    """Collects the stale pages served while the context is entered."""
+    stale_pages: Dict[str, float] = {}
+    token = STALE_PAGES.set(stale_pages)
+    try:
+        yield stale_pages
+    finally:
+        try:
+            STALE_PAGES.reset(token)
+        except ValueError:
+            # a streamed response closed from another context, e.g. on disconnect
+            pass
+
+
+@dataclass
+class CachedPage:
+    """
+    A transformed advice page together with the validators needed to revalidate it.
+
+    Args:
+        document (Document): The transformed text document of the page.
+        etag (Optional[str], optional): The `ETag` header of the response. Defaults to None.
+        last_modified (Optional[str], optional): The `Last-Modified` header of the response. Defaults to None.
+        fetched_at (float, optional): The time the page was last fetched or revalidated. Set by the cache.
+        status_code (int, optional): The status of the response, e.g. 404 for a "Page not found" page. Defaults to 200.
+    """
+
+    document: Document
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    fetched_at: float = 0.0
+    status_code: int = 200
+
+
+# loaders receive the url and the stale cached page (if any) to revalidate against,
+# and return the stale page itself when the server reports it is not modified
+PageLoader = Callable[[str, Optional[CachedPage]], CachedPage]
+AsyncPageLoader = Callable[[str, Optional[CachedPage]], Awaitable[CachedPage]]
+
+
+class PageCache:
+    """
+    Process wide LRU cache of transformed advice pages keyed by url.
+
+    Pages are served from the cache for `ttl` seconds, after that the stale page is
+    handed to the loader for conditional revalidation. Concurrent misses for the same
+    url share a single in-flight load.
+
+    When the load fails with a `PageFetchError`, or `aget` waited `deadline` seconds for
+    it, the stale page is served instead (see `collect_stale_pages`) while the load goes
+    on in the background. Without a stale page the error, or a `PageFetchTimeout` at the
+    deadline, is raised.
+
+    With a shared store (see `adviser.shared_store`), the pages loaded by one worker
+    process are stored in it and served to the other workers before they load them.
+    """
+
+    def __init__(
+        self,
+        ttl: float = PAGE_CACHE_TTL,
+        max_size: int = PAGE_CACHE_MAX_SIZE,
+        clock: Callable[[], float] = time.monotonic,
+        deadline: float = PAGE_FETCH_DEADLINE,
+        shared: Optional["SharedStore"] = None,
+    ):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.deadline = deadline
+        self.shared = shared
+        self._clock = clock
+        self._pages: OrderedDict[str, CachedPage] = OrderedDict()
+        self._lock = threading.Lock()
+        self._url_locks: Dict[str, threading.Lock] = {}
+        # the asynchronous loads, concurrent misses for a url share one
+        self._loads = SingleFlight("page")
+        self._sync_misses = 0
+        self.hits = 0
+        self.revalidated = 0
+        self.stale = 0
+        self.shared_hits = 0
+
+    def __len__(self) -> int:
+        return len(self._pages)
+
+    @property
+    def misses(self) -> int:
+        return self._sync_misses + self._loads.misses
+
+    @property
+    def coalesced(self) -> int:
+        return self._loads.coalesced
+
+    def __contains__(self, url: str) -> bool:
+        return url in self._pages
+
+    def lookup(self, url: str) -> Optional[CachedPage]:
+        """Returns the cached page for the url, fresh or stale, marking it recently used."""
+        with self._lock:
+            page = self._pages.get(url)
+            if page is not None:
+                self._pages.move_to_end(url)
+            return page
+
+    def is_fresh(self, page: CachedPage) -> bool:
+        return self._clock() - page.fetched_at < self.ttl
+
+    def store(self, url: str, page: CachedPage, stale: Optional[CachedPage] = None):
+        """Stores a loaded page, evicting the least recently used pages above `max_size`."""
+        with self._lock:
+            if page is stale:
+                self.revalidated += 1
+                record_cache_outcome("page", "revalidated")
+            page.fetched_at = self._clock()
+            self._put(url, page)
+
+    def _put(self, url: str, page: CachedPage):
+        self._pages[url] = page
+        self._pages.move_to_end(url)
+        while len(self._pages) > self.max_size:
+            self._pages.popitem(last=False)
+
+    def _share(self, url: str, page: CachedPage):
+        """Stores the loaded page in the shared store, if any."""
+        if self.shared is None:
+            return
+        entry = {
+            "page_content": page.document.page_content,
+            "metadata": page.document.metadata,
+            "etag": page.etag,
+            "last_modified": page.last_modified,
+            "status_code": page.status_code,
+            # the cache clock is per process, share the fetch time as an epoch time
+            "fetched_at": time.time() - (self._clock() - page.fetched_at),
+        }
+        try:
+            self.shared.set(f"page:{url}", zlib.compress(json.dumps(entry).encode()))
+        except Exception:
+            logger.warning("Failed to share the page %s", url, exc_info=True)
+
+    def _shared_page(self, url: str) -> Optional[CachedPage]:
+        """Returns the page shared by another worker, if any."""
+        if self.shared is None:
+            return None
+        try:
+            value = self.shared.get(f"page:{url}")
+        except Exception:
+            logger.warning("Failed to read the shared page %s", url, exc_info=True)
+            return None
+        if value is None:
+            return None
+        entry = json.loads(zlib.decompress(value))
+        return CachedPage(
+            document=Document(
+                page_content=entry["page_content"], metadata=entry["metadata"]
+            ),
+            etag=entry["etag"],
+            last_modified=entry["last_modified"],
+            fetched_at=self._clock() - (time.time() - entry["fetched_at"]),
+            status_code=entry.get("status_code", 200),
+        )
+
+    def _adopt_shared(
+        self, url: str, shared: Optional[CachedPage]
+    ) -> Optional[Document]:
+        """
+        Caches the shared page when it is newer than the cached one, and returns its
+        document if it is fresh.
+        """
+        with self._lock:
+            cached = self._pages.get(url)
+            if shared is None or (
+                cached is not None and shared.fetched_at <= cached.fetched_at
+            ):
+                return None
+            self._put(url, shared)
+        if not self.is_fresh(shared):
+            return None
+        self.shared_hits += 1
+        record_cache_outcome("page", "shared_hit")
+        return shared.document
+
+    def warm(
+        self, urls: Iterable[str], load: Callable[[str], Optional[CachedPage]]
+    ) -> int:
+        """
+        Loads the pages of the urls that are not cached yet, e.g. from the advisory store
+        at startup, up to `max_size` pages. Urls the loader has no page for are skipped.
+        Returns the number of pages loaded.
+        """
+        loaded = 0
+        for url in urls:
+            if len(self) >= self.max_size:
+                break
+            if url in self or (page := load(url)) is None:
+                continue
+            self.store(url, page)
+            loaded += 1
+        return loaded
+
+    def _fresh_document(self, url: str) -> Optional[Document]:
+        page = self.lookup(url)
+        if page is not None and self.is_fresh(page):
+            self.hits += 1
+            record_cache_outcome("page", "hit")
+            return page.document
+        return None
+
+    def _serve_stale(self, url: str, stale: CachedPage) -> Document:
+        self.stale += 1
+        record_cache_outcome("page", "stale")
+        if (stale_pages := STALE_PAGES.get()) is not None:
+            # the cache clock is monotonic, report the fetch time as an epoch time
+            stale_pages[url] = time.time() - (self._clock() - stale.fetched_at)
+        return stale.document
+
+    def get(self, url: str, load: PageLoader) -> Document:
+        """
+        Returns the document for the url, loading it with `load` when missing or expired.
+        The deadline does not apply, the load is only bounded by the fetch timeouts.
+        """
+        if (document := self._fresh_document(url)) is not None:
+            return document
+        with self._lock:
+            url_lock = self._url_locks.setdefault(url, threading.Lock())
+        with url_lock:
+            # another thread may have loaded the page while we waited for the lock
+            if (document := self._fresh_document(url)) is not None:
+                return document
+            if (
+                document := self._adopt_shared(url, self._shared_page(url))
+            ) is not None:
+                return document
+            self._sync_misses += 1
+            record_cache_outcome("page", "miss")
+            stale = self.lookup(url)
+            try:
+                page = load(url, stale)
+            except PageFetchError:
+                if stale is None:
+                    raise
+                return self._serve_stale(url, stale)
+            self.store(url, page, stale)
+            self._share(url, page)
+        return page.document
+
+    async def _aload(
+        self, url: str, load: AsyncPageLoader, stale: Optional[CachedPage]
+    ) -> CachedPage:
+        page = await load(url, stale)
+        self.store(url, page, stale)
+        if self.shared is not None:
+            await asyncio.to_thread(self._share, url, page)
+        return page
+
+    async def aget(self, url: str, load: AsyncPageLoader) -> Document:
+        """Asynchronous version of `get`, concurrent misses for a url await one shared load."""
+        if (document := self._fresh_document(url)) is not None:
+            return document
+        if self.shared is not None and url not in self._loads:
+            shared = await asyncio.to_thread(self._shared_page, url)
+            if (document := self._adopt_shared(url, shared)) is not None:
+                return document
+        stale = self.lookup(url)
+        try:
+            # the load goes on for the other requests once this one stopped waiting
+            page = await asyncio.wait_for(
+                self._loads.run(url, partial(self._aload, url, load, stale)),
+                self.deadline or None,
+            )
+        except asyncio.TimeoutError:
+            if stale is None:
+                raise PageFetchTimeout(
+                    f"Timed out retrieving web content: no response from {url} "
+                    f"within {self.deadline:g} seconds"
+                ) from None
+            return self._serve_stale(url, stale)
+        except PageFetchError:
+            if stale is None:
+                raise
+            return self._serve_stale(url, stale)
+        return page.document
@@ -0,0 +1,311 @@
+import asyncio
+import importlib.util
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+import httpx
+
+from adviser.config import (
+    OFFLINE_MODE,
+    PAGE_BREAKER_RESET,
+    PAGE_BREAKER_THRESHOLD,
+    PAGE_CONNECT_TIMEOUT,
+    PAGE_FETCH_BACKOFF,
+    PAGE_FETCH_HTTP2,
+    PAGE_FETCH_MAX_CONNECTIONS,
+    PAGE_FETCH_PER_HOST,
+    PAGE_FETCH_RETRIES,
+    PAGE_FETCH_TIMEOUT,
+)
+
+REQUEST_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+}
+# upstream statuses worth retrying, other responses are returned as is
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+# httpx only speaks HTTP/2 with the `h2` package, an install without it falls back
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+class PageFetchError(Exception):
+    """Smartraveller could not be reached or failed, served as 502 Bad Gateway."""
+
+    status_code = 502
+
+
+class PageFetchTimeout(PageFetchError):
+    """Smartraveller did not respond in time, served as 504 Gateway Timeout."""
+
+    status_code = 504
+
+
+class HostUnavailable(PageFetchError):
+    """Raised without contacting a host whose circuit breaker is open."""
+
+    status_code = 503
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker of a host: after `threshold` consecutive failed fetches the host is
+    not contacted for `reset_timeout` seconds, then a single trial fetch is let through
+    every `reset_timeout` seconds until one succeeds.
+    """
+
+    def __init__(
+        self,
+        threshold: int = PAGE_BREAKER_THRESHOLD,
+        reset_timeout: float = PAGE_BREAKER_RESET,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.failures = 0
+        self._opened_at = 0.0
+
+    @property
+    def is_open(self) -> bool:
+        return bool(self.threshold) and self.failures >= self.threshold
+
+    def allow(self) -> bool:
+        """Returns whether a fetch may be sent, counting it as the trial if the breaker is open."""
+        with self._lock:
+            if not self.is_open:
+                return True
+            if self._clock() - self._opened_at < self.reset_timeout:
+                return False
+            # a trial that never reports back must not keep the host closed for good
+            self._opened_at = self._clock()
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.is_open:
+                self._opened_at = self._clock()
+
+
+class PageFetcher:
+    """
+    Process wide HTTP client for the advice page fetches.
+
+    Connections are pooled and kept alive across requests (over HTTP/2 when available),
+    fetches are capped per host and failed fetches are retried with a jittered
+    exponential backoff. Errors are raised as `PageFetchError`/`PageFetchTimeout`.
+    A host failing `breaker_threshold` fetches in a row is not contacted for
+    `breaker_reset` seconds, its fetches raise `HostUnavailable` right away.
+    An httpx `transport`, e.g. of `RecordedPages`, answers the fetches instead of the
+    network.
+    """
+
+    def __init__(
+        self,
+        connect_timeout: float = PAGE_CONNECT_TIMEOUT,
+        read_timeout: float = PAGE_FETCH_TIMEOUT,
+        retries: int = PAGE_FETCH_RETRIES,
+        backoff: float = PAGE_FETCH_BACKOFF,
+        max_connections: int = PAGE_FETCH_MAX_CONNECTIONS,
+        per_host: int = PAGE_FETCH_PER_HOST,
+        http2: bool = PAGE_FETCH_HTTP2,
+        breaker_threshold: int = PAGE_BREAKER_THRESHOLD,
+        breaker_reset: float = PAGE_BREAKER_RESET,
+        transport: Optional[httpx.MockTransport] = None,
+    ):
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(
+            max_connections=max_connections, max_keepalive_connections=max_connections
+        )
+        self.retries = retries
+        self.backoff = backoff
+        self.per_host = per_host
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self.breaker_threshold = breaker_threshold
+        self.breaker_reset = breaker_reset
+        self.transport = transport
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        # loading the CA bundle is expensive, build the context once and share it
+        self._ssl_context = httpx.create_ssl_context()
+        self._lock = threading.Lock()
+        self._client: Optional[httpx.Client] = None
+        self._host_slots: Dict[str, threading.BoundedSemaphore] = {}
+        # async clients and semaphores are bound to the event loop they are used in
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._async_host_slots: Dict[str, asyncio.Semaphore] = {}
+
+    def _client_options(self) -> dict:
+        return dict(
+            headers=REQUEST_HEADERS,
+            verify=self._ssl_context,
+            timeout=self.timeout,
+            limits=self.limits,
+            http2=self.http2,
+            follow_redirects=True,
+            transport=self.transport,
+        )
+
+    def _delay(self, attempt: int) -> float:
+        """Full jitter backoff, so clients retrying together do not hit the host in step."""
+        return random.uniform(0, self.backoff * 2**attempt)
+
+    def _should_retry(self, attempt: int, response: httpx.Response) -> bool:
+        return attempt < self.retries and response.status_code in RETRY_STATUSES
+
+    @staticmethod
+    def _checked(url: str, response: httpx.Response) -> httpx.Response:
+        if response.status_code >= 500 or response.status_code in RETRY_STATUSES:
+            raise PageFetchError(
+                "Error retrieving web content: Smartraveller responded with "
+                f"{response.status_code} for {url}"
+            )
+        return response
+
+    @staticmethod
+    def _wrap(error: httpx.TransportError) -> PageFetchError:
+        if isinstance(error, httpx.TimeoutException):
+            return PageFetchTimeout(f"Timed out retrieving web content: {error!r}")
+        return PageFetchError(f"Error retrieving web content: {error}")
+
+    def breaker(self, host: str) -> CircuitBreaker:
+        """Returns the circuit breaker of the host."""
+        with self._lock:
+            if (breaker := self._breakers.get(host)) is None:
+                breaker = self._breakers[host] = CircuitBreaker(
+                    self.breaker_threshold, self.breaker_reset
+                )
+            return breaker
+
+    def _allowed_breaker(self, url: str) -> CircuitBreaker:
+        host = httpx.URL(url).host
+        breaker = self.breaker(host)
+        if not breaker.allow():
+            raise HostUnavailable(
+                f"Error retrieving web content: {host} is failing, "
+                f"not contacted for {self.breaker_reset:g} seconds"
+            )
+        return breaker
+
+    def get(self, url: str, headers: Optional[Dict[str, str]] = None) -> httpx.Response:
+        """
+        Sends a GET request for the url and returns the response, e.g. a 404 page or a
+        304 for a conditional request, unless Smartraveller failed with a server error.
+        """
+        breaker = self._allowed_breaker(url)
+        try:
+            response = self._get(url, headers)
+        except PageFetchError:
+            breaker.record_failure()
+            raise
+        breaker.record_success()
+        return response
+
+    def _get(self, url: str, headers: Optional[Dict[str, str]]) -> httpx.Response:
+        with self._lock:
+            if self._client is None:
+                self._client = httpx.Client(**self._client_options())
+            client = self._client
+            host = httpx.URL(url).host
+            slots = self._host_slots.setdefault(
+                host, threading.BoundedSemaphore(self.per_host)
+            )
+
+        for attempt in range(self.retries + 1):
+            try:
+                with slots:
+                    response = client.get(url, headers=headers)
+            except httpx.TransportError as e:
+                if attempt == self.retries:
+                    raise self._wrap(e) from e
+            else:
+                if not self._should_retry(attempt, response):
+                    return self._checked(url, response)
+            time.sleep(self._delay(attempt))
+
+    def _loop_client(self) -> httpx.AsyncClient:
+        """Returns the async client of the running event loop."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # a client of a closed loop, e.g. of a previous `asyncio.run`, can not be reused
+            self._loop = loop
+            self._async_client = httpx.AsyncClient(**self._client_options())
+            self._async_host_slots = {}
+        return self._async_client
+
+    async def aget(
+        self, url: str, headers: Optional[Dict[str, str]] = None
+    ) -> httpx.Response:
+        """Asynchronous version of `get`."""
+        breaker = self._allowed_breaker(url)
+        try:
+            response = await self._aget(url, headers)
+        except PageFetchError:
+            breaker.record_failure()
+            raise
+        breaker.record_success()
+        return response
+
+    async def _aget(
+        self, url: str, headers: Optional[Dict[str, str]]
+    ) -> httpx.Response:
+        client = self._loop_client()
+        host = httpx.URL(url).host
+        slots = self._async_host_slots.setdefault(
+            host, asyncio.Semaphore(self.per_host)
+        )
+
+        for attempt in range(self.retries + 1):
+            try:
+                async with slots:
+                    response = await client.get(url, headers=headers)
+            except httpx.TransportError as e:
+                if attempt == self.retries:
+                    raise self._wrap(e) from e
+            else:
+                if not self._should_retry(attempt, response):
+                    return self._checked(url, response)
+            await asyncio.sleep(self._delay(attempt))
+
+    async def awarm(self, url: str):
+        """
+        Opens a pooled connection to the host of the url with a single HEAD request, so
+        the first requests do not wait for the TCP and TLS handshakes.
+        """
+        try:
+            await self._loop_client().head(url)
+        except httpx.TransportError as e:
+            raise self._wrap(e) from e
+
+    def close(self):
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+    async def aclose(self):
+        """Closes the pooled connections of the current event loop."""
+        if self._async_client is not None and self._loop is asyncio.get_running_loop():
+            await self._async_client.aclose()
+        self._loop = self._async_client = None
+        self.close()
+
+
+def _offline_transport() -> Optional[httpx.MockTransport]:
+    if not OFFLINE_MODE:
+        return None
+    from adviser.recorded_pages import RecordedPages
+
+    return RecordedPages().transport()
+
+
+# in offline mode the pages are served from the recorded pages
+PAGE_FETCHER = PageFetcher(transport=_offline_transport())
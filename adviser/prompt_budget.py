@@ -0,0 +1,120 @@
+import logging
+import re
+import threading
+from functools import partial
+from typing import Callable, List, Optional
+
+from adviser.config import PROMPT_TOKEN_ENCODING
+
+logger = logging.getLogger(__name__)
+
+# words split every 8 characters, runs of punctuation, line breaks with their indent and
+# runs of spaces, about the tokens of english text
+_TOKEN_ESTIMATE = re.compile(r"\w{1,8}|[^\w\s]{1,4}|\n\s*|[^\S\n]{2,}")
+# the end of a sentence, or of a line such as a heading or a list item
+_SENTENCE_END = re.compile(r"(?<=[.!?])[\"'”’)]*(?=\s)|(?=\n)")
+_WORD_END = re.compile(r"(?=\s)|$")
+_SPACES = re.compile(r"[^\S\n]+")
+_BLANK_LINES = re.compile(r"\n{3,}")
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimates the tokens of a text from its words, punctuation and whitespace."""
+    return len(_TOKEN_ESTIMATE.findall(text))
+
+
+def _count_encoded(text: str, encode: Callable[[str], List[int]]) -> int:
+    return len(encode(text))
+
+
+class TokenCounter:
+    """
+    Counts the tokens of a text with the tiktoken `encoding` of the chat model, loaded
+    once on first use or by `load`, e.g. during the app warm-up. tiktoken downloads
+    the encoding the first time it is used on a host (`TIKTOKEN_CACHE_DIR` keeps it);
+    when it can not be loaded, e.g. offline, the tokens are estimated instead and
+    `estimated` is set.
+    """
+
+    def __init__(self, encoding: str = PROMPT_TOKEN_ENCODING):
+        self.encoding = encoding
+        self.estimated = False
+        self._count: Optional[Callable[[str], int]] = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Loads the encoding, falling back to the estimate if it can not be loaded."""
+        with self._lock:
+            if self._count is not None:
+                return
+            try:
+                import tiktoken
+
+                encode = tiktoken.get_encoding(self.encoding).encode_ordinary
+                self._count = partial(_count_encoded, encode=encode)
+            except Exception as e:
+                logger.warning(
+                    "Estimating the prompt tokens, the %s encoding could not be "
+                    "loaded: %s",
+                    self.encoding,
+                    e,
+                )
+                self.estimated = True
+                self._count = estimate_tokens
+
+    def __call__(self, text: str) -> int:
+        if self._count is None:
+            self.load()
+        return self._count(text)
+
+
+# shared by the prompts of every request, the encoding is loaded once per process
+TOKEN_COUNTER = TokenCounter()
+
+
+def compact_whitespace(text: str) -> str:
+    """
+    Strips the lines of the text and collapses the spaces within them, keeping at most
+    one blank line between paragraphs.
+    """
+    lines = (line.strip() for line in _SPACES.sub(" ", text).split("\n"))
+    return _BLANK_LINES.sub("\n\n", "\n".join(lines)).strip()
+
+
+def sentence_ends(text: str) -> List[int]:
+    """Returns the offsets of the end of every sentence of the text, its end included."""
+    ends = [match.end() for match in _SENTENCE_END.finditer(text)]
+    if not ends or ends[-1] < len(text.rstrip()):
+        ends.append(len(text))
+    return ends
+
+
+def _fitting_end(
+    text: str, ends: List[int], max_tokens: int, count_tokens: Callable[[str], int]
+) -> int:
+    """Returns the last of the ends the text up to which fits in the budget, or 0."""
+    fitting = used = 0
+    for end in ends:
+        # the pieces are counted one by one, a little over the tokens of the whole text
+        used += count_tokens(text[fitting:end])
+        if used > max_tokens:
+            break
+        fitting = end
+    return fitting
+
+
+def trim_to_token_budget(
+    text: str, max_tokens: int, count_tokens: Callable[[str], int] = TOKEN_COUNTER
+) -> str:
+    """
+    Returns the leading sentences of the text within `max_tokens` tokens, the whole
+    text if it fits. A first sentence over the budget is cut after its last word
+    within the budget.
+    """
+    if count_tokens(text) <= max_tokens:
+        return text
+    end = _fitting_end(text, sentence_ends(text), max_tokens, count_tokens)
+    if end == 0:
+        word_ends = [match.start() for match in _WORD_END.finditer(text)]
+        end = _fitting_end(text, word_ends, max_tokens, count_tokens)
+    return text[:end].rstrip()
@@ -0,0 +1,82 @@
+import hashlib
+import re
+from pathlib import Path
+from typing import List, Optional
+
+import httpx
+
+from adviser.config import RECORDED_PAGES_DIR, SMARTRAVELLER_BASE_URL
+
+# the page served for the urls without a recorded page, as Smartraveller does
+NOT_FOUND_PAGE = """<html lang="en">
+<head><title>Page not found | Smartraveller</title></head>
+<body><h1>Page not found</h1></body>
+</html>
+"""
+# destination paths, e.g. "asia/indonesia", never leaving the pages directory
+_PAGE_PATH = re.compile(r"[a-z0-9-]+(?:/[a-z0-9-]+)*")
+
+
+class RecordedPages:
+    """
+    Smartraveller pages saved as HTML files, `{directory}/{region}/{country}.html` for
+    the page at `{base_url}/{region}/{country}`, served in place of the site for runs
+    without network access, e.g. tests and benchmarks (see `transport`).
+
+    Pages are matched on the url path, so a stub server with the same paths as the
+    base url is served the same pages. Urls without a recorded page are answered 404.
+    """
+
+    def __init__(
+        self,
+        directory: str = RECORDED_PAGES_DIR,
+        base_url: str = SMARTRAVELLER_BASE_URL,
+    ):
+        self.directory = Path(directory)
+        self._base_path = httpx.URL(base_url).path.rstrip("/")
+
+    def path(self, url: str) -> Optional[Path]:
+        """Returns the file of the page of the url, or None for a url of no destination."""
+        relative = httpx.URL(url).path.removeprefix(self._base_path).strip("/")
+        if not _PAGE_PATH.fullmatch(relative):
+            return None
+        return self.directory / f"{relative}.html"
+
+    def get(self, url: str) -> Optional[str]:
+        """Returns the recorded HTML of the page of the url, or None."""
+        path = self.path(url)
+        if path is None or not path.is_file():
+            return None
+        return path.read_text(encoding="utf-8")
+
+    def record(self, url: str, html: str) -> Path:
+        """Saves the HTML of the page of the url, replacing any previous recording."""
+        if (path := self.path(url)) is None:
+            raise ValueError(f"Not a destination page url: {url}")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(html, encoding="utf-8")
+        return path
+
+    def urls(self, base_url: str = SMARTRAVELLER_BASE_URL) -> List[str]:
+        """Returns the url of every recorded page."""
+        return sorted(
+            f"{base_url}/{path.relative_to(self.directory).with_suffix('').as_posix()}"
+            for path in self.directory.rglob("*.html")
+        )
+
+    def respond(self, request: httpx.Request) -> httpx.Response:
+        """
+        Answers a request with the recorded page, with an `ETag` so revalidations of
+        an unchanged page are answered 304 Not Modified.
+        """
+        html = self.get(str(request.url))
+        if html is None:
+            return httpx.Response(404, html=NOT_FOUND_PAGE)
+        etag = f'"{hashlib.sha256(html.encode()).hexdigest()[:16]}"'
+        if request.headers.get("If-None-Match") == etag:
+            return httpx.Response(304, headers={"ETag": etag})
+        return httpx.Response(200, html=html, headers={"ETag": etag})
+
+    def transport(self) -> httpx.MockTransport:
+        """Returns an httpx transport serving the recorded pages, sync and async."""
+        return httpx.MockTransport(self.respond)
@@ -0,0 +1,359 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from adviser.config import (
+    REQUEST_LOG_BACKUP_COUNT,
+    REQUEST_LOG_FLUSH_INTERVAL,
+    REQUEST_LOG_MAX_BYTES,
+    REQUEST_LOG_MAX_RATE,
+    REQUEST_LOG_PATH,
+    REQUEST_LOG_QUEUE_SIZE,
+    REQUEST_LOG_ROTATE_INTERVAL,
+    REQUEST_LOG_SAMPLE_RATE,
+)
+from adviser.metrics import STAGE_NAMES
+
+logger = logging.getLogger(__name__)
+
+# outcomes of the cache lookups of the request being recorded, by cache name
+CACHE_OUTCOMES: ContextVar[Optional[Dict[str, List[str]]]] = ContextVar(
+    "cache_outcomes", default=None
+)
+# tokens of the advice prompts of the request being recorded, one per chat model call
+PROMPT_TOKENS: ContextVar[Optional[List[int]]] = ContextVar(
+    "prompt_tokens", default=None
+)
+# maximum number of entries written to the file at once
+BATCH_SIZE = 256
+# put in the queue to stop the writer thread
+_STOP = object()
+
+
+def record_cache_outcome(cache: str, result: str):
+    """Records the result of a cache lookup, e.g. "hit", for the request being logged."""
+    outcomes = CACHE_OUTCOMES.get()
+    if outcomes is not None:
+        outcomes.setdefault(cache, []).append(result)
+
+
+def recording_prompt_tokens() -> bool:
+    """Whether the tokens of the advice prompts are recorded, i.e. a request is logged."""
+    return PROMPT_TOKENS.get() is not None
+
+
+def record_prompt_tokens(tokens: int):
+    """Records the tokens of an advice prompt, for the request being logged."""
+    prompt_tokens = PROMPT_TOKENS.get()
+    if prompt_tokens is not None:
+        prompt_tokens.append(tokens)
+
+
+def response_hash(response: Any) -> str:
+    """Returns a short hash of the response, to compare responses without storing them."""
+    if not isinstance(response, str):
+        response = json.dumps(response, sort_keys=True, default=str)
+    return hashlib.sha256(response.encode()).hexdigest()[:16]
+
+
+class RequestTrace(BaseCallbackHandler):
+    """Callback handler collecting the stage timings and destinations of one request."""
+
+    run_inline = True
+
+    def __init__(self, clock=time.perf_counter):
+        self._clock = clock
+        self._started_at: Dict[UUID, tuple] = {}
+        self.timings: Dict[str, float] = {}
+        self.destinations: List[str] = []
+
+    def on_chain_start(
+        self,
+        serialized: Dict[str, Any],
+        inputs: Dict[str, Any],
+        *,
+        run_id: UUID,
+        **kwargs: Any,
+    ):
+        if (name := kwargs.get("name")) in STAGE_NAMES:
+            self._started_at[run_id] = (name, self._clock())
+
+    def _end(self, run_id: UUID) -> Optional[str]:
+        if (started := self._started_at.pop(run_id, None)) is None:
+            return None
+        name, started_at = started
+        # the stages of the queries of a batch add up
+        self.timings[name] = self.timings.get(name, 0.0) + (self._clock() - started_at)
+        return name
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any):
+        if self._end(run_id) == "query2url":
+            if isinstance(outputs, dict):
+                outputs = outputs.get("output")
+            urls = [outputs] if isinstance(outputs, str) else outputs or []
+            self.destinations.extend(
+                url for url in urls if url not in self.destinations
+            )
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self._end(run_id)
+
+
+class RequestRecord:
+    """
+    A request being recorded in the request log.
+
+    While the record is entered, the cache lookups and the advice prompt tokens of the
+    request are recorded in it, and a failure sets its status code before being raised again.
+    """
+
+    def __init__(self, endpoint: str, body: Dict[str, Any]):
+        self.endpoint = endpoint
+        self.body = body
+        self.trace = RequestTrace()
+        self.cache: Dict[str, List[str]] = {}
+        self.prompt_tokens: List[int] = []
+        self.status_code = 200
+        self.response: Any = None
+        self.timestamp = time.time()
+        self.duration: Optional[float] = None
+        self._started_at = time.perf_counter()
+        self._context_tokens = None
+
+    def traced(self, chain):
+        """Returns the chain with the stages of its runs recorded in this record."""
+        return chain.with_config(callbacks=[self.trace])
+
+    def __enter__(self) -> "RequestRecord":
+        self._context_tokens = (
+            CACHE_OUTCOMES.set(self.cache),
+            PROMPT_TOKENS.set(self.prompt_tokens),
+        )
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        try:
+            CACHE_OUTCOMES.reset(self._context_tokens[0])
+            PROMPT_TOKENS.reset(self._context_tokens[1])
+        except ValueError:
+            # a streamed response closed from another context, e.g. on disconnect
+            pass
+        if exc is not None:
+            self.status_code = getattr(exc, "status_code", 500)
+        self.duration = time.perf_counter() - self._started_at
+
+    def entry(self) -> Dict[str, Any]:
+        """Returns the log entry, in the format read by `benchmarks.replay`."""
+        return {
+            "timestamp": round(self.timestamp, 3),
+            "endpoint": self.endpoint,
+            "body": self.body,
+            "status": self.status_code,
+            "duration_ms": round((self.duration or 0.0) * 1e3, 3),
+            "destinations": self.trace.destinations,
+            "stages_ms": {
+                stage: round(seconds * 1e3, 3)
+                for stage, seconds in self.trace.timings.items()
+            },
+            "cache": self.cache,
+            "prompt_tokens": self.prompt_tokens,
+            "response_hash": (
+                None if self.response is None else response_hash(self.response)
+            ),
+        }
+
+
+class RequestLog:
+    """
+    JSONL log of the API requests, written by a background thread.
+
+    Requests are queued and written in batches, at most every `flush_interval`
+    seconds, so the request path never waits for the disk. When the queue is full
+    the entry is dropped, as are the batches that fail to be written (e.g. on a full
+    disk), the file being reopened for the next batch. The file is rotated when it reaches `max_bytes` or is older
+    than `rotate_interval` seconds, keeping `backup_count` old files (`path.1` being the
+    newest). Only a `sample_rate` share of the requests is recorded, and at most
+    `max_rate` per second when set, to bound the logging cost during traffic peaks.
+    A `{pid}` in the path is replaced with the process id, so that the worker
+    processes of a host write and rotate their own files.
+    """
+
+    def __init__(
+        self,
+        path: str = REQUEST_LOG_PATH,
+        sample_rate: float = REQUEST_LOG_SAMPLE_RATE,
+        max_rate: int = REQUEST_LOG_MAX_RATE,
+        max_bytes: int = REQUEST_LOG_MAX_BYTES,
+        rotate_interval: float = REQUEST_LOG_ROTATE_INTERVAL,
+        backup_count: int = REQUEST_LOG_BACKUP_COUNT,
+        flush_interval: float = REQUEST_LOG_FLUSH_INTERVAL,
+        queue_size: int = REQUEST_LOG_QUEUE_SIZE,
+        clock=time.time,
+    ):
+        self.path = path.replace("{pid}", str(os.getpid()))
+        self.sample_rate = sample_rate
+        self.max_rate = max_rate
+        self.max_bytes = max_bytes
+        self.rotate_interval = rotate_interval
+        self.backup_count = backup_count
+        self.flush_interval = flush_interval
+        self._clock = clock
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._opened_at: Optional[float] = None
+        self._second = 0
+        self._second_count = 0
+        self.written = 0
+        self.dropped = 0
+        self.sampled_out = 0
+
+    def record(self, endpoint: str, body: Dict[str, Any]) -> Optional[RequestRecord]:
+        """Returns a record for the request, or None if the request is not sampled."""
+        with self._lock:
+            second = int(self._clock())
+            if second != self._second:
+                self._second, self._second_count = second, 0
+            if random.random() >= self.sample_rate or (
+                self.max_rate and self._second_count >= self.max_rate
+            ):
+                self.sampled_out += 1
+                return None
+            self._second_count += 1
+        return RequestRecord(endpoint, body)
+
+    def write(self, record: RequestRecord):
+        """Queues the record to be written, without blocking."""
+        self.start()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="request-log", daemon=True
+                )
+                self._thread.start()
+
+    def close(self):
+        """Writes the queued records and stops the writer thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        # the writer drains the queue, a full queue is only waited on while it runs
+        while thread is not None and thread.is_alive():
+            try:
+                self._queue.put(_STOP, timeout=0.1)
+            except queue.Full:
+                continue
+            thread.join()
+            break
+
+    async def aclose(self):
+        await asyncio.to_thread(self.close)
+
+    def _next_batch(self) -> List[Any]:
+        """Waits for a record, then collects records for up to `flush_interval` seconds."""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < BATCH_SIZE and batch[-1] is not _STOP:
+            try:
+                batch.append(
+                    self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                )
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        stream = None
+        failing = False
+        try:
+            while True:
+                batch = self._next_batch()
+                stopped = batch[-1] is _STOP
+                records = batch[:-1] if stopped else batch
+                if records:
+                    try:
+                        stream = self._write(stream, records)
+                    except Exception:
+                        # e.g. an unwritable path or a full disk, the batch is dropped
+                        # and the file reopened for the next one
+                        if not failing:
+                            logger.exception("Request log write failed")
+                        failing = True
+                        if stream is not None:
+                            stream.close()
+                            stream = None
+                        with self._lock:
+                            self.dropped += len(records)
+                    else:
+                        if failing:
+                            logger.info("Request log writes resumed")
+                        failing = False
+                if stopped:
+                    return
+        finally:
+            if stream is not None:
+                stream.close()
+
+    def _write(self, stream, records: List[RequestRecord]):
+        """Writes the records, opening or rotating the file first, returns the stream."""
+        if stream is None:
+            stream = self._open()
+        if self._should_rotate():
+            stream.close()
+            self._rotate()
+            stream = self._open()
+        lines = "".join(
+            json.dumps(record.entry(), default=str) + "\n" for record in records
+        )
+        stream.write(lines)
+        stream.flush()
+        with self._lock:
+            self.written += len(records)
+        return stream
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if self._opened_at is None or not os.path.exists(self.path):
+            # the age of the file counts from when this log first opened it
+            self._opened_at = self._clock()
+        return open(self.path, "a", encoding="utf-8")
+
+    def _should_rotate(self) -> bool:
+        size = os.path.getsize(self.path)
+        if not size:
+            return False
+        if self.max_bytes and size >= self.max_bytes:
+            return True
+        return bool(self.rotate_interval) and (
+            self._clock() - self._opened_at >= self.rotate_interval
+        )
+
+    def _rotate(self):
+        """Renames `path` to `path.1`, `path.1` to `path.2` and so on."""
+        if self.backup_count <= 0:
+            os.remove(self.path)
+            return
+        for index in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        os.replace(self.path, f"{self.path}.1")
@@ -0,0 +1,261 @@
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Callable, Dict, FrozenSet, Optional, Set, Tuple
+
+from langchain_core.documents.base import Document
+
+from adviser.config import (
+    RESPONSE_CACHE_MAX_SIZE,
+    RESPONSE_CACHE_SIMILARITY,
+    RESPONSE_CACHE_TTL,
+)
+from adviser.request_log import record_cache_outcome
+from adviser.utils import normalize_text
+
+if TYPE_CHECKING:
+    from adviser.shared_store import SharedStore
+
+logger = logging.getLogger(__name__)
+
+# words that do not change the advice asked for, "not" and "safe" are kept on purpose
+STOP_WORDS = frozenset(
+    """
+    a an the i im m s we my our me us you your it its is are am be was were will would
+    could can should shall may might do does did to of in on at for from with about
+    and or if so this that there here what whats how like want planning plan going go
+    travel travelling traveling trip visit visiting please tell advice now currently
+    right moment any
+    """.split()
+)
+# number of buckets of the hashing vectorizer
+N_FEATURES = 2**18
+
+QueryFeatures = FrozenSet[int]
+
+
+def vectorize_query(query: str) -> QueryFeatures:
+    """Hashes the content words of the query into a binary bag of words vector."""
+    return frozenset(
+        zlib.crc32(token.encode()) % N_FEATURES
+        for token in normalize_text(query)
+        if token not in STOP_WORDS
+    )
+
+
+def cosine_similarity(a: QueryFeatures, b: QueryFeatures) -> float:
+    if not a or not b:
+        return float(a == b)
+    return len(a & b) / math.sqrt(len(a) * len(b))
+
+
+def encode_features(features: QueryFeatures) -> str:
+    return ",".join(map(str, sorted(features)))
+
+
+def decode_features(field: bytes) -> QueryFeatures:
+    return frozenset(map(int, filter(None, field.decode().split(","))))
+
+
+def page_version(doc: Document) -> str:
+    """Returns the hash identifying the content of an advice page."""
+    return hashlib.sha1(doc.page_content.encode()).hexdigest()
+
+
+@dataclass
+class _CachedResponse:
+    response: str
+    stored_at: float
+
+
+class ResponseCache:
+    """
+    Cache of final advice responses keyed by the advice page url, the page version and
+    the query features.
+
+    A lookup is served by an entry whose query is similar enough (cosine similarity of
+    the hashed bag of words of at least `similarity`) for the same page version. All
+    responses for a page are dropped as soon as its content hash changes.
+
+    With a shared store (see `adviser.shared_store`), the responses are also stored in
+    a hash per page version, and a lookup missing the process cache is served by the
+    responses stored by the other worker processes.
+    """
+
+    def __init__(
+        self,
+        ttl: float = RESPONSE_CACHE_TTL,
+        max_size: int = RESPONSE_CACHE_MAX_SIZE,
+        similarity: float = RESPONSE_CACHE_SIMILARITY,
+        clock: Callable[[], float] = time.monotonic,
+        shared: Optional["SharedStore"] = None,
+    ):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.similarity = similarity
+        self.shared = shared
+        self._clock = clock
+        self._responses: OrderedDict[Tuple[str, QueryFeatures], _CachedResponse] = (
+            OrderedDict()
+        )
+        self._page_versions: Dict[str, str] = {}
+        self._queries_by_url: Dict[str, Set[QueryFeatures]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.shared_hits = 0
+
+    def __len__(self) -> int:
+        return len(self._responses)
+
+    def _drop(self, key: Tuple[str, QueryFeatures]):
+        del self._responses[key]
+        url, features = key
+        self._queries_by_url[url].discard(features)
+
+    def _sync_page_version(self, url: str, version: str):
+        """Invalidates the responses of the page when its content changed."""
+        if self._page_versions.get(url) == version:
+            return
+        for features in self._queries_by_url.pop(url, set()):
+            del self._responses[(url, features)]
+        self._page_versions[url] = version
+
+    def _find(self, url: str, features: QueryFeatures) -> Optional[str]:
+        if (url, features) in self._responses:
+            key = (url, features)
+        else:
+            key, best = None, self.similarity
+            for candidate in self._queries_by_url.get(url, ()):
+                if (score := cosine_similarity(features, candidate)) >= best:
+                    key, best = (url, candidate), score
+            if key is None:
+                return None
+
+        cached = self._responses[key]
+        if self._clock() - cached.stored_at >= self.ttl:
+            self._drop(key)
+            return None
+        self._responses.move_to_end(key)
+        return cached.response
+
+    def _put(self, url: str, features: QueryFeatures, cached: _CachedResponse):
+        self._responses[(url, features)] = cached
+        self._responses.move_to_end((url, features))
+        self._queries_by_url.setdefault(url, set()).add(features)
+        while len(self._responses) > self.max_size:
+            self._drop(next(iter(self._responses)))
+
+    def _find_shared(
+        self, url: str, version: str, features: QueryFeatures
+    ) -> Optional[_CachedResponse]:
+        """Returns the most similar response stored by any worker, if similar enough."""
+        try:
+            entries = self.shared.hgetall(f"response:{url}:{version}")
+        except Exception:
+            logger.warning("Failed to read the shared responses", exc_info=True)
+            return None
+        found, best = None, self.similarity
+        now = time.time()
+        for field, value in entries.items():
+            entry = json.loads(value)
+            if now - entry["stored_at"] >= self.ttl:
+                continue
+            candidate = decode_features(field)
+            if (score := cosine_similarity(features, candidate)) >= best:
+                found, best = entry, score
+        if found is None:
+            return None
+        # the cache clock is per process, the shared store time is an epoch time
+        return _CachedResponse(
+            found["response"], self._clock() - (now - found["stored_at"])
+        )
+
+    def _lookup_local(self, url: str, version: str, features: QueryFeatures):
+        with self._lock:
+            self._sync_page_version(url, version)
+            response = self._find(url, features)
+            self.hits += response is not None
+        if response is not None:
+            record_cache_outcome("response", "hit")
+        return response
+
+    def _adopt_shared(
+        self,
+        url: str,
+        version: str,
+        features: QueryFeatures,
+        shared: Optional[_CachedResponse],
+    ) -> Optional[str]:
+        """Caches the response found in the shared store, counting the lookup."""
+        with self._lock:
+            if shared is None:
+                self.misses += 1
+            else:
+                self._sync_page_version(url, version)
+                self._put(url, features, shared)
+                self.shared_hits += 1
+        record_cache_outcome("response", "miss" if shared is None else "shared_hit")
+        return None if shared is None else shared.response
+
+    def lookup(self, doc: Document, query: str) -> Optional[str]:
+        """Returns a cached response for the query about the given advice page, if any."""
+        url, version = doc.metadata.get("source", ""), page_version(doc)
+        features = vectorize_query(query)
+        if (response := self._lookup_local(url, version, features)) is not None:
+            return response
+        shared = None
+        if self.shared is not None:
+            shared = self._find_shared(url, version, features)
+        return self._adopt_shared(url, version, features, shared)
+
+    async def alookup(self, doc: Document, query: str) -> Optional[str]:
+        """Asynchronous version of `lookup`, the shared store is read in a thread."""
+        url, version = doc.metadata.get("source", ""), page_version(doc)
+        features = vectorize_query(query)
+        if (response := self._lookup_local(url, version, features)) is not None:
+            return response
+        shared = None
+        if self.shared is not None:
+            shared = await asyncio.to_thread(self._find_shared, url, version, features)
+        return self._adopt_shared(url, version, features, shared)
+
+    def _store_local(
+        self, doc: Document, query: str, response: str
+    ) -> Tuple[str, QueryFeatures]:
+        """Caches the response in the process, returning its shared name and features."""
+        url, version = doc.metadata.get("source", ""), page_version(doc)
+        features = vectorize_query(query)
+        with self._lock:
+            self._sync_page_version(url, version)
+            self._put(url, features, _CachedResponse(response, self._clock()))
+        return f"response:{url}:{version}", features
+
+    def _share(self, name: str, features: QueryFeatures, response: str):
+        entry = json.dumps({"response": response, "stored_at": time.time()})
+        try:
+            self.shared.hset(name, encode_features(features), entry)
+            self.shared.expire(name, math.ceil(self.ttl))
+        except Exception:
+            logger.warning("Failed to share the response", exc_info=True)
+
+    def store(self, doc: Document, query: str, response: str) -> str:
+        """Caches the response to the query about the given advice page and returns it."""
+        name, features = self._store_local(doc, query, response)
+        if self.shared is not None:
+            self._share(name, features, response)
+        return response
+
+    async def astore(self, doc: Document, query: str, response: str) -> str:
+        """Asynchronous version of `store`, the shared store is written in a thread."""
+        name, features = self._store_local(doc, query, response)
+        if self.shared is not None:
+            await asyncio.to_thread(self._share, name, features, response)
+        return response
@@ -0,0 +1,28 @@
+"""
+Serves the API with several worker processes, `WEB_CONCURRENCY` of them (one per CPU
+core by default), sharing their page and response caches through `SHARED_CACHE_URL`:
+
+    WEB_CONCURRENCY=4 SHARED_CACHE_URL=sqlite:////tmp/adviser-cache.sqlite3 python -m adviser.serve
+"""
+
+import argparse
+
+import uvicorn
+
+from adviser.config import WEB_CONCURRENCY
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--app", default="adviser.app:app")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=80)
+    parser.add_argument("--workers", type=int, default=WEB_CONCURRENCY)
+    args = parser.parse_args()
+
+    # every worker imports the app, so builds its own chains and process caches
+    uvicorn.run(args.app, host=args.host, port=args.port, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+import importlib.util
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Optional, Protocol, Union
+
+from adviser.config import SHARED_CACHE_URL
+
+Value = Union[bytes, str]
+# the redis client is only used when a redis:// url is configured
+REDIS_AVAILABLE = importlib.util.find_spec("redis") is not None
+# number of writes between two purges of the expired entries
+_PURGE_EVERY = 512
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT NOT NULL,
+    field TEXT NOT NULL,
+    value BLOB NOT NULL,
+    expires_at REAL,
+    PRIMARY KEY (key, field)
+)
+"""
+# plain values are stored under the empty field, hash fields under their name
+_VALUE_FIELD = ""
+
+
+class SharedStore(Protocol):
+    """
+    The subset of the Redis commands the caches share their entries across processes
+    with. `redis.Redis` clients implement it, as `SQLiteSharedStore` does locally.
+    """
+
+    def get(self, name: str) -> Optional[bytes]: ...
+
+    def set(
+        self, name: str, value: Value, ex: Optional[int] = None, nx: bool = False
+    ) -> Optional[bool]: ...
+
+    def delete(self, *names: str) -> int: ...
+
+    def hset(self, name: str, key: str, value: Value) -> int: ...
+
+    def hget(self, name: str, key: str) -> Optional[bytes]: ...
+
+    def hgetall(self, name: str) -> Dict[bytes, bytes]: ...
+
+    def expire(self, name: str, time: int) -> bool: ...
+
+
+def _encode(value: Value) -> bytes:
+    return value.encode() if isinstance(value, str) else value
+
+
+class SQLiteSharedStore:
+    """
+    Redis-like key value store in a local SQLite file, shared by the worker processes
+    of a host. WAL mode lets the workers read while another one writes.
+
+    Keys hold either a value (`get`/`set`) or a hash (`hget`/`hset`/`hgetall`), with an
+    optional expiry in whole seconds, an int as Redis requires. Values are returned as
+    bytes, as by a Redis client.
+    """
+
+    def __init__(self, path: str, clock: Callable[[], float] = time.time):
+        self.path = path
+        self._clock = clock
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._writes = 0
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(_SCHEMA)
+
+    def close(self):
+        self._connection.close()
+
+    def _expires_at(self, seconds: Optional[int]) -> Optional[float]:
+        if seconds is None:
+            return None
+        # redis-py rejects other types, e.g. floats, fail the same way in tests
+        if not isinstance(seconds, int) or isinstance(seconds, bool):
+            raise TypeError(f"The expiry must be an int of seconds, not {seconds!r}")
+        return self._clock() + seconds
+
+    def _written(self):
+        """Purges the expired entries every `_PURGE_EVERY` writes, holding the lock."""
+        self._writes += 1
+        if self._writes % _PURGE_EVERY == 0:
+            self._connection.execute(
+                "DELETE FROM entries WHERE expires_at <= ?", (self._clock(),)
+            )
+
+    def get(self, name: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT value FROM entries WHERE key = ? AND field = ? "
+                "AND (expires_at IS NULL OR expires_at > ?)",
+                (name, _VALUE_FIELD, self._clock()),
+            ).fetchone()
+        return None if row is None else bytes(row[0])
+
+    def set(
+        self, name: str, value: Value, ex: Optional[int] = None, nx: bool = False
+    ) -> Optional[bool]:
+        """
+        Sets the value of the key, expiring after `ex` seconds. With `nx` the value is
+        only set if the key does not exist, returning None otherwise, e.g. as a lock.
+        """
+        now = self._clock()
+        expires_at = self._expires_at(ex)
+        with self._lock, self._connection:
+            if nx:
+                # take the write lock first, so two processes can not both set the key
+                self._connection.execute("BEGIN IMMEDIATE")
+                exists = self._connection.execute(
+                    "SELECT 1 FROM entries WHERE key = ? "
+                    "AND (expires_at IS NULL OR expires_at > ?)",
+                    (name, now),
+                ).fetchone()
+                if exists:
+                    return None
+            self._connection.execute("DELETE FROM entries WHERE key = ?", (name,))
+            self._connection.execute(
+                "INSERT INTO entries VALUES (?, ?, ?, ?)",
+                (name, _VALUE_FIELD, _encode(value), expires_at),
+            )
+            self._written()
+        return True
+
+    def delete(self, *names: str) -> int:
+        with self._lock, self._connection:
+            deleted = 0
+            for name in names:
+                cursor = self._connection.execute(
+                    "DELETE FROM entries WHERE key = ?", (name,)
+                )
+                deleted += cursor.rowcount > 0
+        return deleted
+
+    def hset(self, name: str, key: str, value: Value) -> int:
+        """Sets a field of the hash, keeping the expiry of the hash."""
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                "SELECT expires_at FROM entries WHERE key = ? LIMIT 1", (name,)
+            ).fetchone()
+            expires_at = row[0] if row is not None else None
+            if expires_at is not None and expires_at <= self._clock():
+                self._connection.execute("DELETE FROM entries WHERE key = ?", (name,))
+                expires_at = None
+            cursor = self._connection.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)",
+                (name, key, _encode(value), expires_at),
+            )
+            self._written()
+        return cursor.rowcount
+
+    def hget(self, name: str, key: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT value FROM entries WHERE key = ? AND field = ? "
+                "AND (expires_at IS NULL OR expires_at > ?)",
+                (name, key, self._clock()),
+            ).fetchone()
+        return None if row is None else bytes(row[0])
+
+    def hgetall(self, name: str) -> Dict[bytes, bytes]:
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT field, value FROM entries WHERE key = ? AND field != ? "
+                "AND (expires_at IS NULL OR expires_at > ?)",
+                (name, _VALUE_FIELD, self._clock()),
+            ).fetchall()
+        return {field.encode(): bytes(value) for field, value in rows}
+
+    def expire(self, name: str, time: int) -> bool:
+        expires_at = self._expires_at(time)
+        with self._lock, self._connection:
+            cursor = self._connection.execute(
+                "UPDATE entries SET expires_at = ? WHERE key = ?",
+                (expires_at, name),
+            )
+        return cursor.rowcount > 0
+
+
+def open_shared_store(url: str = SHARED_CACHE_URL) -> Optional[SharedStore]:
+    """
+    Opens the shared store of the url, `sqlite:///path/to/cache.sqlite3` for a local
+    SQLite file or `redis://host:port/0` for a Redis server (with the optional `redis`
+    package installed). Returns None for an empty url.
+    """
+    if not url:
+        return None
+    if url.startswith("sqlite:///"):
+        return SQLiteSharedStore(url.removeprefix("sqlite:///"))
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        if not REDIS_AVAILABLE:
+            raise ImportError(f"Install the `redis` package to use {url}")
+        import redis
+
+        return redis.Redis.from_url(url)
+    raise ValueError(f"Unsupported shared cache url: {url}")
@@ -0,0 +1,49 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+from adviser.request_log import record_cache_outcome
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls: the first call for a key runs, and the calls
+    for the same key made while it is in flight await its result, or its exception,
+    instead of running again. Nothing is kept once the call finished.
+
+    The call runs in its own task, so a caller giving up, e.g. a client disconnecting,
+    does not cancel it for the other callers. `misses` counts the calls that ran and
+    `coalesced` the calls served by a call in flight.
+    """
+
+    def __init__(self, name: str = "request"):
+        self.name = name
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+        self.misses = 0
+        self.coalesced = 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        """Whether a call for the key is in flight."""
+        return key in self._in_flight
+
+    def _done(self, key: Hashable, task: asyncio.Task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if not task.cancelled():
+            # mark the exception as retrieved in case every caller gave up
+            task.exception()
+
+    async def run(self, key: Hashable, call: Callable[[], Awaitable[T]]) -> T:
+        """Returns the result of `call()`, shared with the concurrent calls for the key."""
+        task = self._in_flight.get(key)
+        if task is None:
+            self.misses += 1
+            record_cache_outcome(self.name, "miss")
+            task = asyncio.ensure_future(call())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda task: self._done(key, task))
+        else:
+            self.coalesced += 1
+            record_cache_outcome(self.name, "coalesced")
+        return await asyncio.shield(task)
@@ -1,5 +1,40 @@
-from typing import Optional
-from adviser.config import INJECTION_PATTERNS
+import re
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Tuple
+from adviser.config import INJECTION_PATTERNS, INJECTION_REGEX_PATTERNS
+
+
+def find_section_span(
+    text: str,
+    start_word: str,
+    end_word: Optional[str] = "",
+    extraction_length: int = 1000,
+) -> Optional[Tuple[int, int]]:
+    """Finds the span of the content starting and ending with the specified search word.
+
+    Args:
+        text (str): The text to search the content in.
+        start_word (str): The word the content starts with. The search is case sensitive.
+        end_word (str, optional): The word to end the content at. If not provided, the content will be of length extraction_length. Defaults to "".
+        extraction_length (int, optional): The length of the content if end_word is not provided or not found. Defaults to 1000.
+
+    Returns:
+        Optional[Tuple[int, int]]: The start and end position of the content, None if the start word is not found.
+    """
+    start_position = text.find(start_word)
+
+    if start_position == -1:
+        return None
+
+    if not end_word:
+        return start_position, start_position + extraction_length
+
+    end_position = text.find(end_word, start_position)
+
+    if end_position == -1:
+        end_position = start_position + extraction_length
+
+    return start_position, end_position
 
 
 def extract_content_from_text(
@@ -19,22 +54,109 @@ def extract_content_from_text(
     Returns:
         str: The extracted content from the text.
     """
-    start_position = text.find(start_word)
-
-    if start_position == -1:
+    span = find_section_span(text, start_word, end_word, extraction_length)
+    if span is None:
         return ""
+    return text[span[0] : span[1]]
 
-    if not end_word:
-        return text[start_position : start_position + extraction_length]
 
-    end_position = text.find(end_word, start_position)
+def normalize_text(text: str) -> List[str]:
+    """Lower cases the text, strips accents and punctuation and splits it into tokens."""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return re.sub(r"[^a-z0-9]+", " ", text.lower()).split()
 
-    if end_position == -1:
-        end_position = start_position + extraction_length
 
-    return text[start_position:end_position]
+# invisible format characters used to split up words, e.g. zero width spaces and joiners
+_INVISIBLE_CHARACTERS = re.compile(
+    "[\u00ad\u180e\u200b-\u200f\u202a-\u202e\u2060-\u2064\ufeff]"
+)
+
+
+def normalize_for_matching(text: str) -> str:
+    """
+    Folds the text to a canonical form for pattern matching: compatibility forms
+    (e.g. full width letters) are unified, case is folded, invisible format characters
+    (e.g. zero width spaces) are dropped and whitespace runs become a single space.
+    """
+    if not text.isascii():
+        text = _INVISIBLE_CHARACTERS.sub("", unicodedata.normalize("NFKC", text))
+    return " ".join(text.casefold().split())
+
+
+def _trie_regex(words: Iterable[str]) -> str:
+    """Builds a regex matching any of the words, with shared prefixes merged into a trie."""
+    trie: Dict = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: Dict) -> str:
+        branches = [
+            re.escape(char) + build(child) for char, child in node.items() if char
+        ]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+        # the optional group is greedy, so the longest word at a position is matched
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+
+class InjectionMatcher:
+    """
+    Matches a query against literal and regex injection patterns in a single regex search.
+
+    The literal patterns are merged into a trie shaped regex, so the cost of a search
+    depends on the query length rather than on the number of patterns.
+    """
+
+    def __init__(self, patterns: Iterable[str], regex_patterns: Iterable[str] = ()):
+        self._literals = {
+            normalize_for_matching(pattern): pattern for pattern in patterns
+        }
+        self._literals.pop("", None)
+        # queries are case folded before matching, so no pattern needs to ignore case
+        self._regexes = [(pattern, re.compile(pattern)) for pattern in regex_patterns]
+        literal_regex = _trie_regex(self._literals)
+        alternatives = [f"(?:{pattern})" for pattern in regex_patterns]
+        if literal_regex:
+            alternatives.insert(0, literal_regex)
+        self._any = re.compile("|".join(alternatives) or "(?!)")
+        # the lookahead reports the longest literal starting at every position
+        self._literal_starts = re.compile(f"(?=({literal_regex or '(?!)'}))")
+
+    def search(self, query: str) -> bool:
+        """Returns True if any pattern matches the query."""
+        return self._any.search(normalize_for_matching(query)) is not None
+
+    def find_all(self, query: str) -> List[str]:
+        """Returns every pattern that matches the query, in order of first appearance."""
+        text = normalize_for_matching(query)
+        matched = {}
+        for match in self._literal_starts.finditer(text):
+            longest = match.group(1)
+            # shorter literals starting at the same position are prefixes of the longest
+            for end in range(1, len(longest) + 1):
+                if (pattern := self._literals.get(longest[:end])) is not None:
+                    matched[pattern] = None
+        for pattern, regex in self._regexes:
+            if regex.search(text):
+                matched[pattern] = None
+        return list(matched)
+
+
+INJECTION_MATCHER = InjectionMatcher(INJECTION_PATTERNS, INJECTION_REGEX_PATTERNS)
 
 
 def detect_injection(query: str) -> bool:
     """Simple heuristic to detect prompt injection attempts"""
-    return any(pattern in query.lower() for pattern in INJECTION_PATTERNS)
+    return INJECTION_MATCHER.search(query)
+
+
+def find_injection_patterns(query: str) -> List[str]:
+    """Returns the injection patterns found in the query, e.g. for logging and auditing."""
+    return INJECTION_MATCHER.find_all(query)
@@ -0,0 +1,99 @@
+"""
+Throughput of the batch advice endpoint compared with sending the same queries one
+by one to `/get_travel_advice`, against a stub chat model and a stub Smartraveller server.
+
+    python -m benchmarks.bench_batch --n-queries 40 --llm-latency 0.2
+"""
+
+import argparse
+import asyncio
+import itertools
+import os
+import time
+
+import httpx
+
+from benchmarks.stubs import StubAdvisoryServer, stub_chat_model
+
+QUERIES = [
+    "Is it safe to go to Bali?",
+    "Any warnings for Tokyo?",
+    "Is Fiji safe?",
+    "Heading to Paris next week",
+    "Is Cape Town safe?",
+]
+
+
+async def post_sequentially(client: httpx.AsyncClient, queries) -> float:
+    start = time.perf_counter()
+    for query in queries:
+        response = await client.post("/get_travel_advice", json={"query": query})
+        response.raise_for_status()
+    return time.perf_counter() - start
+
+
+async def post_batch(client: httpx.AsyncClient, queries) -> float:
+    start = time.perf_counter()
+    response = await client.post(
+        "/get_travel_advice/batch", json={"queries": queries}, timeout=None
+    )
+    response.raise_for_status()
+    assert all("response" in item for item in response.json()["responses"])
+    return time.perf_counter() - start
+
+
+async def run(app, queries, post) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        return await post(client, queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--n-queries", type=int, default=40)
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--page-latency", type=float, default=0.1)
+    parser.add_argument("--max-concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    queries = list(itertools.islice(itertools.cycle(QUERIES), args.n_queries))
+    with StubAdvisoryServer(latency=args.page_latency) as server:
+        # the advice url is built from the configured base url at import time
+        os.environ["SMARTRAVELLER_BASE_URL"] = server.base_url
+        from adviser.advise_model import (
+            construct_batch_query2advice_chain,
+            construct_query2advice_chain,
+        )
+        from adviser.destination_resolver import DestinationResolver
+        from adviser.make_app import make_app
+
+        chat_model = stub_chat_model(latency=args.llm_latency)
+        resolver = DestinationResolver()
+        app = make_app(
+            construct_query2advice_chain(chat_model, resolver=resolver),
+            batch_chain=construct_batch_query2advice_chain(
+                chat_model, resolver=resolver
+            ),
+            batch_max_concurrency=args.max_concurrency,
+        )
+
+        sequential = asyncio.run(run(app, queries, post_sequentially))
+        sequential_fetches = server.request_count
+        batch = asyncio.run(run(app, queries, post_batch))
+        batch_fetches = server.request_count - sequential_fetches
+
+    print(f"{'mode':>10} {'seconds':>8} {'queries/s':>10} {'page fetches':>13}")
+    for mode, elapsed, fetches in [
+        ("sequential", sequential, sequential_fetches),
+        ("batch", batch, batch_fetches),
+    ]:
+        print(
+            f"{mode:>10} {elapsed:>8.2f} {len(queries) / elapsed:>10.1f} {fetches:>13}"
+        )
+    print(f"speedup: {sequential / batch:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
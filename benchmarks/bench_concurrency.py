@@ -0,0 +1,67 @@
+"""
+Load test of the `/get_travel_advice` endpoint against a stub chat model and a
+stub Smartraveller server, reporting throughput for increasing numbers of
+concurrent clients.
+
+    python -m benchmarks.bench_concurrency --llm-latency 0.2 --page-latency 0.1
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+import httpx
+
+from benchmarks.stubs import StubAdvisoryServer, stub_chat_model
+
+
+async def run_clients(app, n_clients: int, requests_per_client: int) -> float:
+    """Runs `n_clients` clients posting sequentially and returns requests per second."""
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+
+        async def run_client():
+            for _ in range(requests_per_client):
+                response = await client.post(
+                    "/get_travel_advice", json={"query": "Is Bali safe?"}
+                )
+                response.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*[run_client() for _ in range(n_clients)])
+        elapsed = time.perf_counter() - start
+    return n_clients * requests_per_client / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--page-latency", type=float, default=0.1)
+    parser.add_argument("--requests-per-client", type=int, default=4)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+
+    with StubAdvisoryServer(latency=args.page_latency) as server:
+        # the advice url is built from the configured base url at import time
+        os.environ["SMARTRAVELLER_BASE_URL"] = server.base_url
+        from adviser.advise_model import construct_query2advice_chain
+        from adviser.make_app import make_app
+
+        chain = construct_query2advice_chain(stub_chat_model(latency=args.llm_latency))
+        app = make_app(chain, max_concurrency=max(args.clients))
+
+        baseline = None
+        print(f"{'clients':>8} {'req/s':>8} {'speedup':>8}")
+        for n_clients in args.clients:
+            throughput = asyncio.run(
+                run_clients(app, n_clients, args.requests_per_client)
+            )
+            baseline = baseline or throughput
+            print(f"{n_clients:>8} {throughput:>8.2f} {throughput / baseline:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
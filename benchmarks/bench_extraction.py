@@ -0,0 +1,95 @@
+"""
+Latency of extracting the prompt fields from large advice pages, comparing the section
+spans cached per document with the previous full page scan on every request.
+
+    python -m benchmarks.bench_extraction
+"""
+
+import argparse
+import random
+import string
+import time
+
+from langchain_core.documents.base import Document
+
+from adviser.advise_model import (
+    define_information_input_variables,
+    get_required_prompt_fields,
+)
+from adviser.utils import extract_content_from_text
+
+
+def synthetic_page(size_kb: int, with_sections: bool, seed: int = 0) -> str:
+    """Returns a page of random words, with the advice sections near its end if asked."""
+    rng = random.Random(seed)
+    words = []
+    length = 0
+    while length < size_kb * 1024:
+        word = "".join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 9)))
+        words.append(word)
+        length += len(word) + 1
+    body = " ".join(words)
+    if not with_sections:
+        return body
+    return (
+        body
+        + " Latest update: Exercise a high degree of caution. Download PDF"
+        + " Advice levels: Level 2 Exercise a high degree of caution. Overview "
+        + body[:2000]
+    )
+
+
+def extract_full_page(doc: Document, query: str):
+    """The extraction as it was before the spans were cached."""
+    fields = {}
+    for key, value in define_information_input_variables().items():
+        match value.html_section:
+            case "query":
+                fields[key] = query
+            case "metadata":
+                fields[key] = doc.metadata.get(key, "")
+            case "page_content":
+                fields[key] = extract_content_from_text(
+                    doc.page_content,
+                    value.html_section_start,
+                    value.html_section_end,
+                    value.html_section_length,
+                )
+    return fields
+
+
+def time_per_call(func, doc: Document, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(doc, "Is it safe to travel?")
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 300, 1000])
+    parser.add_argument("--repeat", type=int, default=1000)
+    args = parser.parse_args()
+
+    print(
+        f"{'page kb':>8} {'sections':>9} {'first us':>9} {'cached us':>10} {'full scan us':>13}"
+    )
+    for size in args.sizes:
+        for with_sections in (True, False):
+            content = synthetic_page(size, with_sections)
+            doc = Document(page_content=content, metadata={"title": "Title"})
+
+            start = time.perf_counter()
+            cached_fields = get_required_prompt_fields(doc, "Is it safe to travel?")
+            first_us = (time.perf_counter() - start) * 1e6
+            cached_us = time_per_call(get_required_prompt_fields, doc, args.repeat)
+            full_us = time_per_call(extract_full_page, doc, args.repeat)
+            assert cached_fields == extract_full_page(doc, "Is it safe to travel?")
+            print(
+                f"{size:>8} {str(with_sections):>9} {first_us:>9.0f}"
+                f" {cached_us:>10.1f} {full_us:>13.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
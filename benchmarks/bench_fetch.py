@@ -0,0 +1,74 @@
+"""
+Advice page fetches through the shared pooled `PageFetcher` compared with a new client
+per fetch, as `WebBaseLoader` did, against a stub Smartraveller server counting the
+TCP connections it accepts.
+
+    python -m benchmarks.bench_fetch --n-fetches 200 --concurrency 8
+"""
+
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from adviser.page_fetcher import REQUEST_HEADERS, PageFetcher
+from benchmarks.stubs import StubAdvisoryServer
+
+
+async def fetch_all(fetch, url: str, n_fetches: int, concurrency: int) -> float:
+    """Runs `n_fetches` fetches, `concurrency` at a time, and returns the elapsed seconds."""
+    slots = asyncio.Semaphore(concurrency)
+
+    async def fetch_one():
+        async with slots:
+            response = await fetch(url)
+            response.raise_for_status()
+
+    start = time.perf_counter()
+    await asyncio.gather(*[fetch_one() for _ in range(n_fetches)])
+    return time.perf_counter() - start
+
+
+async def fetch_with_new_client(url: str) -> httpx.Response:
+    async with httpx.AsyncClient(headers=REQUEST_HEADERS) as client:
+        return await client.get(url)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--n-fetches", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--page-latency", type=float, default=0.0)
+    args = parser.parse_args()
+
+    print(f"{'client':>10} {'fetch/s':>9} {'connections':>12}")
+    for name in ("per fetch", "pooled"):
+        with StubAdvisoryServer(latency=args.page_latency) as server:
+            url = f"{server.base_url}/asia/indonesia"
+            if name == "pooled":
+                fetcher = PageFetcher()
+
+                async def run():
+                    try:
+                        return await fetch_all(
+                            fetcher.aget, url, args.n_fetches, args.concurrency
+                        )
+                    finally:
+                        await fetcher.aclose()
+
+                elapsed = asyncio.run(run())
+            else:
+                elapsed = asyncio.run(
+                    fetch_all(
+                        fetch_with_new_client, url, args.n_fetches, args.concurrency
+                    )
+                )
+            print(
+                f"{name:>10} {args.n_fetches / elapsed:>9.0f}"
+                f" {server.connection_count:>12}"
+            )
+
+
+if __name__ == "__main__":
+    main()
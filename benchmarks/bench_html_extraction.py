@@ -0,0 +1,82 @@
+"""
+CPU time and peak memory of turning a saved advice page into the prompt document,
+comparing the advisory section extractor with the full page html2text conversion.
+
+    python -m benchmarks.bench_html_extraction --repeat 20 --padding-kb 0 1000
+"""
+
+import argparse
+import time
+import tracemalloc
+from pathlib import Path
+
+from adviser.advise_model import get_required_prompt_fields
+from adviser.adviser_support_info_retriver import (
+    parse_html_document,
+    transform_html_content,
+)
+from adviser.advisory_extractor import extract_advisory_document
+
+PAGE_PATH = Path(__file__).parent / "data" / "pages" / "asia" / "indonesia.html"
+URL = "https://www.smartraveller.gov.au/destinations/asia/indonesia"
+
+
+def convert_with_html2text(html: str):
+    return transform_html_content([parse_html_document(html, URL)])
+
+
+def extract_advisory_sections(html: str):
+    return extract_advisory_document(html, URL)
+
+
+def padded_page(html: str, padding_kb: int) -> str:
+    """Adds paragraphs after the advisory sections, as on long pages."""
+    paragraph = (
+        "<p>" + "Travellers should read the local laws section. " * 20 + "</p>\n"
+    )
+    padding = paragraph * (padding_kb * 1024 // len(paragraph))
+    return html.replace("</main>", padding + "</main>")
+
+
+def measure(convert, html: str, repeat: int):
+    """Returns the CPU milliseconds per conversion, the peak KiB and the content size."""
+    start = time.process_time()
+    for _ in range(repeat):
+        document = convert(html)
+    cpu_ms = (time.process_time() - start) / repeat * 1e3
+
+    tracemalloc.start()
+    convert(html)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return cpu_ms, peak / 1024, len(document.page_content)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--padding-kb", type=int, nargs="+", default=[0, 1000])
+    args = parser.parse_args()
+
+    print(
+        f"{'page kb':>8} {'converter':>10} {'cpu ms':>8} {'peak kib':>9} {'content kb':>11}"
+    )
+    html = PAGE_PATH.read_text(encoding="utf-8")
+    for padding_kb in args.padding_kb:
+        page = padded_page(html, padding_kb)
+        reference = get_required_prompt_fields(convert_with_html2text(page), "query")
+        extracted = get_required_prompt_fields(extract_advisory_sections(page), "query")
+        assert extracted.keys() == reference.keys()
+        for name, convert in (
+            ("html2text", convert_with_html2text),
+            ("sections", extract_advisory_sections),
+        ):
+            cpu_ms, peak_kib, content_length = measure(convert, page, args.repeat)
+            print(
+                f"{len(page) // 1024:>8} {name:>10} {cpu_ms:>8.1f}"
+                f" {peak_kib:>9.0f} {content_length / 1024:>11.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Cold start of the app: the time to import `adviser.app` in a fresh interpreter, measured
+with `python -X importtime`, and the packages taking the most of it.
+
+The chat model, html2text and BeautifulSoup libraries are only needed once the app is
+up (see `make_app`'s chain factory), the run fails when importing the app pulls them in,
+or when the median import time exceeds `--budget-ms`.
+
+    python -m benchmarks.bench_import_time --repeat 5 --budget-ms 3000
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List, Tuple
+
+# packages that must not be imported with the app
+DEFERRED_PACKAGES = ("langchain_openai", "openai", "langchain_community", "bs4")
+
+_IMPORT_TIME = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def parse_import_times(stderr: str) -> Dict[str, Tuple[int, int]]:
+    """
+    Parses the `-X importtime` report into the self and cumulative microseconds of
+    every imported module.
+    """
+    times = {}
+    for line in stderr.splitlines():
+        if match := _IMPORT_TIME.match(line):
+            self_us, cumulative_us, _, module = match.groups()
+            times[module] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def package_times(times: Dict[str, Tuple[int, int]]) -> Dict[str, int]:
+    """Returns the microseconds spent importing the modules of every top level package."""
+    packages: Dict[str, int] = {}
+    for module, (self_us, _) in times.items():
+        package = module.split(".")[0]
+        packages[package] = packages.get(package, 0) + self_us
+    return packages
+
+
+def import_module(module: str) -> Dict[str, Tuple[int, int]]:
+    """Imports the module in a fresh interpreter and returns its import times."""
+    with tempfile.TemporaryDirectory() as directory:
+        # importing the app opens the advisory store, keep it out of the working tree
+        env = dict(
+            os.environ,
+            ADVISORY_STORE_PATH=os.path.join(directory, "advisories.sqlite3"),
+        )
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            capture_output=True,
+            text=True,
+            env=env,
+            check=True,
+        )
+    return parse_import_times(completed.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--module", default="adviser.app")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--budget-ms", type=float, default=None)
+    parser.add_argument("--output", default=None, help="write the results as JSON")
+    args = parser.parse_args()
+
+    runs = [import_module(args.module) for _ in range(args.repeat)]
+    totals_ms = [run[args.module][1] / 1e3 for run in runs]
+    median_ms = statistics.median(totals_ms)
+    # the last run has the warmest file system cache, as the app in a running container
+    packages = package_times(runs[-1])
+    top = sorted(packages.items(), key=lambda item: item[1], reverse=True)[: args.top]
+    deferred = [package for package in DEFERRED_PACKAGES if package in packages]
+
+    print(
+        f"import {args.module}: median {median_ms:.0f} ms, min {min(totals_ms):.0f} ms"
+    )
+    for package, micros in top:
+        print(f"{package:>24} {micros / 1e3:>8.1f} ms")
+
+    failures: List[str] = []
+    if args.module == "adviser.app" and deferred:
+        failures.append(f"imported with the app: {', '.join(deferred)}")
+    if args.budget_ms is not None and median_ms > args.budget_ms:
+        failures.append(f"import time {median_ms:.0f} ms > {args.budget_ms:.0f} ms")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump(
+                {
+                    "module": args.module,
+                    "median_ms": median_ms,
+                    "runs_ms": totals_ms,
+                    "packages_ms": {package: us / 1e3 for package, us in top},
+                },
+                output,
+                indent=2,
+            )
+    for failure in failures:
+        print(f"regression: {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
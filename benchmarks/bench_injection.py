@@ -0,0 +1,69 @@
+"""
+Latency of `detect_injection` style matching as the pattern list grows, comparing the
+compiled `InjectionMatcher` with the previous per-pattern substring scan.
+
+    python -m benchmarks.bench_injection
+"""
+
+import argparse
+import random
+import string
+import time
+
+from adviser.config import INJECTION_PATTERNS
+from adviser.utils import InjectionMatcher
+
+QUERIES = [
+    "I would like to travel to Indonesia. Is it safe?",
+    "Is it safe to go to Bali and Lombok with my family in December?",
+    "We are planning a three week trip through Thailand, Cambodia and Laos "
+    "next year, what should we know about the current advice levels?",
+]
+
+
+def synthetic_patterns(n_patterns: int, seed: int = 0):
+    """Returns the configured patterns padded with random multi word phrases."""
+    rng = random.Random(seed)
+    vocabulary = [
+        "".join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 9)))
+        for _ in range(5000)
+    ]
+    patterns = list(INJECTION_PATTERNS)
+    while len(patterns) < n_patterns:
+        patterns.append(" ".join(rng.choices(vocabulary, k=rng.randint(2, 4))))
+    return patterns[:n_patterns]
+
+
+def time_per_call(func, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for query in QUERIES:
+            func(query)
+    return (time.perf_counter() - start) / (repeat * len(QUERIES)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[90, 1000, 2500, 5000, 10000]
+    )
+    parser.add_argument("--repeat", type=int, default=300)
+    args = parser.parse_args()
+
+    print(f"{'patterns':>9} {'build ms':>9} {'compiled us':>12} {'scan us':>9}")
+    for size in args.sizes:
+        patterns = synthetic_patterns(size)
+        start = time.perf_counter()
+        matcher = InjectionMatcher(patterns)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        def scan(query):
+            return any(pattern in query.lower() for pattern in patterns)
+
+        compiled_us = time_per_call(matcher.search, args.repeat)
+        scan_us = time_per_call(scan, max(args.repeat // 10, 1))
+        print(f"{size:>9} {build_ms:>9.0f} {compiled_us:>12.1f} {scan_us:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Overhead of the per-stage metrics callbacks on the query to advice chain, run with and
+without `ChainMetrics` against a stub chat model and a stub Smartraveller server.
+
+The CPU overhead per request is measured with no latency at all, and reported as a
+share of the request time for the given chat model latency.
+
+    python -m benchmarks.bench_metrics --llm-latency 0.5
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+from benchmarks.stubs import StubAdvisoryServer, stub_chat_model
+
+
+async def time_per_request(chain, config, n_requests: int) -> float:
+    """Runs the chain sequentially and returns the mean seconds per request."""
+    await chain.ainvoke({"query": "Is Bali safe?"}, config)
+    start = time.perf_counter()
+    for _ in range(n_requests):
+        await chain.ainvoke({"query": "Is Bali safe?"}, config)
+    return (time.perf_counter() - start) / n_requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--n-requests", type=int, default=300)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    with StubAdvisoryServer() as server:
+        # the advice url is built from the configured base url at import time
+        os.environ["SMARTRAVELLER_BASE_URL"] = server.base_url
+        from adviser.advise_model import construct_query2advice_chain
+        from adviser.destination_resolver import DestinationResolver
+        from adviser.metrics import ChainMetrics
+        from adviser.page_cache import PageCache
+
+        page_cache = PageCache()
+        resolver = DestinationResolver()
+        chain = construct_query2advice_chain(
+            stub_chat_model(), page_cache=page_cache, resolver=resolver
+        )
+        metrics = ChainMetrics(caches={"page": page_cache, "resolver": resolver})
+
+        # interleave the rounds so drifts of the machine affect both sides alike
+        plain, instrumented = [], []
+        for _ in range(args.rounds):
+            plain.append(asyncio.run(time_per_request(chain, None, args.n_requests)))
+            instrumented.append(
+                asyncio.run(
+                    time_per_request(chain, {"callbacks": [metrics]}, args.n_requests)
+                )
+            )
+        plain_s, instrumented_s = min(plain), min(instrumented)
+        overhead_s = instrumented_s - plain_s
+        request_s = plain_s + 2 * args.llm_latency
+
+        print(f"without metrics      {plain_s * 1e6:>9.0f} us/request")
+        print(f"with metrics         {instrumented_s * 1e6:>9.0f} us/request")
+        print(f"overhead             {overhead_s * 1e6:>9.0f} us/request")
+        print(
+            f"overhead at {args.llm_latency:g}s llm  {overhead_s / request_s:>9.2%}"
+            f" of {request_s * 1e3:.0f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+End to end latency of the query to advice chain with one large chat model for both
+stages against a small fast model extracting the destinations (with structured
+output) and the large model writing the advice. The fake models wait a time to first
+token and generate their response at a rate of tokens, the latency profile of a real
+model.
+
+No destination resolver is used, so every query goes through the extraction stage,
+as the queries the resolver can not resolve do.
+
+    python -m benchmarks.bench_model_tiering --large-latency 0.5 --small-latency 0.15
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from typing import List
+
+from benchmarks.stubs import StubAdvisoryServer, stub_chat_model
+
+QUERY = "We are taking the kids to Bali in July, what should we know?"
+# an advice of a few hundred tokens, as the advice prompt asks for
+ADVICE = "\n".join(
+    [
+        'Travel Safety Level:\n"Exercise a high degree of caution" in Indonesia overall.',
+        *[
+            f"- Safety tip {tip}: keep your passport and valuables safe."
+            for tip in range(20)
+        ],
+    ]
+)
+
+
+async def time_queries(chain, repeat: int) -> List[float]:
+    """Returns the seconds to answer the query, for every repetition."""
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await chain.ainvoke({"query": QUERY})
+        seconds.append(time.perf_counter() - start)
+    return seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--large-latency", type=float, default=0.5)
+    parser.add_argument("--large-tokens-per-second", type=float, default=100)
+    parser.add_argument("--small-latency", type=float, default=0.15)
+    parser.add_argument("--small-tokens-per-second", type=float, default=333)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with StubAdvisoryServer() as server:
+        # the advice url is built from the configured base url at import time
+        os.environ["SMARTRAVELLER_BASE_URL"] = server.base_url
+        from adviser.advise_model import construct_query2advice_chain
+        from adviser.fake_chat_model import TextFakeChatModel
+        from adviser.page_cache import PageCache
+
+        def large_model(model_class=None):
+            return stub_chat_model(
+                model_class,
+                latency=args.large_latency,
+                tokens_per_second=args.large_tokens_per_second,
+                canned_advice=ADVICE,
+            )
+
+        small_model = stub_chat_model(
+            latency=args.small_latency, tokens_per_second=args.small_tokens_per_second
+        )
+        chains = {
+            # the free text extraction of the format instructions, as before tiering
+            "single model": construct_query2advice_chain(
+                large_model(TextFakeChatModel), page_cache=PageCache()
+            ),
+            "tiered": construct_query2advice_chain(
+                large_model(), page_cache=PageCache(), extraction_model=small_model
+            ),
+        }
+
+        baseline = None
+        print(f"{'models':<14} {'p50 s':>7} {'max s':>7} {'vs single':>10}")
+        for name, chain in chains.items():
+            # the first query fills the page cache
+            asyncio.run(chain.ainvoke({"query": QUERY}))
+            seconds = asyncio.run(time_queries(chain, args.repeat))
+            p50 = statistics.median(seconds)
+            baseline = baseline or p50
+            print(
+                f"{name:<14} {p50:>7.3f} {max(seconds):>7.3f} {p50 / baseline:>9.2f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""
+Input tokens of the advice prompt on a fixed regression set of advice pages and
+queries, comparing the compacted prompt (see `adviser.prompt_budget`) with the prompt
+as it was before, indented and with the page sections cut at fixed lengths.
+
+The compacted prompt must keep every advice level the answer to a query needs: the
+run fails when an expected level is in the previous prompt but not in the compacted
+one. With `--model` both prompts are also sent to that OpenAI chat model and the
+share of the answers giving the expected levels is compared (needs an API key).
+
+    python -m benchmarks.bench_prompt_tokens
+    python -m benchmarks.bench_prompt_tokens --model gpt-4o-mini-2024-07-18
+"""
+
+import argparse
+import json
+import re
+import sys
+from typing import Dict, List, Optional
+
+from langchain_core.documents.base import Document
+
+from adviser.advise_model import (
+    ADVICE_PROMPT_PREFIX,
+    ADVICE_PROMPT_SUFFIX,
+    get_prompt_fields,
+    get_required_prompt_fields,
+)
+from adviser.prompt_budget import TOKEN_COUNTER
+
+REGRESSION_SET = "benchmarks/data/prompt_regression.jsonl"
+
+# the advice prompt before compaction, kept as the baseline
+LEGACY_PROMPT_PREFIX = """ 
+        Given the following inputs:
+        
+        `title`: The title of the webpage.
+        `description`: A brief description of the webpage content.
+        `latest_update`: The latest update of the travel advisory for the country.
+        `advice_levels`: The score level of the country and its sub-regions.
+        `query`: The question that the traveller asked about the country he is going to travel to.
+        
+        ===================================================================================================
+        
+        Your task is to assess whether it is safe to travel to the specified country and provide reasons for your assessment
+        that is related to the `latest_update`.
+        If a sub-region is specified, also provide the advice level for that sub-region. 
+        Do not list advice levels for sub-regions that are not specified or the information is not provided.
+        
+        Your responsed advice should be one of following:
+        ['Do Not Travel', 'Reconsider Your Need to Travel', 'Exercise a High Degree of Caution', 'Exercise Normal Safety Precautions']
+        If the `title` returns "page not found", respond with: "There is no trip advisory based on the current information."
+        
+        ===================================================================================================
+
+        Example:
+        
+        Give following inputs:
+
+        `title`: "Indonesia Travel Advice & Safety | Smartraveller"
+        `description`: "Australian Government travel advice for Indonesia. Exercise a high degree of caution. Travel advice level YELLOW. 
+        Understand the risks, safety, laws and contacts."
+        `latest_update`: "The Bali Provincial Government has introduced a new tourist levy of IDR 150,000 per person to foreign tourists entering Bali. 
+        The tourist levy is separate from the e-Visa on Arrival or the Visa on Arrival. Cashless payments can be made online prior to travel or on arrival 
+        at designated payment counters at Bali's airport and seaport. See the Bali Provincial Government's official website for further information (see 
+        link in 'Travel' section below)."
+        `advice_levels`: "Exercise a high degree of caution" in Indonesia overall.\n"Reconsider Your Need to Travel" in Papua.
+        
+        with different queries, you should give different responses:
+        Case 1:
+        `query`: "I would like to travel to Indonesia. Is it safe?"
+        `response`:
+        Travel Safety Level: 
+            "Exercise a high degree of caution" in Indonesia overall.
+        Reasons:
+            ongoing risk of terrorist attack.
+            the risk of serious security incidents or demonstrations that may turn violent.
+        Case 2:
+        `query`: "I would like to travel to Papua in Indonesia. Is it safe?"
+        `response`:
+        Travel Safety Level: 
+            "Exercise a high degree of caution" in Indonesia overall.
+            "Reconsider Your Need to Travel" in Papua.
+        Reasons:
+            ongoing risk of terrorist attack.
+        Case 3:
+        `query`: "I would like to travel to Jakarta in Indonesia. Is it safe?"
+        `response`:
+       Travel Safety Level: 
+            "Exercise a high degree of caution" in Indonesia overall.
+        Reasons:
+            ongoing risk of terrorist attack.
+        Since no specific advice level for Jakarta is provided, the overall advice for Indonesia applies.
+
+        ===================================================================================================
+        
+        Please complete the task using following information:
+"""
+
+LEGACY_PROMPT_SUFFIX = """        `title`: {title}
+        `description`:{description}
+        `latest_update`: {latest_update}
+        `advice_levels`: {advice_levels}
+        `query`: {query}
+        
+        Please generate the response, if information is not sufficient to complete the task do not make up 
+        the answer, and response with "I do not have sufficient information to provide you with the advice."
+        If {query} is not related to travel or travel advice, respones with "Please only ask travel advice related questions."
+        """
+
+
+def load_cases(path: str) -> List[Dict]:
+    with open(path) as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def case_document(case: Dict) -> Document:
+    return Document(
+        page_content=case["page_content"],
+        metadata={
+            "source": case["url"],
+            "title": case["title"],
+            "description": case["description"],
+        },
+    )
+
+
+def legacy_prompt(case: Dict) -> str:
+    """The prompt as it was built, with the raw fields and the query input dict."""
+    fields = get_required_prompt_fields(case_document(case), {"query": case["query"]})
+    return LEGACY_PROMPT_PREFIX + LEGACY_PROMPT_SUFFIX.format(**fields)
+
+
+def compact_prompt(case: Dict) -> str:
+    fields = get_prompt_fields(case_document(case), {"query": case["query"]})
+    return ADVICE_PROMPT_PREFIX + ADVICE_PROMPT_SUFFIX.format(**fields)
+
+
+def mentions_level(text: str, level: str, place: str) -> bool:
+    """Whether a sentence or line of the text gives the level for the place."""
+    return any(
+        level.lower() in sentence.lower() and place.lower() in sentence.lower()
+        for sentence in re.split(r"(?<=[.!?])\s+|\n", text)
+    )
+
+
+def kept_levels(prompt: str, case: Dict) -> int:
+    return sum(
+        mentions_level(prompt, level, place) for level, place in case["expected_levels"]
+    )
+
+
+def answer_levels(model, prompt: str, case: Dict) -> bool:
+    """Whether the chat model answer gives every expected level."""
+    answer = model.invoke(prompt).content
+    return kept_levels(answer, case) == len(case["expected_levels"])
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("path", nargs="?", default=REGRESSION_SET)
+    parser.add_argument("--model", help="OpenAI chat model answering both prompts")
+    args = parser.parse_args(argv)
+
+    cases = load_cases(args.path)
+    TOKEN_COUNTER.load()
+    counter = "estimated" if TOKEN_COUNTER.estimated else TOKEN_COUNTER.encoding
+    print(f"prompt tokens ({counter})")
+    print(f"{'query':<48} {'before':>7} {'after':>7} {'saved':>6}")
+    totals = [0, 0]
+    lost = 0
+    prompts = []
+    for case in cases:
+        before, after = legacy_prompt(case), compact_prompt(case)
+        prompts.append((before, after))
+        tokens = TOKEN_COUNTER(before), TOKEN_COUNTER(after)
+        totals = [total + count for total, count in zip(totals, tokens)]
+        lost += kept_levels(before, case) - kept_levels(after, case)
+        print(
+            f"{case['query'][:48]:<48} {tokens[0]:>7} {tokens[1]:>7}"
+            f" {1 - tokens[1] / tokens[0]:>6.0%}"
+        )
+    print(
+        f"{'total':<48} {totals[0]:>7} {totals[1]:>7} {1 - totals[1] / totals[0]:>6.0%}"
+    )
+    print(f"expected advice levels lost by the compacted prompts: {lost}")
+
+    if args.model:
+        from langchain_openai import ChatOpenAI
+
+        model = ChatOpenAI(model=args.model, temperature=0)
+        correct = [0, 0]
+        for case, (before, after) in zip(cases, prompts):
+            correct[0] += answer_levels(model, before, case)
+            correct[1] += answer_levels(model, after, case)
+        print(
+            f"answers with the expected levels: before {correct[0]}/{len(cases)},"
+            f" after {correct[1]}/{len(cases)}"
+        )
+        lost += max(correct[0] - correct[1], 0)
+    return 1 if lost > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
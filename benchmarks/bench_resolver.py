@@ -0,0 +1,63 @@
+"""
+Hit rate, accuracy and latency of the local destination resolver on a labelled
+query set. Queries labelled with a null country are expected to be left to the LLM.
+
+    python -m benchmarks.bench_resolver
+"""
+
+import argparse
+import json
+import statistics
+import time
+from pathlib import Path
+
+from adviser.destination_resolver import DestinationResolver
+
+LABELLED_QUERIES = Path(__file__).parent / "data" / "labelled_queries.jsonl"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--queries", type=Path, default=LABELLED_QUERIES)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    with open(args.queries) as f:
+        labelled = [json.loads(line) for line in f if line.strip()]
+
+    start = time.perf_counter()
+    resolver = DestinationResolver()
+    build_ms = (time.perf_counter() - start) * 1000
+
+    hits, correct, wrong = 0, 0, []
+    latencies = []
+    for row in labelled:
+        country = resolver.resolve(row["query"])
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            resolver.resolve(row["query"])
+            latencies.append((time.perf_counter() - start) * 1e6)
+        if country is None:
+            continue
+        hits += 1
+        if (country.region, country.name) == (row["region"], row["country"]):
+            correct += 1
+        else:
+            wrong.append((row["query"], f"{country.region}/{country.name}"))
+
+    resolvable = sum(row["country"] is not None for row in labelled)
+    latencies.sort()
+    print(f"index build:       {build_ms:.1f} ms")
+    print(f"queries:           {len(labelled)} ({resolvable} resolvable)")
+    print(
+        f"hit rate:          {hits / len(labelled):.1%} of all, {hits / resolvable:.1%} of resolvable"
+    )
+    print(f"accuracy on hits:  {correct / max(hits, 1):.1%}")
+    print(f"latency p50:       {statistics.median(latencies):.1f} us")
+    print(f"latency p99:       {latencies[int(len(latencies) * 0.99)]:.1f} us")
+    for query, resolved in wrong:
+        print(f"wrong: {query!r} -> {resolved}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Latency of the url2doc stage when Smartraveller is slow or failing, with and without the
+page cache fetch deadline. Every request finds an expired cached page and revalidates it
+against a stub server answering after `--slow-latency` seconds, or failing with 503.
+
+With the deadline the stale page is served once the deadline is reached while the fetch
+goes on in the background, and once the circuit breaker opened the failing host is not
+waited for at all.
+
+    python -m benchmarks.bench_stale_serving --requests 20 --deadline 0.25
+"""
+
+import argparse
+import asyncio
+import time
+from typing import List, Optional
+
+from langchain_core.documents.base import Document
+
+from adviser.page_cache import CachedPage, PageCache
+from adviser.page_fetcher import PageFetcher
+from benchmarks.replay import percentile
+from benchmarks.stubs import StubAdvisoryServer
+
+
+async def request_pages(
+    page_cache: PageCache, fetcher: PageFetcher, url: str, requests: int
+) -> List[float]:
+    """Requests the page one request after the other and returns their seconds."""
+
+    async def load(url: str, stale: Optional[CachedPage]) -> CachedPage:
+        response = await fetcher.aget(url)
+        return CachedPage(document=Document(page_content=response.text))
+
+    seconds = []
+    try:
+        for _ in range(requests):
+            start = time.perf_counter()
+            await page_cache.aget(url, load)
+            seconds.append(time.perf_counter() - start)
+    finally:
+        await fetcher.aclose()
+    return seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--deadline", type=float, default=0.25)
+    parser.add_argument("--slow-latency", type=float, default=2.0)
+    args = parser.parse_args()
+
+    print(
+        f"{'upstream':>9} {'deadline':>9} {'p50 ms':>8} {'p99 ms':>8} "
+        f"{'stale':>6} {'fetches':>8}"
+    )
+    for upstream in ("slow", "failing"):
+        for deadline in (0.0, args.deadline):
+            with StubAdvisoryServer() as server:
+                url = f"{server.base_url}/asia/indonesia"
+                if upstream == "slow":
+                    server.latency = args.slow_latency
+                else:
+                    server.failures = 10**9
+                # a ttl of 0 makes every request revalidate the cached page
+                page_cache = PageCache(ttl=0, deadline=deadline)
+                page_cache.store(url, CachedPage(document=Document(page_content="")))
+                seconds = asyncio.run(
+                    request_pages(page_cache, PageFetcher(), url, args.requests)
+                )
+                fetches = server.request_count
+            print(
+                f"{upstream:>9} {deadline or 'none':>9} "
+                f"{percentile(seconds, 50) * 1e3:>8.0f} "
+                f"{percentile(seconds, 99) * 1e3:>8.0f} "
+                f"{page_cache.stale:>6} {fetches:>8}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Latency of the query to advice chain for trips to an increasing number of destinations,
+against a stub chat model and a stub Smartraveller server. The advice pages and the
+advice of every destination are retrieved and generated concurrently, so a trip should
+take about as long as a single destination. Trips are extracted by the chat model, the
+resolver only resolves single destinations, so they take one more chat model call.
+
+    python -m benchmarks.bench_trip --llm-latency 0.5 --page-latency 0.2
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+from benchmarks.stubs import StubAdvisoryServer, stub_chat_model
+
+DESTINATIONS = ["Thailand", "Cambodia", "Laos", "Vietnam", "Japan"]
+
+
+async def time_trip(chain, query: str, repeat: int) -> float:
+    """Returns the mean seconds to answer the query."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        await chain.ainvoke({"query": query})
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--page-latency", type=float, default=0.2)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with StubAdvisoryServer(latency=args.page_latency) as server:
+        # the advice url is built from the configured base url at import time
+        os.environ["SMARTRAVELLER_BASE_URL"] = server.base_url
+        from adviser.advise_model import construct_query2advice_chain
+        from adviser.destination_resolver import DestinationResolver
+
+        single = None
+        print(f"{'destinations':>12} {'seconds':>8} {'vs single':>10}")
+        for count in range(1, len(DESTINATIONS) + 1):
+            query = f"Is it safe to visit {' then '.join(DESTINATIONS[:count])}?"
+            trip = {
+                "destinations": [
+                    {"name": name.lower(), "region": "asia"}
+                    for name in DESTINATIONS[:count]
+                ]
+            }
+            chain = construct_query2advice_chain(
+                stub_chat_model(
+                    latency=args.llm_latency, canned_destinations=trip["destinations"]
+                ),
+                resolver=DestinationResolver(),
+            )
+            seconds = asyncio.run(time_trip(chain, query, args.repeat))
+            single = single or seconds
+            print(f"{count:>12} {seconds:>8.3f} {seconds / single:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
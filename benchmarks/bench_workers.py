@@ -0,0 +1,139 @@
+"""
+Throughput and latency of the app served by 1, 2 and 4 uvicorn worker processes (see
+`adviser.serve`), with the stub chat model and a stub Smartraveller server. The workers
+share their page and response caches through a SQLite shared store, so the advice page
+is fetched from Smartraveller once whatever the number of workers.
+
+The speedup is bounded by the CPU cores of the machine: the chain runs mostly on the
+CPU between the stubbed calls, so on a single core the workers only add overhead.
+
+    python -m benchmarks.bench_workers --workers 1 2 4 --requests 200 --concurrency 16
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.replay import percentile
+from benchmarks.stubs import StubAdvisoryServer
+
+QUERIES = [
+    "Is Bali safe?",
+    "Should I travel to Indonesia?",
+    "Is Jakarta safe for tourists?",
+    "Any travel warnings for Lombok?",
+]
+
+
+def start_workers(
+    workers: int, port: int, base_url: str, cache_path: str, llm_latency: float
+) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        SMARTRAVELLER_BASE_URL=base_url,
+        SHARED_CACHE_URL=f"sqlite:///{cache_path}",
+        ADVISORY_STORE_PATH=os.path.join(os.path.dirname(cache_path), "store.sqlite3"),
+        STUB_LLM_LATENCY=str(llm_latency),
+    )
+    return subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "adviser.serve",
+            "--app",
+            "benchmarks.stub_app:app",
+            "--host",
+            "127.0.0.1",
+            "--port",
+            str(port),
+            "--workers",
+            str(workers),
+        ],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def wait_until_ready(base_url: str, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{base_url}/ready").status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    raise TimeoutError(f"The workers at {base_url} did not get ready")
+
+
+async def run_load(base_url: str, requests: int, concurrency: int) -> Dict:
+    """Posts the queries from `concurrency` clients and returns the measurements."""
+    seconds: List[float] = []
+    pending = iter(range(requests))
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+
+        async def run_client():
+            for i in pending:
+                start = time.perf_counter()
+                response = await client.post(
+                    "/get_travel_advice", json={"query": QUERIES[i % len(QUERIES)]}
+                )
+                response.raise_for_status()
+                seconds.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*[run_client() for _ in range(concurrency)])
+        elapsed = time.perf_counter() - start
+    return {
+        "throughput": requests / elapsed,
+        "p50": percentile(seconds, 50),
+        "p99": percentile(seconds, 99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--port", type=int, default=8731)
+    args = parser.parse_args()
+
+    print(f"cpu cores: {os.cpu_count()}")
+    print(f"{'workers':>8} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'fetches':>8}")
+    for workers in args.workers:
+        with StubAdvisoryServer() as server, tempfile.TemporaryDirectory() as tmp:
+            process = start_workers(
+                workers,
+                args.port,
+                server.base_url,
+                os.path.join(tmp, "cache.sqlite3"),
+                args.llm_latency,
+            )
+            base_url = f"http://127.0.0.1:{args.port}"
+            try:
+                wait_until_ready(base_url)
+                result = asyncio.run(
+                    run_load(base_url, args.requests, args.concurrency)
+                )
+            finally:
+                process.terminate()
+                process.wait()
+            fetches = server.request_count
+        print(
+            f"{workers:>8} {result['throughput']:>8.2f} "
+            f"{result['p50'] * 1e3:>8.0f} {result['p99'] * 1e3:>8.0f} {fetches:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""
+Records Smartraveller advice pages for the offline mode, tests and benchmarks (see
+`adviser.recorded_pages`). Without urls the pages already recorded are fetched again:
+
+    python -m benchmarks.record_pages
+    python -m benchmarks.record_pages https://www.smartraveller.gov.au/destinations/asia/japan
+"""
+
+import argparse
+
+from adviser.config import RECORDED_PAGES_DIR
+from adviser.page_fetcher import PageFetcher
+from adviser.recorded_pages import RecordedPages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("urls", nargs="*")
+    parser.add_argument("--directory", default=RECORDED_PAGES_DIR)
+    args = parser.parse_args()
+
+    pages = RecordedPages(args.directory)
+    fetcher = PageFetcher()
+    try:
+        for url in args.urls or pages.urls():
+            response = fetcher.get(url)
+            if response.status_code != 200:
+                print(f"{response.status_code} {url}, not recorded")
+                continue
+            print(f"{pages.record(url, response.text)} <- {url}")
+    finally:
+        fetcher.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+"""
+Replays a JSONL log of API requests against the app from `make_app`, backed by a stub
+chat model with a fixed latency and a stub Smartraveller server, and reports the
+latency percentiles, the throughput and the time spent in every chain stage.
+
+Every line of the log is a request, either `{"query": "..."}` for the advice endpoint
+or `{"endpoint": "/get_travel_advice/batch", "body": {"queries": [...]}}` for any
+POST endpoint. Requests are sent by `--concurrency` clients one after another, or
+arrive at a fixed `--rate` per second whatever the latency of the previous ones.
+
+    python -m benchmarks.replay benchmarks/data/replay_requests.jsonl \\
+        --concurrency 8 --llm-latency 0.5 --output results.json
+    python -m benchmarks.replay benchmarks/data/replay_requests.jsonl \\
+        --rate 20 --baseline results.json
+
+With `--baseline`, the results are compared with a previous run and the command exits
+with an error when the p95/p99 latencies or the throughput regressed by more than the
+`--tolerance`.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import sys
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence
+
+import httpx
+
+from benchmarks.stubs import StubAdvisoryServer, stub_chat_model
+
+DEFAULT_ENDPOINT = "/get_travel_advice"
+CACHES = ("page", "resolver", "response", "levels")
+
+
+@dataclass
+class ReplayRequest:
+    endpoint: str
+    body: Dict[str, Any]
+
+
+@dataclass
+class ReplayResult:
+    endpoint: str
+    status_code: int
+    seconds: float
+
+
+@dataclass
+class ReplayRun:
+    results: List[ReplayResult] = field(default_factory=list)
+    seconds: float = 0.0
+
+
+def load_requests(path: str) -> List[ReplayRequest]:
+    """Reads the requests of a JSONL log, skipping blank lines."""
+    requests = []
+    with open(path, encoding="utf-8") as log:
+        for line_number, line in enumerate(log, start=1):
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+                if "body" in entry:
+                    request = ReplayRequest(
+                        entry.get("endpoint", DEFAULT_ENDPOINT), entry["body"]
+                    )
+                else:
+                    request = ReplayRequest(DEFAULT_ENDPOINT, {"query": entry["query"]})
+            except (ValueError, KeyError, TypeError) as e:
+                raise ValueError(
+                    f"Invalid request on line {line_number} of {path}: {e!r}"
+                ) from e
+            requests.append(request)
+    return requests
+
+
+async def send(client: httpx.AsyncClient, request: ReplayRequest) -> int:
+    """Sends the request and reads the whole response, streamed or not."""
+    async with client.stream("POST", request.endpoint, json=request.body) as response:
+        async for _ in response.aiter_bytes():
+            pass
+    return response.status_code
+
+
+async def replay(
+    app,
+    requests: Sequence[ReplayRequest],
+    concurrency: int = 8,
+    rate: Optional[float] = None,
+) -> ReplayRun:
+    """
+    Replays the requests against the app, by `concurrency` clients or, when a rate is
+    given, starting the requests at that rate. The latency of a request started late,
+    e.g. because of a slow event loop, counts from when it should have started.
+    """
+    run = ReplayRun()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://replay", timeout=None
+    ) as client:
+
+        async def send_timed(request: ReplayRequest, scheduled_at: float):
+            status_code = await send(client, request)
+            run.results.append(
+                ReplayResult(
+                    request.endpoint, status_code, time.perf_counter() - scheduled_at
+                )
+            )
+
+        start = time.perf_counter()
+        if rate:
+
+            async def send_at(index: int, request: ReplayRequest):
+                scheduled_at = start + index / rate
+                await asyncio.sleep(scheduled_at - time.perf_counter())
+                await send_timed(request, scheduled_at)
+
+            await asyncio.gather(
+                *[send_at(index, request) for index, request in enumerate(requests)]
+            )
+        else:
+            pending = iter(requests)
+
+            async def run_client():
+                for request in pending:
+                    await send_timed(request, time.perf_counter())
+
+            await asyncio.gather(*[run_client() for _ in range(concurrency)])
+        run.seconds = time.perf_counter() - start
+    return run
+
+
+def percentile(values: Sequence[float], percent: float) -> float:
+    """Nearest rank percentile of the values."""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(percent / 100 * len(ordered)) - 1, 0)]
+
+
+def latency_summary(seconds: Sequence[float]) -> Dict[str, float]:
+    """Returns the latency percentiles, mean and max in milliseconds."""
+    if not seconds:
+        return {}
+    summary = {
+        f"p{percent}": percentile(seconds, percent) * 1e3 for percent in (50, 95, 99)
+    }
+    summary["mean"] = sum(seconds) / len(seconds) * 1e3
+    summary["max"] = max(seconds) * 1e3
+    return {name: round(value, 3) for name, value in summary.items()}
+
+
+def histogram_summary(histogram) -> Dict[str, Dict[str, float]]:
+    """Returns the count and mean milliseconds per label of a `metrics.Histogram`."""
+    summary = {}
+    for labels, (counts, total) in sorted(histogram.values.items()):
+        count = sum(counts)
+        summary[labels[0] or "other"] = {
+            "count": count,
+            "mean_ms": round(total[0] / count * 1e3, 3),
+        }
+    return summary
+
+
+def cache_summary(caches: Dict[str, Any]) -> Dict[str, Dict[str, float]]:
+    """
+    Returns the hits and misses of the caches, and their hit rate, e.g. the share of
+    the queries the level answerer answered without the chat model.
+    """
+    summary = {}
+    for name, cache in caches.items():
+        hits, misses = cache.hits, cache.misses
+        summary[name] = {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 3) if hits + misses else 0.0,
+        }
+    return summary
+
+
+def summarize(run: ReplayRun, metrics=None) -> Dict[str, Any]:
+    """Returns the results of the run, and the stage timings of the metrics if any."""
+    results = {
+        "requests": len(run.results),
+        "statuses": dict(
+            sorted(Counter(str(result.status_code) for result in run.results).items())
+        ),
+        "seconds": round(run.seconds, 3),
+        "throughput": round(len(run.results) / run.seconds, 3) if run.seconds else 0,
+        "latency_ms": latency_summary([result.seconds for result in run.results]),
+        "endpoints": {
+            endpoint: latency_summary(
+                [r.seconds for r in run.results if r.endpoint == endpoint]
+            )
+            for endpoint in sorted({result.endpoint for result in run.results})
+        },
+    }
+    if metrics is not None:
+        results["stages"] = histogram_summary(metrics.stage_duration)
+        results["llm"] = histogram_summary(metrics.llm_duration)
+        results["caches"] = cache_summary(metrics.caches)
+    return results
+
+
+def compare_results(
+    results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float
+) -> List[str]:
+    """Returns the regressions of the results from the baseline beyond the tolerance."""
+    regressions = []
+    for name in ("p95", "p99"):
+        before = baseline["latency_ms"].get(name)
+        after = results["latency_ms"].get(name)
+        if before and after and after > before * (1 + tolerance):
+            regressions.append(
+                f"{name} latency {before:.1f} ms -> {after:.1f} ms"
+                f" (+{after / before - 1:.0%})"
+            )
+    before, after = baseline["throughput"], results["throughput"]
+    if before and after < before * (1 - tolerance):
+        regressions.append(
+            f"throughput {before:.1f} -> {after:.1f} req/s (-{1 - after / before:.0%})"
+        )
+    return regressions
+
+
+def print_results(results: Dict[str, Any]):
+    print(
+        f"{results['requests']} requests in {results['seconds']:.2f}s,"
+        f" {results['throughput']:.2f} req/s, statuses {results['statuses']}"
+    )
+    print(f"{'':<32} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    rows = [("all", results["latency_ms"]), *results["endpoints"].items()]
+    for name, latency in rows:
+        print(
+            f"{name:<32} {latency['p50']:>9.1f} {latency['p95']:>9.1f}"
+            f" {latency['p99']:>9.1f}"
+        )
+    for section in ("stages", "llm"):
+        if results.get(section):
+            print(f"{section:<32} {'count':>9} {'mean ms':>9}")
+            for name, timing in results[section].items():
+                print(f"  {name:<30} {timing['count']:>9} {timing['mean_ms']:>9.1f}")
+    if results.get("caches"):
+        print(f"{'caches':<32} {'hits':>9} {'misses':>9} {'hit rate':>9}")
+        for name, counts in results["caches"].items():
+            print(
+                f"  {name:<30} {counts['hits']:>9} {counts['misses']:>9}"
+                f" {counts['hit_rate']:>9.0%}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("log", help="JSONL file of the requests to replay")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rate", type=float, help="requests started per second")
+    parser.add_argument("--repeat", type=int, default=1, help="replays of the log")
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--page-latency", type=float, default=0.1)
+    parser.add_argument(
+        "--caches", nargs="*", choices=CACHES, default=list(CACHES), metavar="CACHE"
+    )
+    parser.add_argument("--output", help="file to save the results to as JSON")
+    parser.add_argument("--baseline", help="results of a previous run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args()
+
+    requests = load_requests(args.log) * args.repeat
+    with StubAdvisoryServer(latency=args.page_latency) as server:
+        # the advice url is built from the configured base url at import time
+        os.environ["SMARTRAVELLER_BASE_URL"] = server.base_url
+        from adviser.advice_levels import AdviceLevelAnswerer
+        from adviser.advise_model import (
+            construct_batch_query2advice_chain,
+            construct_query2advice_chain,
+        )
+        from adviser.destination_resolver import DestinationResolver
+        from adviser.make_app import make_app
+        from adviser.metrics import ChainMetrics
+        from adviser.page_cache import PageCache
+        from adviser.response_cache import ResponseCache
+
+        components = {
+            "page": ("page_cache", PageCache),
+            "resolver": ("resolver", DestinationResolver),
+            "response": ("response_cache", ResponseCache),
+            "levels": ("level_answerer", AdviceLevelAnswerer),
+        }
+        chain_components = {
+            argument: component()
+            for name, (argument, component) in components.items()
+            if name in args.caches
+        }
+        chat_model = stub_chat_model(latency=args.llm_latency)
+        metrics = ChainMetrics(
+            caches={
+                name: chain_components[argument]
+                for name, (argument, _) in components.items()
+                if argument in chain_components
+            }
+        )
+        app = make_app(
+            construct_query2advice_chain(chat_model, **chain_components),
+            batch_chain=construct_batch_query2advice_chain(
+                chat_model, **chain_components
+            ),
+            metrics=metrics,
+        )
+        run = asyncio.run(replay(app, requests, args.concurrency, args.rate))
+
+    results = summarize(run, metrics)
+    results["config"] = {
+        name: value
+        for name, value in vars(args).items()
+        if name not in ("output", "baseline")
+    }
+    print_results(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump(results, output, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as baseline:
+            regressions = compare_results(results, json.load(baseline), args.tolerance)
+        for regression in regressions:
+            print(f"regression: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
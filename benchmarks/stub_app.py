@@ -0,0 +1,36 @@
+"""
+The app of `adviser.app` with the chat model replaced by the fake one of `stubs`, for the
+benchmarks serving it from worker processes (see `bench_workers`). The stub latency is
+read from `STUB_LLM_LATENCY`, Smartraveller from `SMARTRAVELLER_BASE_URL` and the shared
+cache from `SHARED_CACHE_URL`.
+"""
+
+import os
+
+from adviser.advise_model import (
+    construct_batch_query2advice_chain,
+    construct_query2advice_chain,
+)
+from adviser.destination_resolver import DestinationResolver
+from adviser.make_app import make_app
+from adviser.metrics import ChainMetrics
+from adviser.page_cache import PageCache
+from adviser.response_cache import ResponseCache
+from adviser.shared_store import open_shared_store
+from benchmarks.stubs import stub_chat_model
+
+shared_store = open_shared_store()
+page_cache = PageCache(shared=shared_store)
+response_cache = ResponseCache(shared=shared_store)
+chain_components = dict(
+    page_cache=page_cache,
+    resolver=DestinationResolver(),
+    response_cache=response_cache,
+)
+chat_model = stub_chat_model(latency=float(os.getenv("STUB_LLM_LATENCY", "0.5")))
+
+app = make_app(
+    construct_query2advice_chain(chat_model, **chain_components),
+    batch_chain=construct_batch_query2advice_chain(chat_model, **chain_components),
+    metrics=ChainMetrics(caches={"page": page_cache, "response": response_cache}),
+)
@@ -0,0 +1,126 @@
+import sys
+import threading
+import time
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import TYPE_CHECKING, Any, Optional, Type
+
+if TYPE_CHECKING:
+    from adviser.fake_chat_model import FakeChatModel
+
+ADVISORY_PAGE = """<html lang="en">
+<head>
+<title>Indonesia Travel Advice &amp; Safety | Smartraveller</title>
+<meta name="description" content="Australian Government travel advice for Indonesia. Exercise a high degree of caution. Travel advice level YELLOW.">
+</head>
+<body>
+<h2>Latest update</h2>
+<p>The Bali Provincial Government has introduced a new tourist levy of IDR 150,000 per person to foreign tourists entering Bali.</p>
+<p>Download</p>
+<h2>Advice levels</h2>
+<p>Exercise a high degree of caution in Indonesia overall.</p>
+<p>Reconsider your need to travel to Papua.</p>
+<h2>Overview</h2>
+<p>There is an ongoing risk of terrorist attack in Indonesia.</p>
+</body>
+</html>
+"""
+# the destination of the stub page
+ADVISORY_DESTINATION = {"name": "indonesia", "region": "asia"}
+
+
+def stub_chat_model(
+    model_class: Optional[Type["FakeChatModel"]] = None, **kwargs: Any
+) -> "FakeChatModel":
+    """
+    Returns the fake chat model answering every query with the destination of the stub
+    page, unless other destinations are given, with no latency unless given.
+    """
+    # imported once the benchmark has pointed the configuration at the stub server
+    from adviser.fake_chat_model import FakeChatModel
+
+    defaults = {
+        "latency": 0.0,
+        "tokens_per_second": 0.0,
+        "canned_destinations": [ADVISORY_DESTINATION],
+    }
+    return (model_class or FakeChatModel)(**{**defaults, **kwargs})
+
+
+class StubAdvisoryServer:
+    """
+    Local HTTP/1.1 server standing in for Smartraveller, serving one page after a fixed
+    latency. It counts the requests and the TCP connections it accepted, and answers
+    the next `failures` requests with `failure_status`.
+    """
+
+    def __init__(self, html: str = ADVISORY_PAGE, latency: float = 0.0):
+        self.html = html
+        self.latency = latency
+        self.request_count = 0
+        self.connection_count = 0
+        self.failures = 0
+        self.failure_status = 503
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self._server.daemon_threads = True
+        self._server.handle_error = self._handle_error
+        # a short poll interval keeps shutting the server down fast
+        self._thread = threading.Thread(
+            target=self._server.serve_forever,
+            kwargs={"poll_interval": 0.05},
+            daemon=True,
+        )
+
+    @staticmethod
+    def _handle_error(request, client_address):
+        # clients giving up on a slow response, e.g. at a deadline, are expected
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            traceback.print_exc()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/destinations"
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # keeps the connections alive between requests
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with server._lock:
+                    server.connection_count += 1
+
+            def do_GET(self, send_body: bool = True):
+                with server._lock:
+                    server.request_count += 1
+                    failed = server.failures > 0
+                    server.failures -= failed
+                time.sleep(server.latency)
+                body = server.html.encode()
+                self.send_response(server.failure_status if failed else 200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if send_body:
+                    self.wfile.write(body)
+
+            def do_HEAD(self):
+                self.do_GET(send_body=False)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self) -> "StubAdvisoryServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,110 @@
+"""
+pytest-benchmark suite of the query to advice chain end to end, offline: the advice
+pages are served from the recorded pages of `benchmarks/data/pages` and both stages
+are answered by the fake chat model, deterministic and with no latency, so the
+timings are the chain itself (page parsing, prompt building, caches) and comparable
+between runs. It is not collected by `pytest`, run it with:
+
+    pytest benchmarks/test_offline_chain.py
+    pytest benchmarks/test_offline_chain.py --benchmark-autosave
+    pytest benchmarks/test_offline_chain.py --benchmark-compare --benchmark-compare-fail=mean:10%
+"""
+
+import asyncio
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+import adviser.adviser_support_info_retriver as retriever
+from adviser.advise_model import (
+    construct_batch_query2advice_chain,
+    construct_query2advice_chain,
+)
+from adviser.destination_resolver import DestinationResolver
+from adviser.fake_chat_model import FakeChatModel
+from adviser.page_cache import PageCache
+from adviser.page_fetcher import PageFetcher
+from adviser.recorded_pages import RecordedPages
+
+PAGES_DIR = Path(__file__).parent / "data" / "pages"
+QUERY = {"query": "We are taking the kids to Bali in July, what should we know?"}
+# asked for every recorded page in the batch
+BATCH_QUERIES = ["Is {country} safe?", "What should we know before going to {country}?"]
+
+
+@pytest.fixture(autouse=True)
+def recorded_pages(monkeypatch):
+    fetcher = PageFetcher(transport=RecordedPages(str(PAGES_DIR)).transport())
+    monkeypatch.setattr(retriever, "PAGE_FETCHER", fetcher)
+    yield
+    fetcher.close()
+
+
+def fake_model() -> FakeChatModel:
+    return FakeChatModel(latency=0, tokens_per_second=0)
+
+
+def chain(**components):
+    return construct_query2advice_chain(
+        fake_model(), extraction_model=fake_model(), **components
+    )
+
+
+def test_uncached_page(benchmark):
+    # a new page cache every round, the page is fetched and parsed every time
+    def setup():
+        return (chain(page_cache=PageCache()),), {}
+
+    advice = benchmark.pedantic(
+        lambda advice_chain: asyncio.run(advice_chain.ainvoke(QUERY)),
+        setup=setup,
+        rounds=20,
+    )
+    assert '"Exercise a high degree of caution" in Indonesia overall.' in advice
+
+
+def test_cached_page(benchmark):
+    advice_chain = chain(page_cache=PageCache())
+    asyncio.run(advice_chain.ainvoke(QUERY))
+
+    advice = benchmark(lambda: asyncio.run(advice_chain.ainvoke(QUERY)))
+    assert '"Exercise a high degree of caution" in Indonesia overall.' in advice
+
+
+def test_resolved_destination(benchmark):
+    # the resolver saves the extraction call
+    advice_chain = chain(page_cache=PageCache(), resolver=DestinationResolver())
+    asyncio.run(advice_chain.ainvoke(QUERY))
+
+    advice = benchmark(lambda: asyncio.run(advice_chain.ainvoke(QUERY)))
+    assert '"Exercise a high degree of caution" in Indonesia overall.' in advice
+
+
+def test_trip(benchmark):
+    query = {"query": "Paris, then Bangkok and Bali on the way home"}
+    advice_chain = chain(page_cache=PageCache())
+    asyncio.run(advice_chain.ainvoke(query))
+
+    advice = benchmark(lambda: asyncio.run(advice_chain.ainvoke(query)))
+    assert (
+        advice.index("France:") < advice.index("Thailand:") < advice.index("Indonesia:")
+    )
+
+
+def test_batch(benchmark):
+    countries = [url.rsplit("/", 1)[1] for url in RecordedPages(str(PAGES_DIR)).urls()]
+    queries = [
+        {"query": query.format(country=country.title())}
+        for country in countries
+        for query in BATCH_QUERIES
+    ]
+    batch_chain = construct_batch_query2advice_chain(
+        fake_model(), page_cache=PageCache(), extraction_model=fake_model()
+    )
+    asyncio.run(batch_chain.ainvoke(queries))
+
+    answers = benchmark(lambda: asyncio.run(batch_chain.ainvoke(queries)))
+    assert len(answers) == len(queries)
+    assert not [answer for answer in answers if isinstance(answer, Exception)]
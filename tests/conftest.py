@@ -0,0 +1,10 @@
+"""Fixtures shared by the test modules."""
+
+import pytest
+
+from tests.fakes import FakeClock
+
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
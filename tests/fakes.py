@@ -0,0 +1,68 @@
+"""Fakes shared by the test modules, the fixtures using them are in `conftest`."""
+
+from typing import Any, Dict, List, Optional
+
+import httpx
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatResult
+
+from adviser.fake_chat_model import FakeChatModel
+from benchmarks.stubs import ADVISORY_PAGE, StubAdvisoryServer
+
+__all__ = [
+    "ADVISORY_PAGE",
+    "FakeClock",
+    "ProviderRateLimitError",
+    "RateLimitedChatModel",
+    "StubAdvisoryServer",
+]
+
+
+class FakeClock:
+    """Clock of the caches and limiters, at `now` until moved, `step` later every read."""
+
+    def __init__(self, now: float = 0.0, step: float = 0.0):
+        self.now = now
+        self.step = step
+
+    def __call__(self) -> float:
+        self.now += self.step
+        return self.now
+
+
+class ProviderRateLimitError(Exception):
+    """Stands in for `openai.RateLimitError`, a 429 response of the provider."""
+
+    status_code = 429
+
+    def __init__(self, retry_after: str = "2"):
+        super().__init__("Rate limit reached for requests")
+        self.response = httpx.Response(429, headers={"retry-after": retry_after})
+
+
+class RateLimitedChatModel(FakeChatModel):
+    """Chat model failing with a provider 429 above `max_in_flight` calls at once."""
+
+    latency: float = 0.02
+    tokens_per_second: float = 0
+    canned_destinations: Optional[List[Dict[str, str]]] = [
+        {"name": "indonesia", "region": "asia"}
+    ]
+    max_in_flight: int = 2
+    in_flight: int = 0
+    rate_limited: int = 0
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        if self.in_flight >= self.max_in_flight:
+            self.rate_limited += 1
+            raise ProviderRateLimitError()
+        self.in_flight += 1
+        try:
+            return await super()._agenerate(messages, stop, **kwargs)
+        finally:
+            self.in_flight -= 1
@@ -0,0 +1,131 @@
+import asyncio
+from typing import Optional
+
+import pytest
+from langchain_core.language_models import FakeListChatModel
+
+from adviser.admission import (
+    AdmissionQueue,
+    LLMBudget,
+    Overloaded,
+    RateLimiter,
+    provider_retry_after,
+)
+from tests.fakes import FakeClock, ProviderRateLimitError, RateLimitedChatModel
+
+
+def test_rate_limiter_allows_bursts_then_the_rate_per_client(clock: FakeClock):
+    limiter = RateLimiter(per_minute=60, burst=3, clock=clock)
+
+    assert [limiter.acquire("key:a") for _ in range(3)] == [0, 0, 0]
+    assert limiter.acquire("key:a") == pytest.approx(1.0)
+    assert limiter.acquire("key:b") == 0
+    clock.now += 1
+    assert limiter.acquire("key:a") == 0
+    assert limiter.limited == 1
+
+
+def test_rate_limiter_caps_the_cost_at_the_burst_and_forgets_old_clients(
+    clock: FakeClock,
+):
+    limiter = RateLimiter(per_minute=60, burst=3, max_clients=1, clock=clock)
+
+    assert limiter.acquire("key:a", cost=50) == 0
+    assert limiter.acquire("key:a") > 0
+    limiter.acquire("key:b")
+    assert limiter.acquire("key:a") == 0
+
+
+def test_admission_queue_sheds_requests_once_the_queue_is_full():
+    queue = AdmissionQueue(max_concurrency=1, max_queue=1, max_wait=1)
+
+    async def request(seconds: float):
+        async with queue.slot():
+            await asyncio.sleep(seconds)
+        return "served"
+
+    async def burst():
+        first = asyncio.ensure_future(request(0.05))
+        await asyncio.sleep(0)
+        return await asyncio.gather(
+            first, request(0), request(0), return_exceptions=True
+        )
+
+    first, queued, shed = asyncio.run(burst())
+    assert first == queued == "served"
+    assert isinstance(shed, Overloaded) and shed.status_code == 503
+    assert queue.shed == 1
+
+
+def test_admission_queue_sheds_requests_expected_to_wait_too_long(clock: FakeClock):
+    queue = AdmissionQueue(max_concurrency=1, max_queue=10, max_wait=1, clock=clock)
+
+    async def main():
+        async with queue.slot():
+            clock.now += 3
+        async with queue.slot():
+            with pytest.raises(Overloaded) as error:
+                queue.check()
+        return error.value
+
+    error = asyncio.run(main())
+    assert error.retry_after == pytest.approx(3)
+    queue.check()
+
+
+def test_admission_queue_sheds_requests_that_waited_too_long():
+    queue = AdmissionQueue(max_concurrency=1, max_queue=10, max_wait=0.02)
+
+    async def main():
+        async with queue.slot():
+            with pytest.raises(Overloaded):
+                async with queue.slot():
+                    pass
+
+    asyncio.run(main())
+    assert queue.shed == 1
+
+
+@pytest.mark.parametrize("budget, rate_limited", [(None, 4), (LLMBudget(2), 0)])
+def test_llm_budget_keeps_the_calls_within_the_provider_rate_limit(
+    budget: Optional[LLMBudget], rate_limited: int
+):
+    chat_model = RateLimitedChatModel()
+    model = budget.bind(chat_model) if budget else chat_model
+
+    results = asyncio.run(model.abatch(["Is Bali safe?"] * 6, return_exceptions=True))
+
+    assert chat_model.rate_limited == rate_limited
+    assert sum(isinstance(result, ProviderRateLimitError) for result in results) == (
+        rate_limited
+    )
+    if budget:
+        assert budget.waited == 4 and budget.in_flight == 0
+
+
+def test_llm_budget_streams_within_its_slot():
+    budget = LLMBudget(1)
+    model = budget.bind(FakeListChatModel(responses=["Good"]))
+
+    async def stream():
+        return [chunk.content async for chunk in model.astream("Is Bali safe?")]
+
+    assert model.invoke("Is Bali safe?").content == "Good"
+    assert "".join(asyncio.run(stream())) == "Good"
+    assert budget.in_flight == 0
+
+
+def test_provider_retry_after():
+    assert provider_retry_after(ProviderRateLimitError("7")) == 7
+    assert provider_retry_after(ValueError("not a rate limit")) is None
+
+
+def test_rate_limiter_only_trusts_the_known_api_keys():
+    limiter = RateLimiter(api_keys={"known"})
+    assert limiter.client("known", "10.0.0.1") == "key:known"
+    assert limiter.client("made-up", "10.0.0.1") is None
+    assert limiter.client(None, "10.0.0.1") is None
+
+    by_address = RateLimiter(api_keys={"known"}, by_address=True)
+    assert by_address.client("made-up", "10.0.0.1") == "address:10.0.0.1"
+    assert by_address.client("known", "10.0.0.1") == "key:known"
@@ -0,0 +1,177 @@
+import asyncio
+from unittest.mock import patch, AsyncMock
+
+import pytest
+from langchain_core.documents.base import Document
+from langchain_core.language_models import FakeListChatModel
+
+from adviser.advice_levels import (
+    ADVICE_LEVEL_TABLE_KEY,
+    AdviceLevelAnswerer,
+    AdviceLevelTable,
+    level_query_place,
+    parse_advice_levels,
+)
+from adviser.advise_model import (
+    construct_doc2advice_chain,
+    construct_query2advice_chain,
+)
+from adviser.destination_resolver import DestinationResolver
+
+ADVICE_LEVELS = (
+    'Advice levels "Exercise a high degree of caution" in Indonesia overall. '
+    "Use common sense and look out for suspicious behaviour. "
+    "Reconsider your need to travel to the provinces of Central Papua, Highland Papua, "
+    "Papua, South Papua and West Papua. "
+    "Reconsider your need to travel due to the risk of violent civil unrest. "
+    "Do not travel to areas near the border. Do not travel to West Papua. "
+)
+
+
+@pytest.fixture
+def doc() -> Document:
+    return Document(
+        page_content=(
+            "Latest update Updated 12 March 2024: a new tourist levy applies in Bali. "
+            f"Download PDF {ADVICE_LEVELS}Overview There is an ongoing risk."
+        ),
+        metadata={
+            "title": "Indonesia Travel Advice & Safety | Smartraveller",
+            "description": "Exercise a high degree of caution. Travel advice level YELLOW.",
+        },
+    )
+
+
+def test_parse_advice_levels():
+    table = parse_advice_levels(ADVICE_LEVELS, latest_update="Updated 12 March 2024")
+    assert table == AdviceLevelTable(
+        overall="Exercise a high degree of caution",
+        regions={
+            "Central Papua": "Reconsider your need to travel",
+            "Highland Papua": "Reconsider your need to travel",
+            "Papua": "Reconsider your need to travel",
+            "South Papua": "Reconsider your need to travel",
+            "West Papua": "Do not travel",
+        },
+        last_updated="12 March 2024",
+    )
+
+
+def test_parse_advice_levels_falls_back_to_the_description():
+    table = parse_advice_levels("", "Australian Government advice. Do not travel.")
+    assert table == AdviceLevelTable(overall="Do not travel")
+    assert parse_advice_levels("page not found").overall is None
+
+
+@pytest.mark.parametrize(
+    "query, place",
+    [
+        ("Is Bali safe?", "bali"),
+        (
+            "I would like to travel to Papua in Indonesia. Is it safe?",
+            "papua in indonesia",
+        ),
+        ("Is it safe to travel to Indonesia right now?", "indonesia"),
+        ("How safe is Laos?", "laos"),
+        ("What is the advice level for Fiji?", "fiji"),
+        ("Is it safe?", ""),
+        ("Is Bali safe for families?", None),
+        ("Is Japan safe after the earthquake?", None),
+        ("What vaccinations do I need for Bali?", None),
+        ("France travel advice", None),
+        # the place must be names only, not a question about the place
+        ("Can I travel to Japan on a student visa?", None),
+        ("Is street food in Thailand safe", None),
+        ("Are the beaches in Bali safe", None),
+        ("Should I go to Fiji in cyclone season?", None),
+        ("Is it safe to travel to Bali alone", None),
+    ],
+)
+def test_level_query_place(query: str, place):
+    assert level_query_place(query) == place
+
+
+def test_level_query_place_accepts_the_sub_regions_of_the_page():
+    query = "Is it safe to go to Highland Papua?"
+    assert level_query_place(query, ["Highland Papua"]) == "highland papua"
+
+
+def test_answerer_answers_level_queries_with_the_named_sub_regions(doc: Document):
+    answerer = AdviceLevelAnswerer()
+
+    answer = answerer.answer(doc, {"query": "Is it safe to go to West Papua?"})
+
+    assert answer == (
+        "Travel Safety Level:\n"
+        '    "Exercise a high degree of caution" in Indonesia overall.\n'
+        '    "Do not travel" in West Papua.\n'
+        "Last updated: 12 March 2024."
+    )
+    assert answerer.answer(doc, "Is Bali safe?").count("\n") == 2
+    assert (answerer.hits, answerer.misses) == (2, 0)
+    assert doc.metadata[ADVICE_LEVEL_TABLE_KEY]["overall"] == (
+        "Exercise a high degree of caution"
+    )
+
+
+def test_answerer_leaves_open_questions_and_pages_without_levels(doc: Document):
+    answerer = AdviceLevelAnswerer()
+    not_found = Document(page_content="Page not found", metadata={})
+
+    assert answerer.answer(doc, "Do I need a visa for Bali?") is None
+    assert answerer.answer(doc, "Are the beaches in Bali safe?") is None
+    assert answerer.answer(not_found, "Is Bali safe?") is None
+    assert (answerer.hits, answerer.misses) == (0, 3)
+
+
+def test_doc2advice_chain_answers_level_queries_without_the_chat_model(doc: Document):
+    chat_model = FakeListChatModel(responses=["Bring sunscreen", "Something else"])
+    chain = construct_doc2advice_chain(chat_model, level_answerer=AdviceLevelAnswerer())
+
+    level = chain.invoke({"doc": doc, "query": {"query": "Is Bali safe?"}})
+    chunks = list(chain.stream({"doc": doc, "query": "Is Papua safe?"}))
+    advice = chain.invoke({"doc": doc, "query": "What should I pack for Bali?"})
+
+    assert level.startswith("Travel Safety Level:")
+    assert "".join(chunks).endswith(
+        '"Reconsider your need to travel" in Papua.\nLast updated: 12 March 2024.'
+    )
+    assert advice == "Bring sunscreen"
+    assert chat_model.i == 1
+
+
+@patch("adviser.adviser_support_info_retriver.aload_from_url", new_callable=AsyncMock)
+def test_query2advice_chain_answers_the_levels_of_every_destination_of_a_trip(
+    mock_aload_from_url,
+):
+    def load(url):
+        name = url.rsplit("/", 1)[-1].capitalize()
+        return [
+            Document(
+                page_content=f"<p>Advice levels Do not travel to {name} overall.</p>",
+                metadata={"source": url, "title": f"{name} Travel Advice & Safety"},
+            )
+        ]
+
+    mock_aload_from_url.side_effect = load
+    chat_model = FakeListChatModel(responses=["Good to go"])
+    extraction_model = FakeListChatModel(
+        responses=[
+            '{"destinations": [{"name": "laos", "region": "asia"},'
+            ' {"name": "fiji", "region": "pacific"}]}'
+        ]
+    )
+    chain = construct_query2advice_chain(
+        chat_model,
+        resolver=DestinationResolver(),
+        level_answerer=AdviceLevelAnswerer(),
+        extraction_model=extraction_model,
+    )
+
+    advice = asyncio.run(chain.ainvoke({"query": "Is Laos and Fiji safe?"}))
+
+    assert advice == (
+        'Laos:\nTravel Safety Level:\n    "Do not travel" in Laos overall.\n\n'
+        'Fiji:\nTravel Safety Level:\n    "Do not travel" in Fiji overall.'
+    )
+    assert chat_model.i == 0
@@ -1,15 +1,34 @@
-from unittest.mock import patch
+import asyncio
+import cProfile
+import pstats
+from unittest.mock import patch, AsyncMock
 import pytest
 from typing import Dict
 from langchain_core.documents.base import Document
+from langchain_core.language_models import FakeListChatModel
 
 from adviser.advise_model import (
+    ADVICE_PROMPT_PREFIX,
+    PROMPT_FIELDS_KEY,
+    SECTION_SPANS_KEY,
     TravelAdviceInput,
+    define_information_input_variables,
     get_required_prompt_field,
+    get_prompt_fields,
     get_required_prompt_fields,
     create_prompt_template_for_travel_advice,
     create_prompt_for_travel_advice_response,
+    construct_doc2advice_chain,
+    construct_batch_query2advice_chain,
+    construct_query2advice_chain,
+    destination_name,
 )
+from adviser.destination_resolver import DestinationResolver
+from adviser.fake_chat_model import FakeChatModel
+from adviser.prompt_budget import TOKEN_COUNTER
+from adviser.request_log import RequestRecord
+from adviser.response_cache import ResponseCache
+from adviser.utils import extract_content_from_text
 
 
 # Mock data for testing
@@ -88,6 +107,53 @@ def test_get_required_prompt_fields(
     assert "Some content here..." in result["test_message"]
 
 
+@pytest.mark.parametrize(
+    "page_content",
+    [
+        "Latest update: Exercise a high degree of caution. Download PDF Advice levels: Level 2 Overview",
+        "Advice levels: Level 4 Do not travel. Latest update: " + "x" * 2000,
+        "Overview Advice levels only, no other section " * 100,
+        "",
+    ],
+)
+def test_get_required_prompt_fields_match_full_page_extraction(page_content):
+    doc = Document(page_content=page_content, metadata={"source": "url"})
+    expected = {
+        name: extract_content_from_text(
+            page_content,
+            field.html_section_start,
+            field.html_section_end,
+            field.html_section_length,
+        )
+        for name, field in define_information_input_variables().items()
+        if field.html_section == "page_content"
+    }
+
+    for _ in range(2):
+        fields = get_required_prompt_fields(doc, "query")
+        assert {name: fields[name] for name in expected} == expected
+
+
+def test_get_required_prompt_field_caches_section_spans(sample_doc):
+    input_var = TravelAdviceInput(
+        name="test_message",
+        html_section="page_content",
+        html_section_start="Test Message",
+        html_section_end="End Test",
+        html_section_length=50,
+    )
+    first = get_required_prompt_field(input_var, sample_doc, "test query")
+
+    with patch("adviser.advise_model.find_section_span") as mock_find:
+        second = get_required_prompt_field(input_var, sample_doc, "test query")
+
+    assert first == second
+    mock_find.assert_not_called()
+    assert sample_doc.metadata[SECTION_SPANS_KEY] == {
+        "Test Message|End Test|50": [0, 35]
+    }
+
+
 def test_create_prompt_template_for_travel_advice():
     prompt_template = create_prompt_template_for_travel_advice()
     assert prompt_template is not None
@@ -98,3 +164,200 @@ def test_create_prompt_for_travel_advice_response(sample_doc):
     fields_dict = {"doc": sample_doc, "query": "Good to go?"}
     result = create_prompt_for_travel_advice_response(fields_dict)
     assert result is not None
+
+
+def test_prompt_for_travel_advice_response_starts_with_static_prefix(sample_doc):
+    fields_dict = {"doc": sample_doc, "query": "Good to go?"}
+    result = create_prompt_for_travel_advice_response(fields_dict)
+    expected = create_prompt_template_for_travel_advice().format(
+        **get_prompt_fields(sample_doc, "Good to go?")
+    )
+    assert result == expected
+    assert result.startswith(ADVICE_PROMPT_PREFIX)
+    assert "{" not in ADVICE_PROMPT_PREFIX
+
+
+def test_prompt_fields_are_compacted_and_trimmed_to_their_token_budget():
+    latest_update = " ".join(
+        f"Update number {i} about the weather." for i in range(100)
+    )
+    doc = Document(
+        page_content=f"Latest update\n  {latest_update} Download Advice levels Do not"
+        " travel to Atlantis. Overview",
+        metadata={"title": "  Atlantis  Travel Advice ", "description": ""},
+    )
+    budget = define_information_input_variables()["latest_update"].max_tokens
+
+    fields = get_prompt_fields(doc, {"query": "Is   Atlantis safe?"})
+
+    assert fields["title"] == "Atlantis Travel Advice"
+    assert fields["query"] == "Is Atlantis safe?"
+    assert fields["advice_levels"] == "Do not travel to Atlantis."
+    assert fields["latest_update"].startswith("Update number 0 about the weather.")
+    assert fields["latest_update"].endswith("about the weather.")
+    assert (
+        TOKEN_COUNTER(fields["latest_update"]) <= budget < TOKEN_COUNTER(latest_update)
+    )
+    assert f"latest_update|{budget}" in doc.metadata[PROMPT_FIELDS_KEY]
+    with patch("adviser.advise_model.trim_to_token_budget") as mock_trim:
+        assert get_prompt_fields(doc, "Is Atlantis safe?") == fields
+    mock_trim.assert_not_called()
+
+
+def test_prompt_for_travel_advice_response_is_compact_and_records_its_tokens(
+    sample_doc,
+):
+    with RequestRecord("/get_travel_advice", {}) as record:
+        prompt = create_prompt_for_travel_advice_response(
+            {"doc": sample_doc, "query": "Good to go?"}
+        )
+    assert not any(line.startswith(" " * 8) for line in prompt.splitlines())
+    assert record.prompt_tokens == [TOKEN_COUNTER(prompt)]
+
+
+def test_prompt_tokens_are_only_counted_for_the_request_log(sample_doc):
+    with patch("adviser.advise_model.TOKEN_COUNTER") as mock_counter:
+        create_prompt_for_travel_advice_response(
+            {"doc": sample_doc, "query": "Good to go?"}
+        )
+    mock_counter.assert_not_called()
+
+
+def test_prompt_for_travel_advice_response_creates_no_objects_per_request(sample_doc):
+    fields_dict = {"doc": sample_doc, "query": "Good to go?"}
+    # the first request finds the page sections and builds the field definitions
+    create_prompt_for_travel_advice_response(fields_dict)
+
+    profiler = cProfile.Profile()
+    profiler.runcall(create_prompt_for_travel_advice_response, fields_dict)
+    calls = pstats.Stats(profiler).stats
+
+    constructors = [
+        (path, name) for path, _, name in calls if name in ("__init__", "__new__")
+    ]
+    assert constructors == []
+
+
+def test_doc2advice_chain_serves_repeated_questions_from_cache(sample_doc):
+    chat_model = FakeListChatModel(responses=["Good to go", "Something else"])
+    chain = construct_doc2advice_chain(chat_model, ResponseCache())
+    first = chain.invoke({"doc": sample_doc, "query": "Is it safe to go to Bali?"})
+    second = chain.invoke({"doc": sample_doc, "query": "is bali safe"})
+    assert first == second == "Good to go"
+    assert chat_model.i == 1
+
+
+@patch("adviser.adviser_support_info_retriver.aload_from_url", new_callable=AsyncMock)
+def test_batch_query2advice_chain_retrieves_each_page_once(mock_aload_from_url):
+    def load(url):
+        if url.endswith("/pacific/fiji"):
+            raise Exception("Error retrieving web content")
+        return [Document(page_content="<p>advice</p>", metadata={"source": url})]
+
+    mock_aload_from_url.side_effect = load
+    chat_model = FakeListChatModel(responses=["Good to go"])
+    chain = construct_batch_query2advice_chain(
+        chat_model, resolver=DestinationResolver()
+    )
+    queries = ["Is Bali safe?", "Is Fiji safe?", "Is Jakarta safe?"]
+    results = asyncio.run(
+        chain.ainvoke(
+            [{"query": query} for query in queries], config={"max_concurrency": 2}
+        )
+    )
+    assert results[0] == results[2] == "Good to go"
+    assert isinstance(results[1], Exception)
+    assert sorted(call.args[0] for call in mock_aload_from_url.call_args_list) == [
+        "https://www.smartraveller.gov.au/destinations/asia/indonesia",
+        "https://www.smartraveller.gov.au/destinations/pacific/fiji",
+    ]
+
+
+@patch("adviser.adviser_support_info_retriver.aload_from_url", new_callable=AsyncMock)
+def test_query2advice_chain_answers_every_destination_of_a_trip(mock_aload_from_url):
+    def load(url):
+        name = url.rsplit("/", 1)[-1].capitalize()
+        return [
+            Document(
+                page_content="<p>advice</p>",
+                metadata={"source": url, "title": f"{name} Travel Advice & Safety"},
+            )
+        ]
+
+    mock_aload_from_url.side_effect = load
+    chat_model = FakeListChatModel(responses=["Good to go"])
+    extraction_model = FakeListChatModel(
+        responses=[
+            '{"destinations": [{"name": "thailand", "region": "asia"},'
+            ' {"name": "cambodia", "region": "asia"}, {"name": "laos", "region": "asia"}]}'
+        ]
+    )
+    chain = construct_query2advice_chain(
+        chat_model, resolver=DestinationResolver(), extraction_model=extraction_model
+    )
+    advice = asyncio.run(
+        chain.ainvoke({"query": "Thailand, then Cambodia and Laos. Is it safe?"})
+    )
+    assert advice == (
+        "Thailand:\nGood to go\n\nCambodia:\nGood to go\n\nLaos:\nGood to go"
+    )
+    assert mock_aload_from_url.call_count == 3
+
+
+@patch("adviser.adviser_support_info_retriver.aload_from_url", new_callable=AsyncMock)
+def test_query2advice_chain_extracts_destinations_with_the_extraction_model(
+    mock_aload_from_url,
+):
+    mock_aload_from_url.side_effect = lambda url: [
+        Document(page_content="<p>advice</p>", metadata={"source": url})
+    ]
+    chat_model = FakeChatModel(
+        latency=0, tokens_per_second=0, canned_advice="Good to go"
+    )
+    extraction_model = FakeChatModel(
+        latency=0,
+        tokens_per_second=0,
+        canned_destinations=[{"name": "indonesia", "region": "asia"}],
+    )
+    chain = construct_query2advice_chain(chat_model, extraction_model=extraction_model)
+
+    advice = asyncio.run(chain.ainvoke({"query": "Is Atlantis safe?"}))
+
+    assert advice == "Good to go"
+    assert (extraction_model.calls, chat_model.calls) == (1, 1)
+    mock_aload_from_url.assert_called_once_with(
+        "https://www.smartraveller.gov.au/destinations/asia/indonesia"
+    )
+
+
+@patch("adviser.adviser_support_info_retriver.aload_from_url", new_callable=AsyncMock)
+def test_batch_query2advice_chain_answers_trips(mock_aload_from_url):
+    mock_aload_from_url.side_effect = lambda url: [
+        Document(page_content="<p>advice</p>", metadata={"source": url})
+    ]
+    chat_model = FakeListChatModel(responses=["Good to go"])
+    # the resolver answers the single destination, the extraction model the trip
+    extraction_model = FakeListChatModel(
+        responses=[
+            '{"destinations": [{"name": "indonesia", "region": "asia"},'
+            ' {"name": "fiji", "region": "pacific"}]}'
+        ]
+    )
+    chain = construct_batch_query2advice_chain(
+        chat_model, resolver=DestinationResolver(), extraction_model=extraction_model
+    )
+    queries = ["Is Bali safe?", "Bali then Fiji"]
+    results = asyncio.run(chain.ainvoke([{"query": query} for query in queries]))
+    assert results == ["Good to go", "indonesia:\nGood to go\n\nfiji:\nGood to go"]
+    assert mock_aload_from_url.call_count == 2
+
+
+@pytest.mark.parametrize(
+    "metadata, expected",
+    [
+        ({"title": "Indonesia Travel Advice & Safety | Smartraveller"}, "Indonesia"),
+        ({"source": "https://www.smartraveller.gov.au/destinations/asia/laos"}, "laos"),
+    ],
+)
+def test_destination_name(metadata: dict, expected: str):
+    assert destination_name(Document(page_content="", metadata=metadata)) == expected
@@ -0,0 +1,142 @@
+import asyncio
+import time
+from unittest.mock import patch, AsyncMock
+
+import pytest
+from langchain_core.documents.base import Document
+
+from adviser.advisory_crawler import (
+    destination_urls,
+    refresh_store,
+    run_periodic_refresh,
+)
+from adviser.advisory_store import AdvisoryStore
+from adviser.page_cache import CachedPage
+from adviser.shared_store import SQLiteSharedStore
+
+
+@pytest.fixture
+def store(tmp_path) -> AdvisoryStore:
+    store = AdvisoryStore(str(tmp_path / "advisories.sqlite3"))
+    yield store
+    store.close()
+
+
+def _page(url: str, stale=None) -> CachedPage:
+    return CachedPage(document=Document(page_content=url, metadata={"title": url}))
+
+
+def test_destination_urls():
+    urls = destination_urls()
+    assert "https://www.smartraveller.gov.au/destinations/asia/indonesia" in urls
+    assert len(urls) == len(set(urls))
+
+
+@patch("adviser.advisory_crawler.aload_page", new_callable=AsyncMock)
+def test_refresh_store_fetches_only_stale_pages(
+    mock_aload_page: AsyncMock, store: AdvisoryStore
+):
+    mock_aload_page.side_effect = _page
+    store.put("http://fresh.com", _page("http://fresh.com"))
+    store.put("http://old.com", _page("http://old.com"), fetched_at=time.time() - 100)
+    urls = ["http://fresh.com", "http://old.com", "http://new.com"]
+    counts = asyncio.run(refresh_store(store, urls, max_age=50))
+    assert counts == {"refreshed": 2, "missing": 0, "failed": 0}
+    assert sorted(call.args[0] for call in mock_aload_page.call_args_list) == [
+        "http://new.com",
+        "http://old.com",
+    ]
+    # the stored page is handed over for conditional revalidation
+    revalidated = {
+        call.args[0]: call.args[1] for call in mock_aload_page.call_args_list
+    }
+    assert revalidated["http://old.com"] is not None
+    assert revalidated["http://new.com"] is None
+    assert len(store) == 3
+
+
+@patch("adviser.advisory_crawler.aload_page", new_callable=AsyncMock)
+def test_refresh_store_keeps_going_after_failures(
+    mock_aload_page: AsyncMock, store: AdvisoryStore
+):
+    def load(url, stale):
+        if url == "http://broken.com":
+            raise Exception("Error retrieving web content")
+        return _page(url)
+
+    mock_aload_page.side_effect = load
+    counts = asyncio.run(
+        refresh_store(store, ["http://broken.com", "http://ok.com"], max_age=50)
+    )
+    assert counts == {"refreshed": 1, "missing": 0, "failed": 1}
+    assert store.get("http://ok.com") is not None
+
+
+@patch("adviser.advisory_crawler.aload_page", new_callable=AsyncMock)
+def test_refresh_store_refreshes_stored_urls_and_drops_missing_pages(
+    mock_aload_page: AsyncMock, store: AdvisoryStore
+):
+    def load(url, stale):
+        page = _page(url)
+        page.status_code = 404 if url == "http://gone.com" else 200
+        return page
+
+    mock_aload_page.side_effect = load
+    for url in ["http://resolved.com", "http://gone.com"]:
+        store.put(url, _page(url), fetched_at=time.time() - 100)
+
+    counts = asyncio.run(refresh_store(store, ["http://listed.com"], max_age=50))
+
+    assert counts == {"refreshed": 2, "missing": 1, "failed": 0}
+    assert store.get("http://resolved.com") is not None
+    assert store.get("http://gone.com") is None
+
+
+@patch("adviser.advisory_crawler.refresh_store", new_callable=AsyncMock)
+def test_periodic_refresh_runs_in_one_worker_per_interval(
+    mock_refresh_store: AsyncMock, store: AdvisoryStore, tmp_path
+):
+    lock = SQLiteSharedStore(str(tmp_path / "cache.sqlite3"))
+
+    async def run_workers():
+        workers = [
+            asyncio.ensure_future(run_periodic_refresh(store, interval=60.0, lock=lock))
+            for _ in range(3)
+        ]
+        await asyncio.sleep(0.1)
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    asyncio.run(run_workers())
+    assert mock_refresh_store.await_count == 1
+
+
+@patch("adviser.advisory_crawler.refresh_store", new_callable=AsyncMock)
+def test_periodic_refresh_without_a_shared_store_runs_in_one_worker(
+    mock_refresh_store: AsyncMock, tmp_path
+):
+    # the workers of the default configuration, each with its own store connection
+    path = str(tmp_path / "advisories.sqlite3")
+    stores = [AdvisoryStore(path) for _ in range(3)]
+
+    async def run_workers(stores):
+        workers = [
+            asyncio.ensure_future(run_periodic_refresh(store, interval=0.05))
+            for store in stores
+        ]
+        await asyncio.sleep(0.12)
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    asyncio.run(run_workers(stores))
+    refreshed = {call.args[0] for call in mock_refresh_store.await_args_list}
+    assert len(refreshed) == 1 and mock_refresh_store.await_count >= 2
+
+    # the lock is released with its worker, another one takes over
+    mock_refresh_store.reset_mock()
+    asyncio.run(run_workers(stores[1:]))
+    assert mock_refresh_store.await_count >= 1
+    for store in stores:
+        store.close()
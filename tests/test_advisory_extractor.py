@@ -0,0 +1,109 @@
+from unittest.mock import patch
+
+import pytest
+
+from adviser.advise_model import get_required_prompt_fields
+from adviser.adviser_support_info_retriver import (
+    parse_html_document,
+    transform_html_content,
+)
+from adviser.advisory_extractor import _AdvisoryContentParser, extract_advisory_document
+
+ADVICE_PAGE = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<title>Indonesia Travel Advice &amp; Safety | Smartraveller</title>
+<meta name="description" content="Exercise a high degree of caution.">
+<style>.latest { color: red }</style>
+<script>var settings = {"label": "Latest update"};</script>
+</head>
+<body>
+<nav><a href="/overview">Overview</a><a href="/download">Download</a></nav>
+<main>
+<h1>Indonesia</h1>
+<h2><span>Latest</span> update</h2>
+<p>The Bali Provincial Government has introduced a
+   new tourist levy.</p>
+<p><a href="/indonesia.pdf">Download PDF</a></p>
+<h2>Advice levels</h2>
+<div><strong>Exercise a high degree of caution</strong> in Indonesia overall.</div>
+<div><strong>Reconsider your need to travel</strong> to Papua.</div>
+<h2>Overview</h2>
+<p>There is an ongoing risk of terrorist attack in Indonesia.</p>
+<h2>Health</h2>
+<p>Rabies is present in Bali.</p>
+</main>
+<footer>Footer text</footer>
+</body>
+</html>
+"""
+
+
+def test_extract_advisory_document_keeps_the_page_metadata():
+    document = extract_advisory_document(ADVICE_PAGE, "http://test.com")
+    assert (
+        document.metadata
+        == parse_html_document(ADVICE_PAGE, "http://test.com").metadata
+    )
+
+
+def test_extract_advisory_document_matches_the_html2text_fields():
+    document = extract_advisory_document(ADVICE_PAGE, "http://test.com")
+    html2text_document = transform_html_content(
+        [parse_html_document(ADVICE_PAGE, "http://test.com")]
+    )
+    assert get_required_prompt_fields(document, "query") == get_required_prompt_fields(
+        html2text_document, "query"
+    )
+
+
+def test_extract_advisory_document_keeps_the_advisory_sections_only():
+    document = extract_advisory_document(ADVICE_PAGE, "http://test.com")
+    assert document.page_content.startswith(
+        "Latest update The Bali Provincial Government has introduced a new tourist levy."
+        " Download PDF Advice levels Exercise a high degree of caution in Indonesia"
+        " overall. Reconsider your need to travel to Papua. Overview"
+    )
+    for skipped in [
+        "settings",
+        "color",
+        "/overview",
+        "Footer text",
+        "Indonesia Travel",
+    ]:
+        assert skipped not in document.page_content
+
+
+def test_extract_advisory_document_stops_once_the_sections_are_complete():
+    page = ADVICE_PAGE.replace("</main>", "<p>Local laws</p>" * 1000 + "</main>")
+    with patch("adviser.advisory_extractor.CHUNK_SIZE", 256), patch.object(
+        _AdvisoryContentParser, "feed", autospec=True, side_effect=_feed
+    ) as feed:
+        document = extract_advisory_document(page, "http://test.com")
+    assert feed.call_count < len(page) / 256 / 10
+    assert "Local laws" not in document.page_content
+
+
+def _feed(parser, data):
+    return super(_AdvisoryContentParser, parser).feed(data)
+
+
+@pytest.mark.parametrize(
+    "html, expected",
+    [
+        (
+            "<html><head><title>Page not found</title></head>"
+            "<body><p>Sorry, the page does not exist.</p></body></html>",
+            "Sorry, the page does not exist.",
+        ),
+        (
+            "<html><body><h2>Latest update</h2><p>No advice levels yet.</p></body></html>",
+            "Latest update No advice levels yet.",
+        ),
+    ],
+)
+def test_extract_advisory_document_keeps_pages_without_sections(
+    html: str, expected: str
+):
+    document = extract_advisory_document(html, "http://test.com")
+    assert document.page_content == expected
@@ -0,0 +1,116 @@
+import asyncio
+import time
+from unittest.mock import patch, Mock, AsyncMock
+
+import pytest
+from langchain_core.documents.base import Document
+
+from adviser.adviser_support_info_retriver import construct_url2doc_chain
+from adviser.advisory_store import AdvisoryStore
+from adviser.page_cache import CachedPage
+
+
+@pytest.fixture
+def store(tmp_path) -> AdvisoryStore:
+    store = AdvisoryStore(str(tmp_path / "advisories.sqlite3"))
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def page() -> CachedPage:
+    return CachedPage(
+        document=Document(
+            metadata={"title": "advice for test", "description": "It is safe to test"},
+            page_content="Latest update: all good. Download Advice levels: normal Overview",
+        ),
+        etag='"v1"',
+    )
+
+
+def test_store_round_trip(store: AdvisoryStore, page: CachedPage):
+    store.put("http://test.com", page)
+    stored = store.get("http://test.com")
+    assert stored.document == page.document
+    assert stored.etag == '"v1"'
+    assert store.get("http://other.com") is None
+
+
+def test_store_extracts_advisory_fields(store: AdvisoryStore, page: CachedPage):
+    store.put("http://test.com", page, fetched_at=10.0)
+    fields = store.get_fields("http://test.com")
+    assert fields == {
+        "title": "advice for test",
+        "description": "It is safe to test",
+        "latest_update": "Latest update: all good. ",
+        "advice_levels": "Advice levels: normal ",
+        "fetched_at": 10.0,
+    }
+
+
+def test_store_survives_reopening(tmp_path, page: CachedPage):
+    path = str(tmp_path / "advisories.sqlite3")
+    store = AdvisoryStore(path)
+    store.put("http://test.com", page)
+    store.close()
+    reopened = AdvisoryStore(path)
+    assert len(reopened) == 1
+    assert reopened.get("http://test.com").document == page.document
+    reopened.close()
+
+
+def test_store_stale_urls(store: AdvisoryStore, page: CachedPage):
+    store.put("http://fresh.com", page)
+    store.put("http://old.com", page, fetched_at=time.time() - 100)
+    stale = store.stale_urls(
+        ["http://fresh.com", "http://old.com", "http://new.com"], 50
+    )
+    assert stale == ["http://old.com", "http://new.com"]
+    # the stored urls are checked too, e.g. destinations resolved on demand
+    assert store.stale_urls([], 50) == ["http://old.com"]
+
+
+@pytest.mark.parametrize("status_code", [404, 410])
+@patch("adviser.advisory_store.aload_page", new_callable=AsyncMock)
+@patch("adviser.advisory_store.load_page")
+def test_store_does_not_keep_missing_pages(
+    mock_load_page: Mock,
+    mock_aload_page: AsyncMock,
+    store: AdvisoryStore,
+    page: CachedPage,
+    status_code: int,
+):
+    page.status_code = status_code
+    mock_load_page.return_value = mock_aload_page.return_value = page
+    assert store.load_page("http://test.com/asia/bali") is page
+    assert asyncio.run(store.aload_page("http://test.com/asia/bali")) is page
+    assert store.get("http://test.com/asia/bali") is None
+    assert len(store) == 0
+
+
+@patch("adviser.advisory_store.load_page")
+def test_store_load_page_fetches_only_missing_pages(
+    mock_load_page: Mock, store: AdvisoryStore, page: CachedPage
+):
+    mock_load_page.return_value = page
+    first = store.load_page("http://test.com")
+    second = store.load_page("http://test.com")
+    assert mock_load_page.call_count == 1
+    assert first.document == second.document
+
+
+@patch("adviser.advisory_store.aload_page", new_callable=AsyncMock)
+def test_store_aload_page_serves_stored_pages(
+    mock_aload_page: AsyncMock, store: AdvisoryStore, page: CachedPage
+):
+    store.put("http://test.com", page)
+    result = asyncio.run(store.aload_page("http://test.com"))
+    assert result.document == page.document
+    mock_aload_page.assert_not_called()
+
+
+def test_url2doc_chain_reads_the_store(store: AdvisoryStore, page: CachedPage):
+    store.put("http://test.com", page)
+    chain = construct_url2doc_chain(store=store)
+    assert chain.invoke("http://test.com") == page.document
+    assert asyncio.run(chain.ainvoke("http://test.com")) == page.document
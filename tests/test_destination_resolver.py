@@ -0,0 +1,90 @@
+import pytest
+
+from adviser.adviser_support_info_retriver import Country
+from adviser.destination_resolver import DestinationResolver
+
+
+@pytest.fixture(scope="module")
+def resolver() -> DestinationResolver:
+    return DestinationResolver()
+
+
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        (
+            "I would like to travel to Indonesia. Is it safe?",
+            Country(name="indonesia", region="asia"),
+        ),
+        ("is bali safe", Country(name="indonesia", region="asia")),
+        (
+            "I would like to travel to Papua in Indonesia. Is it safe?",
+            Country(name="indonesia", region="asia"),
+        ),
+        (
+            "Heading to Port Moresby in Papua New Guinea",
+            Country(name="papua-new-guinea", region="pacific"),
+        ),
+        ("going to the USA", Country(name="united-states-america", region="americas")),
+        (
+            "People's Republic of China travel advice",
+            Country(name="china", region="asia"),
+        ),
+        (
+            "visiting Tahiti next month",
+            Country(name="french-polynesia", region="pacific"),
+        ),
+    ],
+)
+def test_resolver_resolves_destination(
+    resolver: DestinationResolver, query: str, expected: Country
+):
+    assert resolver.resolve(query) == expected
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "Is it safe to travel there?",
+        "Is Georgia safe for tourists?",
+        "Trip to the Congo",
+        "Flying from Japan to Thailand",
+    ],
+)
+def test_resolver_leaves_unknown_or_ambiguous_queries(
+    resolver: DestinationResolver, query: str
+):
+    assert resolver.resolve(query) is None
+
+
+def test_resolver_counts_hits_and_misses():
+    resolver = DestinationResolver()
+    resolver.resolve("is bali safe")
+    resolver.resolve("is it safe")
+    assert (resolver.hits, resolver.misses) == (1, 1)
+
+
+def test_resolver_resolves_the_names_of_a_single_destination(
+    resolver: DestinationResolver,
+):
+    assert resolver.resolve_trip("Bali, then Jakarta") == [
+        Country(name="indonesia", region="asia")
+    ]
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "Is it safe to travel there?",
+        "Thailand and then Georgia",
+        # several destinations are left to the chat model, not every one is a leg
+        "I'm going to Thailand then Cambodia and Laos",
+        "I am French, can I travel to Egypt?",
+        "As an Indonesian, is it safe to visit Japan?",
+        "I live in France and want to go to Spain",
+    ],
+)
+def test_resolver_leaves_trips_with_unknown_or_ambiguous_destinations(
+    resolver: DestinationResolver, query: str
+):
+    assert resolver.resolve_trip(query) is None
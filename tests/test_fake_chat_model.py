@@ -0,0 +1,111 @@
+import asyncio
+import time
+
+import pytest
+
+from adviser.advise_model import construct_query2advice_chain
+from adviser.fake_chat_model import NOT_FOUND_ADVICE, FakeChatModel, TextFakeChatModel
+from adviser.page_cache import PageCache
+from adviser.page_fetcher import PageFetcher
+from adviser.recorded_pages import RecordedPages
+
+BASE_URL = "https://www.smartraveller.gov.au/destinations"
+PAGE = """<html lang="en">
+<head>
+<title>Mexico Travel Advice &amp; Safety | Smartraveller</title>
+<meta name="description" content="Australian Government travel advice for Mexico.">
+</head>
+<body>
+<h2>Latest update</h2>
+<p>Cartel violence has increased in several states. Avoid travelling at night.</p>
+<h2>Advice levels</h2>
+<p>Exercise a high degree of caution in Mexico overall.</p>
+<p>Do not travel to the state of Sinaloa.</p>
+</body>
+</html>
+"""
+
+
+@pytest.fixture(autouse=True)
+def recorded_pages(tmp_path, monkeypatch: pytest.MonkeyPatch):
+    pages = RecordedPages(str(tmp_path), base_url=BASE_URL)
+    pages.record(f"{BASE_URL}/americas/mexico", PAGE)
+    fetcher = PageFetcher(transport=pages.transport())
+    monkeypatch.setattr("adviser.adviser_support_info_retriver.PAGE_FETCHER", fetcher)
+    yield
+    fetcher.close()
+
+
+def fake_model(**kwargs) -> FakeChatModel:
+    return FakeChatModel(latency=0, tokens_per_second=0, **kwargs)
+
+
+@pytest.mark.parametrize("structured", [True, False])
+def test_fake_model_answers_both_stages(structured: bool):
+    model_class = FakeChatModel if structured else TextFakeChatModel
+    extraction_model = model_class(latency=0, tokens_per_second=0)
+    chain = construct_query2advice_chain(
+        fake_model(), page_cache=PageCache(), extraction_model=extraction_model
+    )
+
+    advice = chain.invoke({"query": "Is Sinaloa in Mexico safe for a road trip?"})
+
+    assert advice == (
+        "Travel Safety Level:\n"
+        '    "Exercise a high degree of caution" in Mexico overall.\n'
+        '    "Do not travel" in Sinaloa.\n'
+        "Reasons:\n"
+        "    Cartel violence has increased in several states."
+    )
+    assert extraction_model.calls == 1
+
+
+def test_fake_model_is_deterministic():
+    chain = construct_query2advice_chain(fake_model(), page_cache=PageCache())
+
+    async def stream():
+        return [chunk async for chunk in chain.astream({"query": "Cancun in May?"})]
+
+    chunks = asyncio.run(stream())
+    assert len(chunks) > 1
+    assert "".join(chunks) == chain.invoke({"query": "Cancun in May?"})
+
+
+def test_destinations_without_a_page_have_no_advisory():
+    chain = construct_query2advice_chain(fake_model(), page_cache=PageCache())
+    assert chain.invoke({"query": "Is Japan safe?"}) == NOT_FOUND_ADVICE
+
+
+def test_canned_answers_replace_the_query_and_the_page():
+    model = fake_model(
+        canned_destinations=[{"name": "fiji", "region": "pacific"}],
+        canned_advice="Good to go",
+    )
+    chain = construct_query2advice_chain(model, page_cache=PageCache())
+
+    assert chain.invoke({"query": "Is Mexico safe?"}) == "Good to go"
+    assert model.invoke("Find the country of the query.\nIs Mexico safe?").content == (
+        '{"destinations": [{"name": "fiji", "region": "pacific"}]}'
+    )
+
+
+def test_fake_model_reports_the_token_usage():
+    message = fake_model().invoke("Find the country of the query.\nIs Mexico safe?")
+    assert message.content == (
+        '{"destinations": [{"name": "mexico", "region": "americas"}]}'
+    )
+    usage = message.usage_metadata
+    assert usage["input_tokens"] > 0 and usage["output_tokens"] > 0
+    assert usage["total_tokens"] == usage["input_tokens"] + usage["output_tokens"]
+
+
+def test_fake_model_latency_and_throughput():
+    model = FakeChatModel(latency=0.05, tokens_per_second=1000)
+    prompt = "Find the country of the query.\nIs Mexico safe?"
+    output_tokens = model.invoke(prompt).usage_metadata["output_tokens"]
+
+    start = time.perf_counter()
+    model.invoke(prompt)
+    elapsed = time.perf_counter() - start
+
+    assert elapsed >= 0.05 + output_tokens / 1000
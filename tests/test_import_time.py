@@ -0,0 +1,27 @@
+from benchmarks.bench_import_time import (
+    DEFERRED_PACKAGES,
+    import_module,
+    package_times,
+    parse_import_times,
+)
+
+IMPORT_TIME_REPORT = """\
+import time: self [us] | cumulative | imported package
+import time:       120 |        120 |   _io
+import time:       300 |        500 |     bs4.element
+import time:       200 |        700 |   bs4
+import time:        50 |        750 | adviser.retriever
+"""
+
+
+def test_parse_import_times_reads_self_and_cumulative_times():
+    times = parse_import_times(IMPORT_TIME_REPORT)
+    assert times["bs4.element"] == (300, 500)
+    assert times["adviser.retriever"] == (50, 750)
+    assert package_times(times) == {"_io": 120, "bs4": 500, "adviser": 50}
+
+
+def test_importing_the_app_defers_the_chat_model_and_html_libraries():
+    packages = package_times(import_module("adviser.app"))
+    assert "fastapi" in packages
+    assert not set(DEFERRED_PACKAGES) & set(packages)
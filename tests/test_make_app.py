@@ -1,17 +1,38 @@
-from unittest.mock import patch, Mock, MagicMock
+import asyncio
+import json
+import time
+from datetime import datetime
+from unittest.mock import patch, Mock, MagicMock, AsyncMock
 from typing import Dict
 
+import httpx
 import pytest
 from fastapi.testclient import TestClient
 from fastapi import FastAPI
+from openai import APITimeoutError
 
+from langchain_core.documents.base import Document
+from langchain_core.language_models import FakeListChatModel
+from langchain_core.runnables import RunnableLambda
+
+from adviser.admission import LLMBudget, RateLimiter
+from adviser.advise_model import construct_query2advice_chain
 from adviser.config import INJECTION_PATTERNS
+from adviser.destination_resolver import DestinationResolver
+from adviser.fake_chat_model import FakeChatModel
 from adviser.make_app import make_app
+from adviser.metrics import ChainMetrics
+from adviser.page_cache import CachedPage, PageCache
+from adviser.page_fetcher import HostUnavailable, PageFetchError, PageFetchTimeout
+from adviser.single_flight import SingleFlight
+from tests.fakes import RateLimitedChatModel
 
 
 @pytest.fixture
 def mock_chain() -> MagicMock:
-    return MagicMock()
+    chain = MagicMock()
+    chain.ainvoke = AsyncMock()
+    return chain
 
 
 # Create the FastAPI app instance
@@ -37,10 +58,85 @@ def test_health_check_endpoint(client: TestClient):
     assert response.json() == {"status": "ok"}
 
 
+def test_background_jobs_run_while_app_is_up(mock_chain: Mock):
+    job_states = []
+
+    async def job():
+        job_states.append("started")
+        try:
+            await asyncio.sleep(3600)
+        except asyncio.CancelledError:
+            job_states.append("cancelled")
+            raise
+
+    with TestClient(make_app(mock_chain, background_jobs=[job])) as client:
+        assert client.get("/health_check").status_code == 200
+        assert job_states == ["started"]
+    assert job_states == ["started", "cancelled"]
+
+
+def test_chains_are_built_and_warmed_up_once_the_app_is_up():
+    steps = []
+
+    def build_chains():
+        steps.append("build")
+        return RunnableLambda(lambda inputs: "Good to go"), None
+
+    async def warm_up():
+        steps.append("warm")
+
+    app = make_app(chain_factory=build_chains, warmup_hooks=[warm_up])
+    client = TestClient(app)
+    assert client.get("/ready").status_code == 503
+    assert steps == []
+
+    with client:
+        response = client.post("/get_travel_advice", json={"query": "Is Bali safe?"})
+        assert response.json() == {"response": "Good to go"}
+        for _ in range(100):
+            if client.get("/ready").status_code == 200:
+                break
+            time.sleep(0.01)
+        assert client.get("/ready").json() == {"status": "ready"}
+    assert steps == ["build", "warm"]
+
+
+def test_failed_warm_up_hooks_do_not_prevent_readiness(mock_chain: Mock):
+    async def fail():
+        raise PageFetchError("Error retrieving web content")
+
+    with TestClient(make_app(mock_chain, warmup_hooks=[fail])) as client:
+        for _ in range(100):
+            if client.get("/ready").status_code == 200:
+                break
+            time.sleep(0.01)
+        assert client.get("/ready").json() == {"status": "ready"}
+
+
+def test_app_is_not_ready_when_the_chains_fail_to_build():
+    def build_chains():
+        raise ValueError("OPENAI_API_KEY is not set")
+
+    with TestClient(make_app(chain_factory=build_chains)) as client:
+        response = client.post("/get_travel_advice", json={"query": "Is Bali safe?"})
+        assert response.status_code == 503
+        ready = client.get("/ready")
+        assert ready.status_code == 503
+        assert ready.json()["status"] == "failed"
+        assert client.get("/health_check").status_code == 200
+
+
+def test_make_app_requires_a_chain_or_a_chain_factory(mock_chain: Mock):
+    with pytest.raises(ValueError):
+        make_app()
+    with pytest.raises(ValueError):
+        make_app(mock_chain, chain_factory=lambda: (mock_chain, None))
+
+
 def test_get_travel_advice_endpoint_success(
     mock_chain: Mock, client: TestClient, query_data: Dict
 ):
-    mock_chain.invoke.return_value = "Good to go"
+    mock_chain.ainvoke.return_value = "Good to go"
     response = client.post("/get_travel_advice", json=query_data)
     assert response.status_code == 200
     assert response.json() == {"response": "Good to go"}
@@ -69,7 +165,374 @@ def test_get_travel_advice_endpoint_prompt_injection(query: str, client: TestCli
 def test_handle_query_endpoint_exception(
     mock_chain: Mock, client: TestClient, query_data: Dict
 ):
-    mock_chain.invoke.side_effect = Exception("Some error")
+    mock_chain.ainvoke.side_effect = Exception("Some error")
     response = client.post("/get_travel_advice", json=query_data)
     assert response.status_code == 500
     assert response.json() == {"detail": "Some error"}
+
+
+@pytest.mark.parametrize(
+    "error, status_code",
+    [
+        (PageFetchError("Error retrieving web content: refused"), 502),
+        (PageFetchTimeout("Timed out retrieving web content"), 504),
+        (APITimeoutError(httpx.Request("POST", "https://api.openai.com")), 504),
+    ],
+)
+def test_handle_query_endpoint_page_fetch_errors(
+    mock_chain: Mock,
+    client: TestClient,
+    query_data: Dict,
+    error: Exception,
+    status_code: int,
+):
+    mock_chain.ainvoke.side_effect = error
+    response = client.post("/get_travel_advice", json=query_data)
+    assert response.status_code == status_code
+    assert response.json() == {"detail": str(error)}
+
+
+async def _post_concurrently(app: FastAPI, n_requests: int):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await asyncio.gather(
+            *[
+                client.post("/get_travel_advice", json={"query": f"travel {i}"})
+                for i in range(n_requests)
+            ]
+        )
+
+
+@patch("adviser.adviser_support_info_retriver.aload_page", new_callable=AsyncMock)
+def test_get_travel_advice_endpoint_flags_advice_from_stale_pages(
+    mock_aload_page: AsyncMock,
+):
+    url = "https://www.smartraveller.gov.au/destinations/asia/indonesia"
+    mock_aload_page.side_effect = HostUnavailable("Error retrieving web content")
+    clock = Mock(return_value=0.0)
+    page_cache = PageCache(ttl=60, clock=clock)
+    page_cache.store(url, CachedPage(document=Document(page_content="<p>advice</p>")))
+    clock.return_value = 3600.0
+    chain = construct_query2advice_chain(
+        FakeListChatModel(responses=["Good to go"]),
+        page_cache=page_cache,
+        resolver=DestinationResolver(),
+    )
+    client = TestClient(make_app(chain))
+
+    response = client.post("/get_travel_advice", json={"query": "Is Bali safe?"})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["response"] == "Good to go"
+    assert list(body["stale_pages"]) == [url]
+    retrieved_at = datetime.fromisoformat(body["stale_pages"][url])
+    assert abs(time.time() - 3600 - retrieved_at.timestamp()) < 5
+
+
+def test_get_travel_advice_endpoint_runs_requests_concurrently():
+    async def slow_chain(_):
+        await asyncio.sleep(0.2)
+        return "Good to go"
+
+    chain = MagicMock()
+    chain.ainvoke = AsyncMock(side_effect=slow_chain)
+    start = time.perf_counter()
+    responses = asyncio.run(_post_concurrently(make_app(chain), 5))
+    elapsed = time.perf_counter() - start
+    assert all(response.status_code == 200 for response in responses)
+    assert elapsed < 0.6
+
+
+def test_get_travel_advice_endpoint_concurrency_limit():
+    in_flight, peak = 0, 0
+
+    async def tracking_chain(_):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.05)
+        in_flight -= 1
+        return "Good to go"
+
+    chain = MagicMock()
+    chain.ainvoke = AsyncMock(side_effect=tracking_chain)
+    responses = asyncio.run(_post_concurrently(make_app(chain, max_concurrency=2), 6))
+    assert all(response.status_code == 200 for response in responses)
+    assert peak == 2
+
+
+async def _post_queries(app: FastAPI, queries):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await asyncio.gather(
+            *[client.post("/get_travel_advice", json={"query": q}) for q in queries]
+        )
+
+
+@patch("adviser.adviser_support_info_retriver.aload_from_url", new_callable=AsyncMock)
+def test_get_travel_advice_endpoint_coalesces_identical_queries(
+    mock_aload_from_url: AsyncMock,
+):
+    mock_aload_from_url.return_value = [Document(page_content="<p>advice</p>")]
+    chat_model = FakeChatModel(
+        latency=0.05,
+        tokens_per_second=0,
+        canned_destinations=[{"name": "indonesia", "region": "asia"}],
+        canned_advice="Good to go",
+    )
+    chain = construct_query2advice_chain(chat_model, resolver=DestinationResolver())
+    single_flight = SingleFlight()
+    app = make_app(chain, single_flight=single_flight)
+    queries = ["Is Bali safe?", "is bali safe", "IS BALI SAFE?!"] * 7
+
+    responses = asyncio.run(_post_queries(app, queries))
+
+    assert [response.json() for response in responses] == [
+        {"response": "Good to go"}
+    ] * len(queries)
+    assert chat_model.calls == 1
+    assert mock_aload_from_url.await_count == 1
+    assert (single_flight.misses, single_flight.coalesced) == (1, len(queries) - 1)
+
+
+def test_get_travel_advice_endpoint_coalesced_queries_share_the_error():
+    async def timing_out_chain(_):
+        await asyncio.sleep(0.05)
+        raise PageFetchTimeout("Timed out retrieving web content")
+
+    chain = MagicMock()
+    chain.ainvoke = AsyncMock(side_effect=timing_out_chain)
+    app = make_app(chain, single_flight=SingleFlight())
+
+    responses = asyncio.run(_post_queries(app, ["Is Bali safe?"] * 5))
+
+    assert [response.status_code for response in responses] == [504] * 5
+    assert chain.ainvoke.await_count == 1
+
+
+def test_get_travel_advice_batch_endpoint(mock_chain: Mock):
+    batch_chain = MagicMock()
+    batch_chain.ainvoke = AsyncMock(
+        return_value=["Good to go", Exception("Some error")]
+    )
+    client = TestClient(make_app(mock_chain, batch_chain=batch_chain))
+    queries = ["travel advice", "", "travel advice 2", INJECTION_PATTERNS[0]]
+    response = client.post("/get_travel_advice/batch", json={"queries": queries})
+    assert response.status_code == 200
+    assert response.json() == {
+        "responses": [
+            {"response": "Good to go"},
+            {"detail": "Query is required.", "status_code": 400},
+            {"detail": "Some error", "status_code": 500},
+            {"detail": "Injection commands detected.", "status_code": 400},
+        ]
+    }
+    inputs = batch_chain.ainvoke.call_args.args[0]
+    assert inputs == [{"query": "travel advice"}, {"query": "travel advice 2"}]
+
+
+def test_get_travel_advice_batch_endpoint_maps_page_fetch_errors(mock_chain: Mock):
+    batch_chain = MagicMock()
+    batch_chain.ainvoke = AsyncMock(
+        return_value=[PageFetchTimeout("Timed out retrieving web content")]
+    )
+    client = TestClient(make_app(mock_chain, batch_chain=batch_chain))
+    response = client.post(
+        "/get_travel_advice/batch", json={"queries": ["travel advice"]}
+    )
+    assert response.json() == {
+        "responses": [
+            {"detail": "Timed out retrieving web content", "status_code": 504}
+        ]
+    }
+
+
+def test_get_travel_advice_batch_endpoint_falls_back_to_chain_abatch(
+    mock_chain: Mock, client: TestClient
+):
+    mock_chain.abatch = AsyncMock(return_value=["Good to go"])
+    response = client.post("/get_travel_advice/batch", json={"queries": ["travel"]})
+    assert response.json() == {"responses": [{"response": "Good to go"}]}
+    assert mock_chain.abatch.call_args.kwargs == {"return_exceptions": True}
+
+
+def test_get_travel_advice_batch_endpoint_rejects_empty_batch(client: TestClient):
+    response = client.post("/get_travel_advice/batch", json={"queries": []})
+    assert response.status_code == 422
+
+
+def _parse_sse(body: str):
+    events = []
+    for message in body.strip().split("\n\n"):
+        event, data = message.split("\n")
+        events.append((event.removeprefix("event: "), data.removeprefix("data: ")))
+    return events
+
+
+@patch("adviser.adviser_support_info_retriver.aload_from_url", new_callable=AsyncMock)
+def test_stream_travel_advice_endpoint(mock_aload_from_url: AsyncMock):
+    mock_aload_from_url.return_value = [Document(page_content="<p>advice</p>")]
+    chain = construct_query2advice_chain(
+        FakeListChatModel(responses=["Good to go"]), resolver=DestinationResolver()
+    )
+    client = TestClient(make_app(chain))
+    response = client.post("/get_travel_advice/stream", json={"query": "Is Bali safe?"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = _parse_sse(response.text)
+    assert events[0] == (
+        "destination",
+        '{"url": "https://www.smartraveller.gov.au/destinations/asia/indonesia"}',
+    )
+    assert events[-1] == ("end", "{}")
+    tokens = [json.loads(data)["text"] for event, data in events if event == "token"]
+    assert len(tokens) > 1
+    assert "".join(tokens) == "Good to go"
+
+
+@patch("adviser.adviser_support_info_retriver.aload_from_url", new_callable=AsyncMock)
+def test_stream_travel_advice_endpoint_sends_every_destination_of_a_trip(
+    mock_aload_from_url: AsyncMock,
+):
+    mock_aload_from_url.side_effect = lambda url: [
+        Document(page_content="<p>advice</p>", metadata={"source": url})
+    ]
+    extraction_model = FakeListChatModel(
+        responses=[
+            '{"destinations": [{"name": "indonesia", "region": "asia"},'
+            ' {"name": "fiji", "region": "pacific"}]}'
+        ]
+    )
+    chain = construct_query2advice_chain(
+        FakeListChatModel(responses=["Good to go"]),
+        resolver=DestinationResolver(),
+        extraction_model=extraction_model,
+    )
+    client = TestClient(make_app(chain))
+    response = client.post(
+        "/get_travel_advice/stream", json={"query": "Is Bali then Fiji safe?"}
+    )
+    events = _parse_sse(response.text)
+    assert [data for event, data in events if event == "destination"] == [
+        '{"url": "https://www.smartraveller.gov.au/destinations/asia/indonesia"}',
+        '{"url": "https://www.smartraveller.gov.au/destinations/pacific/fiji"}',
+    ]
+    tokens = [json.loads(data)["text"] for event, data in events if event == "token"]
+    assert "".join(tokens) == "indonesia:\nGood to go\n\nfiji:\nGood to go"
+    assert events[-1] == ("end", "{}")
+
+
+def test_stream_travel_advice_endpoint_exception():
+    def fail(_):
+        raise Exception("Some error")
+
+    client = TestClient(make_app(RunnableLambda(fail)))
+    response = client.post("/get_travel_advice/stream", json={"query": "travel"})
+    assert _parse_sse(response.text) == [("error", '{"detail": "Some error"}')]
+
+
+def test_stream_travel_advice_endpoint_invalid_input(client: TestClient):
+    response = client.post("/get_travel_advice/stream", json={"query": ""})
+    assert response.status_code == 400
+
+
+def test_get_travel_advice_endpoint_rate_limits_every_api_key():
+    chain = RunnableLambda(lambda inputs: "Good to go")
+    metrics = ChainMetrics()
+    client = TestClient(
+        make_app(
+            chain,
+            rate_limiter=RateLimiter(per_minute=6, burst=2, api_keys={"a", "b"}),
+            metrics=metrics,
+        )
+    )
+
+    def post(api_key: str):
+        return client.post(
+            "/get_travel_advice",
+            json={"query": "Is Bali safe?"},
+            headers={"X-API-Key": api_key},
+        )
+
+    statuses = [post("a").status_code for _ in range(3)]
+    limited = post("a")
+
+    assert statuses == [200, 200, 429]
+    assert limited.headers["Retry-After"] == "10"
+    assert post("b").status_code == 200
+    batch = client.post(
+        "/get_travel_advice/batch",
+        json={"queries": ["Is Bali safe?"] * 3},
+        headers={"X-API-Key": "b"},
+    )
+    assert batch.status_code == 429
+    assert (
+        'adviser_requests_rejected_total{endpoint="get_travel_advice",status="429"} 2'
+        in metrics.render()
+    )
+
+
+@pytest.mark.parametrize(
+    "by_address, statuses", [(False, [200] * 3), (True, [200, 429, 429])]
+)
+def test_get_travel_advice_endpoint_ignores_unknown_api_keys(
+    by_address: bool, statuses: list
+):
+    chain = RunnableLambda(lambda inputs: "Good to go")
+    rate_limiter = RateLimiter(
+        per_minute=6, burst=1, api_keys={"known"}, by_address=by_address
+    )
+    client = TestClient(make_app(chain, rate_limiter=rate_limiter))
+
+    # a new key with every request does not get a new bucket
+    responses = [
+        client.post(
+            "/get_travel_advice",
+            json={"query": "Is Bali safe?"},
+            headers={"X-API-Key": f"random-{attempt}"},
+        )
+        for attempt in range(3)
+    ]
+
+    assert [response.status_code for response in responses] == statuses
+
+
+def test_get_travel_advice_endpoint_sheds_requests_once_the_queue_is_full():
+    async def slow_chain(_):
+        await asyncio.sleep(0.1)
+        return "Good to go"
+
+    chain = MagicMock()
+    chain.ainvoke = AsyncMock(side_effect=slow_chain)
+    app = make_app(chain, max_concurrency=1, max_queue=2)
+
+    responses = asyncio.run(_post_concurrently(app, 5))
+
+    statuses = sorted(response.status_code for response in responses)
+    assert statuses == [200, 200, 200, 503, 503]
+    shed = next(response for response in responses if response.status_code == 503)
+    assert int(shed.headers["Retry-After"]) >= 1
+
+
+@patch("adviser.adviser_support_info_retriver.aload_from_url", new_callable=AsyncMock)
+@pytest.mark.parametrize(
+    "budget, statuses", [(None, [200] * 2 + [503] * 4), (2, [200] * 6)]
+)
+def test_get_travel_advice_endpoint_holds_llm_calls_to_the_budget(
+    mock_aload_from_url: AsyncMock, budget, statuses
+):
+    mock_aload_from_url.return_value = [Document(page_content="<p>advice</p>")]
+    chat_model = RateLimitedChatModel()
+    chain = construct_query2advice_chain(
+        chat_model,
+        resolver=DestinationResolver(),
+        llm_budget=LLMBudget(budget) if budget else None,
+    )
+
+    responses = asyncio.run(_post_concurrently(make_app(chain), 6))
+
+    assert sorted(response.status_code for response in responses) == statuses
+    for response in responses:
+        if response.status_code == 503:
+            assert response.headers["Retry-After"] == "2"
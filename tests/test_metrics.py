@@ -0,0 +1,134 @@
+from unittest.mock import patch, AsyncMock
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from langchain_core.documents.base import Document
+from langchain_core.language_models import FakeListChatModel, GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+
+from adviser.advise_model import construct_query2advice_chain
+from adviser.destination_resolver import DestinationResolver
+from adviser.make_app import make_app
+from adviser.metrics import ChainMetrics, Counter, Histogram, _token_usage
+from adviser.response_cache import ResponseCache
+from tests.fakes import FakeClock
+
+
+def test_histogram_exposes_cumulative_buckets():
+    histogram = Histogram("latency_seconds", "Latency.", ("stage",), buckets=[0.1, 1])
+    for value in [0.05, 0.5, 0.5, 2]:
+        histogram.observe(("query2url",), value)
+    assert histogram.expose() == [
+        "# HELP latency_seconds Latency.",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{stage="query2url",le="0.1"} 1',
+        'latency_seconds_bucket{stage="query2url",le="1.0"} 3',
+        'latency_seconds_bucket{stage="query2url",le="+Inf"} 4',
+        'latency_seconds_sum{stage="query2url"} 3.05',
+        'latency_seconds_count{stage="query2url"} 4',
+    ]
+
+
+def test_counter_escapes_label_values():
+    counter = Counter("errors_total", "Errors.", ("stage",))
+    counter.inc(('say "hi"\n',), 2)
+    assert counter.expose()[-1] == 'errors_total{stage="say \\"hi\\"\\n"} 2'
+
+
+def test_token_usage_reads_usage_metadata_and_llm_output():
+    message = AIMessage(
+        content="advice",
+        usage_metadata={"input_tokens": 10, "output_tokens": 3, "total_tokens": 13},
+    )
+    assert _token_usage(LLMResult(generations=[[ChatGeneration(message=message)]])) == (
+        10,
+        3,
+    )
+    assert _token_usage(
+        LLMResult(
+            generations=[[ChatGeneration(message=AIMessage(content="advice"))]],
+            llm_output={"token_usage": {"prompt_tokens": 7, "completion_tokens": 2}},
+        )
+    ) == (7, 2)
+
+
+@patch("httpx.Client.get")
+def test_chain_metrics_times_every_stage(mock_get):
+    mock_get.return_value = httpx.Response(200, text="<p>advice</p>")
+    metrics = ChainMetrics(clock=FakeClock(step=0.5))
+    chain = construct_query2advice_chain(
+        FakeListChatModel(responses=['{"name": "indonesia", "region": "asia"}', "ok"])
+    )
+    assert chain.invoke({"query": "Is Bali safe?"}, {"callbacks": [metrics]}) == "ok"
+
+    timed_stages = {labels[0] for labels in metrics.stage_duration.values}
+    assert timed_stages == {
+        "query2url",
+        "url2doc",
+        "doc2advice",
+        "load_from_url",
+        "transform_html_content",
+    }
+    assert set(metrics.llm_duration.values) == {("query2url",), ("doc2advice",)}
+    # every run is forgotten once finished
+    assert metrics._run_stages == {} and metrics._started_at == {}
+
+
+@patch("httpx.Client.get")
+def test_chain_metrics_counts_tokens_and_errors_per_stage(mock_get):
+    message = AIMessage(
+        content="ok",
+        usage_metadata={"input_tokens": 100, "output_tokens": 5, "total_tokens": 105},
+    )
+    metrics = ChainMetrics()
+    chain = construct_query2advice_chain(
+        GenericFakeChatModel(messages=iter([message])),
+        resolver=DestinationResolver(),
+    )
+    mock_get.return_value = httpx.Response(200, text="<p>advice</p>")
+    chain.invoke({"query": "Is Bali safe?"}, {"callbacks": [metrics]})
+    assert metrics.llm_tokens.values == {
+        ("doc2advice", "input"): 100,
+        ("doc2advice", "output"): 5,
+    }
+
+    mock_get.side_effect = httpx.ConnectError("Connection refused")
+    with pytest.raises(Exception, match="Error retrieving web content"):
+        chain.invoke({"query": "Is Bali safe?"}, {"callbacks": [metrics]})
+    assert metrics.stage_errors.values == {("load_from_url",): 1, ("url2doc",): 1}
+
+
+@patch("adviser.adviser_support_info_retriver.aload_from_url", new_callable=AsyncMock)
+def test_metrics_endpoint(mock_aload_from_url: AsyncMock):
+    mock_aload_from_url.return_value = [Document(page_content="<p>advice</p>")]
+    response_cache = ResponseCache()
+    resolver = DestinationResolver()
+    metrics = ChainMetrics(caches={"response": response_cache, "resolver": resolver})
+    chain = construct_query2advice_chain(
+        FakeListChatModel(responses=["Good to go"]),
+        resolver=resolver,
+        response_cache=response_cache,
+    )
+    client = TestClient(make_app(chain, metrics=metrics))
+    for _ in range(2):
+        response = client.post("/get_travel_advice", json={"query": "Is Bali safe?"})
+        assert response.status_code == 200
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    lines = response.text.splitlines()
+    assert 'adviser_stage_duration_seconds_count{stage="doc2advice"} 2' in lines
+    assert (
+        'adviser_request_duration_seconds_count{endpoint="get_travel_advice"} 2'
+        in lines
+    )
+    assert 'adviser_cache_requests_total{cache="response",result="hits"} 1' in lines
+    assert 'adviser_cache_requests_total{cache="resolver",result="hits"} 2' in lines
+
+
+def test_metrics_endpoint_is_not_served_without_metrics():
+    chain = construct_query2advice_chain(FakeListChatModel(responses=["ok"]))
+    assert TestClient(make_app(chain)).get("/metrics").status_code == 404
@@ -0,0 +1,188 @@
+import asyncio
+from pathlib import Path
+from typing import Optional
+
+import pytest
+from langchain_core.documents.base import Document
+
+from adviser.page_cache import CachedPage, PageCache, collect_stale_pages
+from adviser.page_fetcher import PageFetchError, PageFetchTimeout
+from adviser.shared_store import SQLiteSharedStore
+from tests.fakes import FakeClock
+
+
+@pytest.fixture
+def page_cache(clock: FakeClock) -> PageCache:
+    return PageCache(ttl=60, max_size=2, clock=clock)
+
+
+class CountingLoader:
+    def __init__(self, delay: float = 0.0, error: Optional[Exception] = None):
+        self.delay = delay
+        self.error = error
+        self.calls = []
+
+    def _load(self, url: str, stale: Optional[CachedPage]) -> CachedPage:
+        self.calls.append((url, stale))
+        if self.error:
+            raise self.error
+        return CachedPage(
+            document=Document(page_content=f"{url} #{len(self.calls)}"), etag="v1"
+        )
+
+    def __call__(self, url: str, stale: Optional[CachedPage]) -> CachedPage:
+        return self._load(url, stale)
+
+    async def aload(self, url: str, stale: Optional[CachedPage]) -> CachedPage:
+        await asyncio.sleep(self.delay)
+        return self._load(url, stale)
+
+
+def test_page_cache_serves_fresh_pages(page_cache: PageCache):
+    loader = CountingLoader()
+    first = page_cache.get("http://test.com/a", loader)
+    second = page_cache.get("http://test.com/a", loader)
+    assert first is second
+    assert len(loader.calls) == 1
+    assert (page_cache.hits, page_cache.misses) == (1, 1)
+
+
+def test_page_cache_revalidates_expired_pages(page_cache: PageCache, clock: FakeClock):
+    loader = CountingLoader()
+    page_cache.get("http://test.com/a", loader)
+    clock.now = 61
+    document = page_cache.get("http://test.com/a", loader)
+    assert document.page_content == "http://test.com/a #2"
+    stale = loader.calls[1][1]
+    assert stale is not None and stale.etag == "v1"
+
+
+def test_page_cache_keeps_not_modified_pages(page_cache: PageCache, clock: FakeClock):
+    page_cache.get("http://test.com/a", CountingLoader())
+    clock.now = 61
+    document = page_cache.get("http://test.com/a", lambda url, stale: stale)
+    assert document.page_content == "http://test.com/a #1"
+    assert page_cache.revalidated == 1
+    assert page_cache.is_fresh(page_cache.lookup("http://test.com/a"))
+
+
+def test_page_cache_evicts_least_recently_used(page_cache: PageCache):
+    loader = CountingLoader()
+    page_cache.get("http://test.com/a", loader)
+    page_cache.get("http://test.com/b", loader)
+    page_cache.get("http://test.com/a", loader)
+    page_cache.get("http://test.com/c", loader)
+    assert len(page_cache) == 2
+    assert "http://test.com/a" in page_cache
+    assert "http://test.com/b" not in page_cache
+
+
+def test_page_cache_coalesces_concurrent_loads(page_cache: PageCache):
+    loader = CountingLoader(delay=0.05)
+
+    async def burst():
+        return await asyncio.gather(
+            *[page_cache.aget("http://test.com/a", loader.aload) for _ in range(10)]
+        )
+
+    documents = asyncio.run(burst())
+    assert len(loader.calls) == 1
+    assert all(document is documents[0] for document in documents)
+    assert page_cache.coalesced == 9
+
+
+def test_page_cache_propagates_errors_to_every_waiter(page_cache: PageCache):
+    loader = CountingLoader(delay=0.05, error=ValueError("fetch failed"))
+
+    async def burst():
+        return await asyncio.gather(
+            *[page_cache.aget("http://test.com/a", loader.aload) for _ in range(3)],
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(burst())
+    assert len(loader.calls) == 1
+    assert all(isinstance(result, ValueError) for result in results)
+    assert "http://test.com/a" not in page_cache
+
+
+def test_page_cache_warm_loads_missing_pages_up_to_max_size(page_cache: PageCache):
+    stored = {
+        url: CachedPage(document=Document(page_content=url))
+        for url in ["/fiji", "/laos", "/japan"]
+    }
+    page_cache.get("/fiji", load=CountingLoader())
+
+    loaded = page_cache.warm(["/fiji", "/nauru", "/laos", "/japan"], stored.get)
+
+    assert loaded == 1
+    assert "/laos" in page_cache and "/japan" not in page_cache
+    assert page_cache.get("/laos", load=CountingLoader()).page_content == "/laos"
+
+
+def test_page_cache_serves_the_stale_page_when_the_load_fails(
+    page_cache: PageCache, clock: FakeClock
+):
+    page_cache.get("http://test.com/a", load=CountingLoader())
+    clock.now += 61
+    failing = CountingLoader(error=PageFetchError("Error retrieving web content"))
+
+    with collect_stale_pages() as stale_pages:
+        document = page_cache.get("http://test.com/a", load=failing)
+        adocument = asyncio.run(page_cache.aget("http://test.com/a", failing.aload))
+
+    assert document.page_content == adocument.page_content == "http://test.com/a #1"
+    assert list(stale_pages) == ["http://test.com/a"]
+    assert page_cache.stale == 2
+    with pytest.raises(PageFetchError):
+        page_cache.get("http://test.com/b", load=failing)
+
+
+def test_page_cache_serves_the_stale_page_at_the_deadline_and_keeps_loading(
+    clock: FakeClock,
+):
+    page_cache = PageCache(ttl=60, clock=clock, deadline=0.02)
+    page_cache.get("http://test.com/a", load=CountingLoader())
+    clock.now += 61
+    slow = CountingLoader(delay=0.1)
+
+    async def request_then_wait_for_the_refresh():
+        document = await page_cache.aget("http://test.com/a", slow.aload)
+        await asyncio.sleep(0.15)
+        return document
+
+    assert asyncio.run(request_then_wait_for_the_refresh()).page_content == (
+        "http://test.com/a #1"
+    )
+    assert page_cache.stale == 1
+    assert page_cache.get("http://test.com/a", load=slow).page_content == (
+        "http://test.com/a #1"
+    )
+    assert len(slow.calls) == 1
+    assert page_cache.revalidated == 0 and page_cache.hits == 1
+
+
+def test_page_cache_times_out_at_the_deadline_without_a_stale_page():
+    page_cache = PageCache(deadline=0.02)
+
+    with pytest.raises(PageFetchTimeout):
+        asyncio.run(
+            page_cache.aget("http://test.com/a", CountingLoader(delay=0.1).aload)
+        )
+
+
+def test_page_cache_serves_the_pages_loaded_by_other_workers(tmp_path: Path):
+    path = str(tmp_path / "cache.sqlite3")
+    worker, other_worker, late_worker = (
+        PageCache(ttl=60, shared=SQLiteSharedStore(path)) for _ in range(3)
+    )
+    loader = CountingLoader()
+    worker.get("http://test.com/a", load=loader)
+
+    document = other_worker.get("http://test.com/a", load=loader)
+    adocument = asyncio.run(late_worker.aget("http://test.com/a", loader.aload))
+
+    assert len(loader.calls) == 1
+    assert document.page_content == adocument.page_content == "http://test.com/a #1"
+    assert (other_worker.shared_hits, late_worker.shared_hits) == (1, 1)
+    assert late_worker.lookup("http://test.com/a").etag == "v1"
@@ -0,0 +1,161 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+
+from adviser.page_fetcher import (
+    CircuitBreaker,
+    HostUnavailable,
+    PageFetcher,
+    PageFetchError,
+    PageFetchTimeout,
+)
+from tests.fakes import FakeClock, StubAdvisoryServer
+
+
+@pytest.fixture
+def server():
+    with StubAdvisoryServer() as server:
+        yield server
+
+
+@pytest.fixture
+def fetcher():
+    fetcher = PageFetcher(connect_timeout=1, read_timeout=1, retries=2, backoff=0.01)
+    yield fetcher
+    fetcher.close()
+
+
+def test_http2_is_negotiated_with_the_pinned_h2(fetcher: PageFetcher):
+    # the stub server speaks HTTP/1.1 only, the client still offers HTTP/2
+    assert fetcher.http2 and fetcher._client_options()["http2"]
+    assert not PageFetcher(http2=False).http2
+
+
+def test_get_reuses_the_connection(server: StubAdvisoryServer, fetcher: PageFetcher):
+    for _ in range(5):
+        assert fetcher.get(f"{server.base_url}/asia/indonesia").status_code == 200
+    assert server.request_count == 5
+    assert server.connection_count == 1
+
+
+def test_aget_reuses_connections_across_concurrent_requests(
+    server: StubAdvisoryServer, fetcher: PageFetcher
+):
+    server.latency = 0.05
+
+    async def fetch_in_waves():
+        for _ in range(3):
+            responses = await asyncio.gather(
+                *[fetcher.aget(f"{server.base_url}/asia/indonesia") for _ in range(4)]
+            )
+            assert all(response.status_code == 200 for response in responses)
+        await fetcher.aclose()
+
+    asyncio.run(fetch_in_waves())
+    assert server.request_count == 12
+    assert server.connection_count == 4
+
+
+def test_awarm_opens_the_connection_used_by_the_requests(
+    server: StubAdvisoryServer, fetcher: PageFetcher
+):
+    async def warm_then_fetch():
+        await fetcher.awarm(server.base_url)
+        response = await fetcher.aget(f"{server.base_url}/asia/indonesia")
+        await fetcher.aclose()
+        return response
+
+    assert asyncio.run(warm_then_fetch()).status_code == 200
+    assert server.request_count == 2
+    assert server.connection_count == 1
+
+
+def test_aget_caps_concurrent_requests_per_host(server: StubAdvisoryServer):
+    server.latency = 0.05
+    fetcher = PageFetcher(per_host=2)
+
+    async def fetch_all():
+        await asyncio.gather(
+            *[fetcher.aget(f"{server.base_url}/asia/indonesia") for _ in range(6)]
+        )
+        await fetcher.aclose()
+
+    asyncio.run(fetch_all())
+    assert server.connection_count == 2
+
+
+def test_get_retries_server_errors(server: StubAdvisoryServer, fetcher: PageFetcher):
+    server.failures = 2
+    assert fetcher.get(f"{server.base_url}/asia/indonesia").status_code == 200
+    assert server.request_count == 3
+
+
+def test_aget_raises_bad_gateway_once_retries_are_exhausted(
+    server: StubAdvisoryServer, fetcher: PageFetcher
+):
+    server.failures = 3
+    with pytest.raises(PageFetchError, match="responded with 503") as error:
+        asyncio.run(fetcher.aget(f"{server.base_url}/asia/indonesia"))
+    assert error.value.status_code == 502
+    assert server.request_count == 3
+
+
+def test_get_returns_client_errors_as_is(
+    server: StubAdvisoryServer, fetcher: PageFetcher
+):
+    server.failures, server.failure_status = 1, 404
+    assert fetcher.get(f"{server.base_url}/asia/atlantis").status_code == 404
+    assert server.request_count == 1
+
+
+def test_aget_raises_gateway_timeout(server: StubAdvisoryServer):
+    server.latency = 0.3
+    fetcher = PageFetcher(read_timeout=0.1, retries=1, backoff=0.01)
+    with pytest.raises(PageFetchTimeout) as error:
+        asyncio.run(fetcher.aget(f"{server.base_url}/asia/indonesia"))
+    assert error.value.status_code == 504
+    assert server.request_count == 2
+
+
+def test_retry_delays_are_jittered(fetcher: PageFetcher):
+    with patch("adviser.page_fetcher.random.uniform", return_value=0.5) as uniform:
+        assert fetcher._delay(3) == 0.5
+    uniform.assert_called_once_with(0, 0.01 * 2**3)
+
+
+def test_circuit_breaker_opens_after_consecutive_failures_and_lets_trials_through(
+    clock: FakeClock,
+):
+    breaker = CircuitBreaker(threshold=2, reset_timeout=30, clock=clock)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert not breaker.allow()
+
+    clock.now += 30
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_failure()
+    clock.now += 29
+    assert not breaker.allow()
+    clock.now += 1
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.allow() and breaker.allow()
+
+
+def test_get_stops_contacting_a_failing_host(server: StubAdvisoryServer):
+    fetcher = PageFetcher(retries=0, breaker_threshold=2, breaker_reset=60)
+    server.failures = 2
+    for _ in range(2):
+        with pytest.raises(PageFetchError):
+            fetcher.get(f"{server.base_url}/asia/indonesia")
+
+    with pytest.raises(HostUnavailable) as error:
+        fetcher.get(f"{server.base_url}/asia/indonesia")
+    assert error.value.status_code == 503
+    assert server.request_count == 2
+    fetcher.close()
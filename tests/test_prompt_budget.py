@@ -0,0 +1,66 @@
+from unittest.mock import patch
+
+import pytest
+
+from adviser.prompt_budget import (
+    TokenCounter,
+    compact_whitespace,
+    estimate_tokens,
+    sentence_ends,
+    trim_to_token_budget,
+)
+
+LEVELS = (
+    "Exercise a high degree of caution in Indonesia overall. Use common sense and "
+    "look out for suspicious behaviour. Reconsider your need to travel to Papua."
+)
+
+
+def test_compact_whitespace_strips_lines_and_keeps_paragraphs():
+    text = "\n        Given the inputs:   \n\n\n        `title`:\t the title \n"
+    assert compact_whitespace(text) == "Given the inputs:\n\n`title`: the title"
+
+
+def test_sentence_ends_split_after_punctuation_and_line_breaks():
+    text = 'He said "go." Then\nA list item\nEnd'
+    assert [text[:end] for end in sentence_ends(text)] == [
+        'He said "go."',
+        'He said "go." Then',
+        'He said "go." Then\nA list item',
+        text,
+    ]
+
+
+@pytest.mark.parametrize(
+    "max_tokens, expected",
+    [
+        (100, LEVELS),
+        (25, LEVELS.rsplit(" Reconsider", 1)[0]),
+        (12, "Exercise a high degree of caution in Indonesia overall."),
+        (4, "Exercise a high degree"),
+    ],
+)
+def test_trim_to_token_budget_keeps_whole_sentences(max_tokens: int, expected: str):
+    trimmed = trim_to_token_budget(LEVELS, max_tokens, estimate_tokens)
+    assert trimmed == expected
+    assert estimate_tokens(trimmed) <= max_tokens
+
+
+def test_token_counter_estimates_when_the_encoding_can_not_be_loaded():
+    counter = TokenCounter("unknown_encoding")
+    with patch("tiktoken.get_encoding", side_effect=ValueError("offline")):
+        assert counter("Is Bali safe?") == estimate_tokens("Is Bali safe?") == 4
+    assert counter.estimated
+
+
+def test_token_counter_counts_with_the_encoding():
+    class Encoding:
+        def encode_ordinary(self, text):
+            return list(text)
+
+    counter = TokenCounter()
+    with patch("tiktoken.get_encoding", return_value=Encoding()) as get_encoding:
+        counter.load()
+        counter.load()
+    assert counter("Bali") == 4 and not counter.estimated
+    get_encoding.assert_called_once_with(counter.encoding)
@@ -0,0 +1,121 @@
+import asyncio
+import os
+import subprocess
+import sys
+
+import pytest
+
+from adviser.adviser_support_info_retriver import aload_page, load_page
+from adviser.page_fetcher import PageFetcher
+from adviser.recorded_pages import RecordedPages
+
+BASE_URL = "https://www.smartraveller.gov.au/destinations"
+PAGE = """<html lang="en">
+<head><title>Fiji Travel Advice &amp; Safety | Smartraveller</title></head>
+<body>
+<h2>Latest update</h2>
+<p>Fiji's cyclone season runs from November to April.</p>
+<h2>Advice levels</h2>
+<p>Exercise normal safety precautions in Fiji overall.</p>
+</body>
+</html>
+"""
+
+
+@pytest.fixture
+def pages(tmp_path) -> RecordedPages:
+    pages = RecordedPages(str(tmp_path), base_url=BASE_URL)
+    pages.record(f"{BASE_URL}/pacific/fiji", PAGE)
+    return pages
+
+
+@pytest.fixture
+def fetcher(pages: RecordedPages):
+    fetcher = PageFetcher(transport=pages.transport())
+    yield fetcher
+    fetcher.close()
+
+
+def test_record_saves_the_page_under_its_region(pages: RecordedPages, tmp_path):
+    assert (tmp_path / "pacific" / "fiji.html").read_text() == PAGE
+    assert pages.get(f"{BASE_URL}/pacific/fiji") == PAGE
+    assert pages.urls(BASE_URL) == [f"{BASE_URL}/pacific/fiji"]
+
+
+def test_pages_are_matched_on_the_url_path(pages: RecordedPages):
+    # e.g. a stub server standing in for Smartraveller
+    assert pages.get("http://127.0.0.1:8000/destinations/pacific/fiji") == PAGE
+    assert pages.get(f"{BASE_URL}/pacific/fiji/") == PAGE
+    assert pages.get(f"{BASE_URL}/asia/indonesia") is None
+
+
+@pytest.mark.parametrize(
+    "path", ["", "/pacific/..%2F..%2Fsecrets", "/pacific/fiji.html", "/Pacific/Fiji"]
+)
+def test_urls_of_no_destination_have_no_page(pages: RecordedPages, path: str):
+    assert pages.path(f"{BASE_URL}{path}") is None
+    with pytest.raises(ValueError):
+        pages.record(f"{BASE_URL}{path}", PAGE)
+
+
+def test_fetcher_serves_the_recorded_pages(fetcher: PageFetcher):
+    response = fetcher.get(f"{BASE_URL}/pacific/fiji")
+    assert response.status_code == 200
+    assert response.text == PAGE
+
+    missing = fetcher.get(f"{BASE_URL}/asia/atlantis")
+    assert missing.status_code == 404
+    assert "Page not found" in missing.text
+
+
+def test_unchanged_pages_are_revalidated(fetcher: PageFetcher):
+    etag = fetcher.get(f"{BASE_URL}/pacific/fiji").headers["ETag"]
+    response = fetcher.get(f"{BASE_URL}/pacific/fiji", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+
+def test_pages_are_loaded_from_the_recording(
+    fetcher: PageFetcher, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr("adviser.adviser_support_info_retriver.PAGE_FETCHER", fetcher)
+    page = load_page(f"{BASE_URL}/pacific/fiji")
+    assert "Exercise normal safety precautions" in page.document.page_content
+    # a stale page still recorded is revalidated, not parsed again
+    assert load_page(f"{BASE_URL}/pacific/fiji", stale=page) is page
+    assert page.status_code == 200
+    assert load_page(f"{BASE_URL}/asia/bali").status_code == 404
+
+    async def aload():
+        page = await aload_page(f"{BASE_URL}/pacific/fiji")
+        await fetcher.aclose()
+        return page
+
+    assert asyncio.run(aload()).document.page_content == page.document.page_content
+
+
+def test_the_offline_app_keeps_the_recorded_pages_out_of_the_advisory_store(tmp_path):
+    store_path = tmp_path / "advisories.sqlite3"
+    env = {
+        **os.environ,
+        "OFFLINE_MODE": "true",
+        "FAKE_LLM_LATENCY": "0",
+        "ADVISORY_STORE_PATH": str(store_path),
+        "RECORDED_PAGES_DIR": str(tmp_path),
+    }
+    script = """
+from fastapi.testclient import TestClient
+from adviser import app
+from adviser.fake_chat_model import NOT_FOUND_ADVICE
+with TestClient(app.app) as client:
+    response = client.post("/get_travel_advice", json={"query": "Is Japan safe?"})
+print(response.json() == {"response": NOT_FOUND_ADVICE}, app.advisory_store)
+"""
+    completed = subprocess.run(
+        [sys.executable, "-c", script],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert completed.stdout.split() == ["True", "None"]
+    assert not store_path.exists()
@@ -0,0 +1,112 @@
+import asyncio
+import json
+from pathlib import Path
+
+import pytest
+from langchain_core.runnables import RunnableLambda
+
+from adviser.advice_levels import AdviceLevelAnswerer
+from adviser.destination_resolver import DestinationResolver
+from adviser.make_app import make_app
+from adviser.metrics import ChainMetrics
+from benchmarks.replay import (
+    ReplayRequest,
+    cache_summary,
+    compare_results,
+    load_requests,
+    percentile,
+    replay,
+    summarize,
+)
+
+
+def test_load_requests_reads_queries_and_endpoint_requests(tmp_path: Path):
+    log = tmp_path / "requests.jsonl"
+    log.write_text(
+        '{"query": "Is Bali safe?"}\n'
+        "\n"
+        '{"endpoint": "/get_travel_advice/batch", "body": {"queries": ["Is Fiji safe?"]}}\n'
+    )
+    assert load_requests(str(log)) == [
+        ReplayRequest("/get_travel_advice", {"query": "Is Bali safe?"}),
+        ReplayRequest("/get_travel_advice/batch", {"queries": ["Is Fiji safe?"]}),
+    ]
+
+
+def test_load_requests_reports_the_invalid_line(tmp_path: Path):
+    log = tmp_path / "requests.jsonl"
+    log.write_text('{"query": "Is Bali safe?"}\n{"title": "no query"}\n')
+    with pytest.raises(ValueError, match="line 2"):
+        load_requests(str(log))
+
+
+def test_sample_log_is_valid():
+    requests = load_requests(
+        str(Path(__file__).parents[1] / "benchmarks" / "data" / "replay_requests.jsonl")
+    )
+    assert {request.endpoint for request in requests} == {
+        "/get_travel_advice",
+        "/get_travel_advice/batch",
+        "/get_travel_advice/stream",
+    }
+
+
+@pytest.mark.parametrize(
+    "percent, expected", [(0, 1), (50, 50), (95, 95), (99, 99), (100, 100)]
+)
+def test_percentile_is_the_nearest_rank(percent: float, expected: float):
+    assert percentile(list(range(100, 0, -1)), percent) == expected
+
+
+def test_replay_reports_latency_and_stages():
+    metrics = ChainMetrics()
+    chain = RunnableLambda(lambda inputs: "advice").with_config(run_name="doc2advice")
+    app = make_app(chain, metrics=metrics)
+    requests = [
+        ReplayRequest("/get_travel_advice", {"query": "Is Bali safe?"}),
+        ReplayRequest("/get_travel_advice/stream", {"query": "Is Bali safe?"}),
+        ReplayRequest("/get_travel_advice", {"query": ""}),
+    ] * 2
+
+    results = summarize(asyncio.run(replay(app, requests, concurrency=2)), metrics)
+
+    assert results["requests"] == 6
+    assert results["statuses"] == {"200": 4, "400": 2}
+    assert set(results["latency_ms"]) == {"p50", "p95", "p99", "mean", "max"}
+    assert set(results["endpoints"]) == {
+        "/get_travel_advice",
+        "/get_travel_advice/stream",
+    }
+    assert results["stages"]["doc2advice"]["count"] == 4
+    assert results["caches"] == {}
+    json.dumps(results)
+
+
+def test_cache_summary_reports_the_hit_rates():
+    answerer, resolver = AdviceLevelAnswerer(), DestinationResolver()
+    answerer.hits, answerer.misses = 3, 1
+
+    summary = cache_summary({"levels": answerer, "resolver": resolver})
+
+    assert summary == {
+        "levels": {"hits": 3, "misses": 1, "hit_rate": 0.75},
+        "resolver": {"hits": 0, "misses": 0, "hit_rate": 0.0},
+    }
+
+
+def test_replay_starts_the_requests_at_the_rate():
+    app = make_app(RunnableLambda(lambda inputs: "advice"))
+    requests = [ReplayRequest("/get_travel_advice", {"query": "Is Bali safe?"})] * 5
+    run = asyncio.run(replay(app, requests, rate=50))
+    assert len(run.results) == 5
+    assert run.seconds >= 4 / 50
+
+
+def test_compare_results_flags_regressions_beyond_the_tolerance():
+    baseline = {"latency_ms": {"p95": 100.0, "p99": 200.0}, "throughput": 10.0}
+    results = {"latency_ms": {"p95": 105.0, "p99": 250.0}, "throughput": 8.0}
+    assert compare_results(results, baseline, tolerance=0.1) == [
+        "p99 latency 200.0 ms -> 250.0 ms (+25%)",
+        "throughput 10.0 -> 8.0 req/s (-20%)",
+    ]
+    assert compare_results(results, baseline, tolerance=0.3) == []
@@ -0,0 +1,163 @@
+import json
+import threading
+from pathlib import Path
+from typing import List
+from unittest.mock import AsyncMock, patch
+
+import httpx
+from fastapi.testclient import TestClient
+from langchain_core.language_models import FakeListChatModel
+from langchain_core.runnables import RunnableLambda
+
+from adviser.advise_model import construct_query2advice_chain
+from adviser.destination_resolver import DestinationResolver
+from adviser.make_app import make_app
+from adviser.page_cache import PageCache
+from adviser.page_fetcher import PageFetchTimeout
+from adviser.request_log import RequestLog, RequestRecord, response_hash
+from adviser.response_cache import ResponseCache
+from tests.fakes import ADVISORY_PAGE, FakeClock
+
+INDONESIA_URL = "https://www.smartraveller.gov.au/destinations/asia/indonesia"
+
+
+def read_entries(path: Path) -> List[dict]:
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def write_records(log: RequestLog, count: int):
+    for index in range(count):
+        log.write(RequestRecord("/get_travel_advice", {"query": f"query {index}"}))
+
+
+def test_requests_are_logged_with_destination_stages_and_cache_outcomes(
+    tmp_path: Path,
+):
+    path = tmp_path / "requests.jsonl"
+    chain = construct_query2advice_chain(
+        FakeListChatModel(responses=["Good to go"]),
+        page_cache=PageCache(),
+        resolver=DestinationResolver(),
+        response_cache=ResponseCache(),
+    )
+    app = make_app(chain, request_log=RequestLog(str(path), flush_interval=0.01))
+    page = httpx.Response(
+        200, text=ADVISORY_PAGE, request=httpx.Request("GET", INDONESIA_URL)
+    )
+    with patch("httpx.AsyncClient.get", new_callable=AsyncMock, return_value=page):
+        with TestClient(app) as client:
+            for _ in range(2):
+                response = client.post(
+                    "/get_travel_advice", json={"query": "Is Bali safe?"}
+                )
+                assert response.json() == {"response": "Good to go"}
+
+    first, second = read_entries(path)
+    assert first["endpoint"] == "/get_travel_advice"
+    assert first["body"] == {"query": "Is Bali safe?"}
+    assert first["status"] == 200
+    assert first["destinations"] == [INDONESIA_URL]
+    assert set(first["stages_ms"]) == {"query2url", "url2doc", "doc2advice"}
+    assert first["cache"] == {
+        "resolver": ["hit"],
+        "page": ["miss"],
+        "response": ["miss"],
+    }
+    assert second["cache"] == {
+        "resolver": ["hit"],
+        "page": ["hit"],
+        "response": ["hit"],
+    }
+    assert (
+        first["response_hash"] == second["response_hash"] == response_hash("Good to go")
+    )
+    # the cached response sent no prompt
+    assert len(first["prompt_tokens"]) == 1 and first["prompt_tokens"][0] > 0
+    assert second["prompt_tokens"] == []
+
+
+def test_failed_and_streamed_requests_are_logged(tmp_path: Path):
+    path = tmp_path / "requests.jsonl"
+
+    def fail(_):
+        raise PageFetchTimeout("Timed out retrieving web content")
+
+    app = make_app(RunnableLambda(fail), request_log=RequestLog(str(path)))
+    with TestClient(app) as client:
+        assert client.post("/get_travel_advice", json={"query": "q"}).status_code == 504
+        client.post("/get_travel_advice/stream", json={"query": "q"})
+
+    entries = read_entries(path)
+    assert [(entry["endpoint"], entry["status"]) for entry in entries] == [
+        ("/get_travel_advice", 504),
+        ("/get_travel_advice/stream", 504),
+    ]
+    assert entries[0]["response_hash"] is None
+
+
+def test_record_samples_requests(clock: FakeClock):
+    assert RequestLog("unused.jsonl", sample_rate=0).record("/", {}) is None
+
+    log = RequestLog("unused.jsonl", max_rate=2, clock=clock)
+    assert [log.record("/", {}) is not None for _ in range(3)] == [True, True, False]
+    clock.now += 1
+    assert log.record("/", {}) is not None
+    assert log.sampled_out == 1
+
+
+def test_write_drops_records_when_the_queue_is_full(tmp_path: Path):
+    log = RequestLog(str(tmp_path / "requests.jsonl"), queue_size=2)
+    with patch.object(RequestLog, "start"):
+        write_records(log, 3)
+    assert log.dropped == 1
+
+
+def test_writer_survives_failing_writes_and_close_does_not_hang(tmp_path: Path):
+    blocker = tmp_path / "blocker"
+    blocker.write_text("a file where the log directory should be")
+    path = blocker / "requests.jsonl"
+    log = RequestLog(str(path), queue_size=3, flush_interval=0)
+    write_records(log, 10)
+    closing = threading.Thread(target=log.close)
+    closing.start()
+    closing.join(timeout=5)
+    assert not closing.is_alive()
+    assert (log.written, log.dropped) == (0, 10)
+
+    blocker.unlink()
+    write_records(log, 2)
+    log.close()
+    assert log.written == 2
+    assert len(read_entries(path)) == 2
+
+
+def test_log_is_rotated_on_size(tmp_path: Path):
+    path = tmp_path / "requests.jsonl"
+    log = RequestLog(str(path), max_bytes=1, backup_count=2, flush_interval=0)
+    for _ in range(4):
+        write_records(log, 1)
+        log.close()
+
+    assert sorted(file.name for file in tmp_path.iterdir()) == [
+        "requests.jsonl",
+        "requests.jsonl.1",
+        "requests.jsonl.2",
+    ]
+    assert read_entries(path)[0]["body"] == {"query": "query 0"}
+    assert log.written == 4
+
+
+def test_log_is_rotated_on_age(tmp_path: Path, clock: FakeClock):
+    path = tmp_path / "requests.jsonl"
+    log = RequestLog(str(path), rotate_interval=60, clock=clock, flush_interval=0)
+    write_records(log, 1)
+    log.close()
+    write_records(log, 1)
+    log.close()
+    assert not (tmp_path / "requests.jsonl.1").exists()
+
+    clock.now += 60
+    write_records(log, 1)
+    log.close()
+    assert len(read_entries(tmp_path / "requests.jsonl.1")) == 2
+    assert len(read_entries(path)) == 1
@@ -0,0 +1,130 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+from langchain_core.documents.base import Document
+
+from adviser.response_cache import ResponseCache, cosine_similarity, vectorize_query
+from adviser.shared_store import SQLiteSharedStore
+from tests.fakes import FakeClock
+
+
+@pytest.fixture
+def response_cache(clock: FakeClock) -> ResponseCache:
+    return ResponseCache(ttl=60, max_size=3, similarity=0.9, clock=clock)
+
+
+@pytest.fixture
+def doc() -> Document:
+    return Document(
+        page_content="Exercise a high degree of caution",
+        metadata={
+            "source": "https://www.smartraveller.gov.au/destinations/asia/indonesia"
+        },
+    )
+
+
+@pytest.mark.parametrize(
+    "query, other_query, similar",
+    [
+        ("Is it safe to go to Bali?", "is bali safe", True),
+        ("I would like to travel to Indonesia. Is it safe?", "Indonesia safe?", True),
+        ("Is Indonesia safe?", "Is Papua in Indonesia safe?", False),
+        ("Is Bali safe?", "Is Bali not safe?", False),
+    ],
+)
+def test_query_similarity(query: str, other_query: str, similar: bool):
+    score = cosine_similarity(vectorize_query(query), vectorize_query(other_query))
+    assert (score >= 0.9) == similar
+
+
+def test_response_cache_serves_similar_queries(
+    response_cache: ResponseCache, doc: Document
+):
+    assert response_cache.lookup(doc, "Is it safe to go to Bali?") is None
+    response_cache.store(doc, "Is it safe to go to Bali?", "Exercise caution")
+    assert response_cache.lookup(doc, "is bali safe") == "Exercise caution"
+    assert response_cache.lookup(doc, "What about Papua?") is None
+    assert (response_cache.hits, response_cache.misses) == (1, 2)
+
+
+def test_response_cache_is_keyed_by_page(response_cache: ResponseCache, doc: Document):
+    response_cache.store(doc, "is it safe?", "Exercise caution")
+    other_doc = Document(page_content=doc.page_content, metadata={"source": "other"})
+    assert response_cache.lookup(other_doc, "is it safe?") is None
+
+
+def test_response_cache_invalidates_changed_pages(
+    response_cache: ResponseCache, doc: Document
+):
+    response_cache.store(doc, "is bali safe", "Exercise caution")
+    updated_doc = Document(page_content="Do not travel", metadata=doc.metadata)
+    assert response_cache.lookup(updated_doc, "is bali safe") is None
+    assert len(response_cache) == 0
+
+
+def test_response_cache_expires_responses(
+    response_cache: ResponseCache, doc: Document, clock: FakeClock
+):
+    response_cache.store(doc, "is bali safe", "Exercise caution")
+    clock.now = 61
+    assert response_cache.lookup(doc, "is bali safe") is None
+    assert len(response_cache) == 0
+
+
+def test_response_cache_evicts_least_recently_used(
+    response_cache: ResponseCache, doc: Document
+):
+    for query in ["bali", "papua", "jakarta"]:
+        response_cache.store(doc, query, query)
+    response_cache.lookup(doc, "bali")
+    response_cache.store(doc, "lombok", "lombok")
+    assert len(response_cache) == 3
+    assert response_cache.lookup(doc, "bali") == "bali"
+    assert response_cache.lookup(doc, "papua") is None
+
+
+def test_response_cache_serves_the_responses_of_other_workers(
+    tmp_path: Path, doc: Document, caplog: pytest.LogCaptureFixture
+):
+    path = str(tmp_path / "cache.sqlite3")
+    # the configured ttls are floats, the shared store takes whole seconds
+    worker, other_worker = (
+        ResponseCache(ttl=60.0, shared=SQLiteSharedStore(path)) for _ in range(2)
+    )
+    worker.store(doc, "Is it safe to go to Bali?", "Good to go")
+    assert "Failed to share the response" not in caplog.text
+
+    assert other_worker.lookup(doc, "is bali safe") == "Good to go"
+    assert other_worker.lookup(doc, "is bali safe") == "Good to go"
+    assert (other_worker.shared_hits, other_worker.hits) == (1, 1)
+
+    changed = Document(page_content="Do not travel", metadata=doc.metadata)
+    assert other_worker.lookup(changed, "is bali safe") is None
+    assert other_worker.lookup(doc, "Is Papua safe?") is None
+    assert other_worker.misses == 2
+
+
+def test_async_lookups_read_the_shared_store_off_the_event_loop(
+    tmp_path: Path, doc: Document, monkeypatch: pytest.MonkeyPatch
+):
+    path = str(tmp_path / "cache.sqlite3")
+    worker, other_worker = (
+        ResponseCache(ttl=60.0, shared=SQLiteSharedStore(path)) for _ in range(2)
+    )
+    threads = []
+    to_thread = asyncio.to_thread
+
+    async def record_to_thread(func, *args, **kwargs):
+        threads.append(func.__name__)
+        return await to_thread(func, *args, **kwargs)
+
+    monkeypatch.setattr(asyncio, "to_thread", record_to_thread)
+
+    async def store_then_lookup():
+        await worker.astore(doc, "Is it safe to go to Bali?", "Good to go")
+        return await other_worker.alookup(doc, "is bali safe")
+
+    assert asyncio.run(store_then_lookup()) == "Good to go"
+    assert threads == ["_share", "_find_shared"]
+    assert (other_worker.shared_hits, other_worker.misses) == (1, 0)
@@ -0,0 +1,91 @@
+import threading
+from pathlib import Path
+
+import pytest
+
+from adviser.shared_store import SQLiteSharedStore, open_shared_store
+from tests.fakes import FakeClock
+
+
+@pytest.fixture
+def store(tmp_path: Path, clock: FakeClock) -> SQLiteSharedStore:
+    store = SQLiteSharedStore(str(tmp_path / "cache.sqlite3"), clock=clock)
+    yield store
+    store.close()
+
+
+def test_values_are_set_expired_and_deleted(store: SQLiteSharedStore, clock: FakeClock):
+    assert store.get("page:a") is None
+    store.set("page:a", "first")
+    store.set("page:b", b"second", ex=60)
+    assert store.get("page:a") == b"first"
+    assert store.get("page:b") == b"second"
+
+    clock.now += 60
+    assert store.get("page:b") is None
+    assert store.delete("page:a", "page:c") == 1
+    assert store.get("page:a") is None
+
+
+def test_set_nx_only_sets_missing_keys(store: SQLiteSharedStore, clock: FakeClock):
+    assert store.set("lock", "1", ex=10, nx=True)
+    assert store.set("lock", "2", ex=10, nx=True) is None
+    assert store.get("lock") == b"1"
+    clock.now += 10
+    assert store.set("lock", "3", ex=10, nx=True)
+
+
+def test_hashes_keep_their_expiry(store: SQLiteSharedStore, clock: FakeClock):
+    store.hset("responses", "a", "1")
+    assert store.expire("responses", 60)
+    clock.now += 30
+    store.hset("responses", "b", b"2")
+    assert store.hget("responses", "a") == b"1"
+    assert store.hgetall("responses") == {b"a": b"1", b"b": b"2"}
+
+    clock.now += 30
+    assert store.hgetall("responses") == {}
+    store.hset("responses", "c", "3")
+    assert store.hgetall("responses") == {b"c": b"3"}
+    assert not store.expire("missing", 60)
+
+
+def test_expiries_are_whole_seconds_as_with_redis(store: SQLiteSharedStore):
+    with pytest.raises(TypeError):
+        store.set("lock", "1", ex=21600.0, nx=True)
+    store.hset("responses", "a", "1")
+    with pytest.raises(TypeError):
+        store.expire("responses", 86400.0)
+    assert store.get("lock") is None
+
+
+def test_connections_to_the_same_file_share_entries_and_locks(tmp_path: Path):
+    path = str(tmp_path / "cache.sqlite3")
+    workers = [SQLiteSharedStore(path) for _ in range(8)]
+    workers[0].set("page:a", "shared")
+    assert all(worker.get("page:a") == b"shared" for worker in workers)
+
+    acquired = []
+    start = threading.Barrier(len(workers))
+
+    def acquire(worker: SQLiteSharedStore):
+        start.wait()
+        acquired.append(worker.set("lock", "1", ex=60, nx=True))
+
+    threads = [threading.Thread(target=acquire, args=(w,)) for w in workers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(acquired, key=bool) == [None] * 7 + [True]
+    for worker in workers:
+        worker.close()
+
+
+def test_open_shared_store(tmp_path: Path):
+    assert open_shared_store("") is None
+    store = open_shared_store(f"sqlite:///{tmp_path / 'cache.sqlite3'}")
+    assert isinstance(store, SQLiteSharedStore)
+    store.close()
+    with pytest.raises(ValueError):
+        open_shared_store("memcached://localhost")
@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+from adviser.single_flight import SingleFlight
+
+
+def test_concurrent_calls_for_a_key_share_one_run():
+    single_flight = SingleFlight()
+    calls = []
+
+    async def advise(key: str):
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        return f"advice for {key}"
+
+    async def main():
+        return await asyncio.gather(
+            *[
+                single_flight.run(key, lambda key=key: advise(key))
+                for key in ["bali", "bali", "fiji", "bali"]
+            ]
+        )
+
+    assert asyncio.run(main()) == [
+        "advice for bali",
+        "advice for bali",
+        "advice for fiji",
+        "advice for bali",
+    ]
+    assert calls == ["bali", "fiji"]
+    assert (single_flight.misses, single_flight.coalesced) == (2, 2)
+    assert "bali" not in single_flight
+
+
+def test_a_failed_run_raises_for_every_caller():
+    single_flight = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("no advice")
+
+    async def main():
+        return await asyncio.gather(
+            *[single_flight.run("bali", fail) for _ in range(3)],
+            return_exceptions=True,
+        )
+
+    errors = asyncio.run(main())
+    assert [type(error) for error in errors] == [ValueError] * 3
+    assert single_flight.misses == 1
+
+
+def test_the_run_is_not_cancelled_with_its_first_caller():
+    single_flight = SingleFlight()
+
+    async def advise():
+        await asyncio.sleep(0.02)
+        return "advice"
+
+    async def main():
+        first = asyncio.ensure_future(single_flight.run("bali", advise))
+        second = asyncio.ensure_future(single_flight.run("bali", advise))
+        await asyncio.sleep(0.005)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(main()) == "advice"
+
+
+def test_a_new_run_starts_once_the_previous_one_finished():
+    single_flight = SingleFlight()
+    answers = iter(["first", "second"])
+
+    async def advise():
+        return next(answers)
+
+    async def main():
+        return [await single_flight.run("bali", advise) for _ in range(2)]
+
+    assert asyncio.run(main()) == ["first", "second"]
+    assert (single_flight.misses, single_flight.coalesced) == (2, 0)
@@ -1,12 +1,28 @@
+import asyncio
+
+import httpx
 import pytest
-from unittest.mock import patch, Mock
+from unittest.mock import patch, Mock, AsyncMock
+from langchain_core.language_models import FakeListChatModel
 from langchain_core.documents.base import Document
 from adviser.adviser_support_info_retriver import (
     get_url_for_travel_advice,
+    get_urls_for_travel_advice,
+    parse_destinations,
     transform_html_content,
     load_from_url,
+    aload_from_url,
+    parse_html_document,
+    aload_page,
+    construct_query2url_chain,
+    supports_structured_output,
     Country,
 )
+from adviser.admission import LLMBudget
+from adviser.destination_resolver import DestinationResolver
+from adviser.fake_chat_model import FakeChatModel, TextFakeChatModel
+from adviser.page_cache import CachedPage
+from adviser.page_fetcher import PageFetchError
 
 
 @pytest.fixture
@@ -64,22 +80,183 @@ def test_get_url_for_travel_advice_exception_handling(country: Country):
         get_url_for_travel_advice(country)
 
 
-@patch("langchain_community.document_loaders.WebBaseLoader.load")
-def test_load_from_url_success(mock_web_load: Mock, html_content_document: Document):
+def test_query2url_chain_skips_chat_model_for_resolved_query():
+    chat_model = FakeListChatModel(responses=[])
+    chain = construct_query2url_chain(chat_model, DestinationResolver())
+    url = chain.invoke({"query": "Is Bali safe?"})
+    assert url.endswith("/asia/indonesia")
+    assert chat_model.i == 0
+
+
+def test_query2url_chain_falls_back_to_chat_model():
+    chat_model = FakeListChatModel(
+        responses=['{"name": "atlantis", "region": "europe"}']
+    )
+    chain = construct_query2url_chain(chat_model, DestinationResolver())
+    url = asyncio.run(chain.ainvoke({"query": "Is it safe to visit Atlantis?"}))
+    assert url.endswith("/europe/atlantis")
+
+
+def test_query2url_chain_leaves_several_destinations_to_the_chat_model():
+    # "I am French, can I travel to Egypt?" names two countries but one destination
+    chat_model = FakeListChatModel(
+        responses=['{"destinations": [{"name": "egypt", "region": "africa"}]}']
+    )
+    resolver = DestinationResolver()
+    chain = construct_query2url_chain(chat_model, resolver)
+    url = chain.invoke({"query": "I am French, can I travel to Egypt?"})
+    assert url.endswith("/africa/egypt")
+    assert (resolver.hits, resolver.misses) == (0, 1)
+
+
+def test_query2url_chain_asks_chat_model_for_a_trip():
+    chat_model = FakeListChatModel(
+        responses=[
+            '{"destinations": [{"name": "atlantis", "region": "europe"},'
+            ' {"name": "lemuria", "region": "asia"}]}'
+        ]
+    )
+    chain = construct_query2url_chain(chat_model)
+    urls = asyncio.run(chain.ainvoke({"query": "Atlantis then Lemuria"}))
+    assert [url.rsplit("/", 1)[-1] for url in urls] == ["atlantis", "lemuria"]
+
+
+def test_query2url_chain_extracts_destinations_with_structured_output():
+    chat_model = FakeChatModel(
+        latency=0,
+        tokens_per_second=0,
+        canned_destinations=[{"name": "fiji", "region": "pacific"}],
+    )
+    chain = construct_query2url_chain(LLMBudget().bind(chat_model))
+    url = asyncio.run(chain.ainvoke({"query": "Is Fiji safe?"}))
+    assert url.endswith("/pacific/fiji")
+    assert chat_model.calls == 1
+
+
+@pytest.mark.parametrize(
+    "chat_model, expected",
+    [
+        (FakeChatModel(), True),
+        (LLMBudget().bind(FakeChatModel()), True),
+        (TextFakeChatModel(), False),
+        (FakeListChatModel(responses=[]), False),
+    ],
+)
+def test_supports_structured_output(chat_model, expected: bool):
+    assert supports_structured_output(chat_model) is expected
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        (
+            '{"destinations": [{"name": "fiji", "region": "pacific"}]}',
+            [Country(name="fiji", region="pacific")],
+        ),
+        (
+            '{"name": "fiji", "region": "pacific"}',
+            [Country(name="fiji", region="pacific")],
+        ),
+    ],
+)
+def test_parse_destinations_reads_trips_and_single_countries(text: str, expected):
+    assert parse_destinations(text) == expected
+
+
+def test_get_urls_for_travel_advice_returns_a_url_per_destination():
+    fiji = Country(name="fiji", region="pacific")
+    samoa = Country(name="samoa", region="pacific")
+    assert get_urls_for_travel_advice([fiji, fiji]) == get_url_for_travel_advice(fiji)
+    assert get_urls_for_travel_advice([fiji, samoa]) == [
+        get_url_for_travel_advice(fiji),
+        get_url_for_travel_advice(samoa),
+    ]
+    with pytest.raises(ValueError):
+        get_urls_for_travel_advice([])
+
+
+@patch("httpx.Client.get")
+def test_load_from_url_success(mock_get: Mock):
     url = "http://test.com"
-    mock_web_load.return_value = html_content_document
+    mock_get.return_value = httpx.Response(
+        200, text="<html><title>advice for test</title><p>test</p></html>"
+    )
     result = load_from_url(url)
-    assert result == html_content_document
+    assert len(result) == 1
+    assert result[0].metadata["title"] == "advice for test"
+    assert result[0].metadata["source"] == url
 
 
-@patch("langchain_community.document_loaders.WebBaseLoader.load")
-def test_load_from_url_exception_handling(mock_web_load: Mock):
+@patch("httpx.Client.get")
+def test_load_from_url_exception_handling(mock_get: Mock):
     url = "http://test.com"
-    mock_web_load.side_effect = Exception("Loader error")
-    with pytest.raises(Exception, match="Loader error"):
+    mock_get.side_effect = httpx.ConnectError("Loader error")
+    with pytest.raises(PageFetchError, match="Loader error"):
         load_from_url(url)
 
 
+def test_parse_html_document():
+    html = (
+        '<html lang="en"><head><title>advice for test</title>'
+        '<meta name="description" content="It is safe to test"></head>'
+        "<body><p>test html content</p></body></html>"
+    )
+    result = parse_html_document(html, "http://test.com")
+    assert result.metadata == {
+        "source": "http://test.com",
+        "title": "advice for test",
+        "description": "It is safe to test",
+        "language": "en",
+    }
+    assert "test html content" in result.page_content
+
+
+@patch("httpx.AsyncClient.get", new_callable=AsyncMock)
+def test_aload_from_url_success(mock_get: AsyncMock):
+    url = "http://test.com"
+    mock_get.return_value = httpx.Response(
+        200, text="<html><title>advice for test</title><p>test</p></html>"
+    )
+    result = asyncio.run(aload_from_url(url))
+    assert len(result) == 1
+    assert result[0].metadata["title"] == "advice for test"
+    assert result[0].metadata["source"] == url
+
+
+@patch("httpx.AsyncClient.get", new_callable=AsyncMock)
+def test_aload_from_url_exception_handling(mock_get: AsyncMock):
+    mock_get.side_effect = httpx.ConnectError("Loader error")
+    with pytest.raises(Exception, match="Loader error"):
+        asyncio.run(aload_from_url("http://test.com"))
+
+
+@patch("httpx.AsyncClient.get", new_callable=AsyncMock)
+def test_aload_page_reads_validators(mock_get: AsyncMock):
+    mock_get.return_value = httpx.Response(
+        200,
+        text="<html><title>advice for test</title><p>test html content</p></html>",
+        headers={"ETag": '"v1"', "Last-Modified": "Mon, 05 Aug 2024 00:00:00 GMT"},
+    )
+    page = asyncio.run(aload_page("http://test.com"))
+    assert page.etag == '"v1"'
+    assert page.last_modified == "Mon, 05 Aug 2024 00:00:00 GMT"
+    assert "test html content" in page.document.page_content
+
+
+@patch("httpx.AsyncClient.get", new_callable=AsyncMock)
+def test_aload_page_revalidates_stale_page(
+    mock_get: AsyncMock, text_document: Document
+):
+    mock_get.return_value = httpx.Response(304)
+    stale = CachedPage(document=text_document, etag='"v1"', last_modified="yesterday")
+    page = asyncio.run(aload_page("http://test.com", stale))
+    assert page is stale
+    assert mock_get.call_args.kwargs["headers"] == {
+        "If-None-Match": '"v1"',
+        "If-Modified-Since": "yesterday",
+    }
+
+
 def test_transform_html_content(
     html_content_document: Document, text_document: Document
 ):